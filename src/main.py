@@ -1,32 +1,66 @@
 from parser.parse_scenario import main as parse_scenario_main
 from prism.composer import main as compose
 from navigator.navigator import main as navigator
-from utils.meta import update_meta
-import pathlib, datetime, time, subprocess, sys, re
+from schema.scenario_schema import Scenario
+from utils.meta import update_meta, read_meta
+from utils.checkpoint import stage_is_current, record_checkpoint, load_checkpoint, hash_input
+from utils.scheduler import Stage, run_stages
+from prism.objectives import METRICS
+import argparse, pathlib, datetime, time, subprocess, sys, re, json
 
-def main():
-    def log(message):
-        """Print message with timestamp prefix"""
-        timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        print(f"{timestamp}: {message}")
-    
-    log("Run started...")
-    ts = datetime.datetime.now(datetime.UTC).strftime('%Y%m%dT%H%M%SZ')
-    time_zero = time.time()
-    # Get the directory where this script is located (src/)
-    script_dir = pathlib.Path(__file__).parent
-    out_dir = script_dir / 'runs' / 'Prism_Pipeline' / f'prism-pipeline-run-{ts}'
-    out_dir.mkdir(parents=True, exist_ok=True)
-    model = "gpt-5-mini-2025-08-07"
+# Pipeline stages in execution order (used by --from-stage)
+STAGES = ("parse", "compose", "verify", "restrict", "path", "navigate")
+# Helper stages of the DAG and the --from-stage stage they belong to
+STAGE_GROUPS = {"reuse": "compose", "reduce": "compose", "verify_meta": "verify", "symmetry": "verify",
+                "cache": "restrict", "pareto": "path", "policy": "path", "path_search": "path"}
+# Options that change stage outputs, with their defaults; a resumed run keeps
+# the values it was made with unless they are given again
+RUN_OPTIONS = {"reduce": False, "llm_parse": False, "llm_overview": False, "metrics": [], "no_cache": False}
 
-    
-    # ---------- NL → JSON via Structured Outputs ----------
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="NL → PRISM disaster response pipeline")
+    parser.add_argument("--run-dir", type=pathlib.Path,
+                        help="Existing run directory to resume (default: create a new run)")
+    parser.add_argument("--from-stage", choices=STAGES,
+                        help="Force this stage and every later stage to re-run")
+    parser.add_argument("--scenario-json", type=pathlib.Path,
+                        help="Validated scenario JSON to use instead of the NL parser")
+    parser.add_argument("--reduce", action=argparse.BooleanOptionalAction,
+                        help="Reduce the scenario graph before composing (pruning and relay contraction; "
+                             "exact only if resources are never staged at relay nodes)")
+    parser.add_argument("--llm-parse", action=argparse.BooleanOptionalAction,
+                        help="Always parse the scenario with the LLM (skip the grammar fast path)")
+    parser.add_argument("--llm-overview", action=argparse.BooleanOptionalAction,
+                        help="Have the LLM write the narrative overview of the strategy explanation")
+    parser.add_argument("--metrics", nargs="+", choices=METRICS,
+                        help="Extra properties to evaluate in the verification run: pmin (minimum goal probability), "
+                             "demands (reachability of each demand), steps (expected steps until the mission ends)")
+    parser.add_argument("--prism-timeout", type=float, metavar="SECONDS",
+                        help="Kill a PRISM run after this many seconds of wall-clock time")
+    parser.add_argument("--prism-max-rss", type=float, metavar="MB",
+                        help="Kill a PRISM run whose resident memory exceeds this many MB")
+    parser.add_argument("--cache-dir", type=pathlib.Path,
+                        help="Scenario cache directory (default: runs/cache next to this script)")
+    parser.add_argument("--no-cache", action="store_true", default=None,
+                        help="Neither reuse nor store models and PRISM results of isomorphic scenarios")
+    harness = parser.add_mutually_exclusive_group()
+    harness.add_argument("--record", action="store_true",
+                         help="Record every LLM response and PRISM run to <run dir>/recording/")
+    harness.add_argument("--replay", type=pathlib.Path,
+                         help="Replay a recording (or a run directory containing one) instead of "
+                              "calling OpenAI and PRISM")
+    return parser.parse_args(argv)
+
+
+def _read_scenario_text():
+    """Prompt for the natural language scenario on stdin."""
     print("\nPlease describe your disaster response scenario")
     print("Include: teams, locations, resources, routes (with safety colors), and objective")
     print("Example: 'Two teams at a and c, each can carry 4. Point d has 6 resources, g needs 8. Routes: a-b green distance 5...'")
     print("\nEnter your scenario (press Ctrl+D on macOS/Linux or Ctrl+Z then Enter on Windows when finished):")
     print("-" * 60)
-    
+
     try:
         lines = []
         while True:
@@ -39,50 +73,392 @@ def main():
     except KeyboardInterrupt:
         print("\n\nInterrupted. Exiting.")
         sys.exit(1)
-    
+
     print("-" * 60)
     if not user_input:
         print("Error: No scenario provided. Exiting.")
         sys.exit(1)
-    
-    log(f"Parsing scenario via {model}...")
-    scenario_obj = parse_scenario_main(user_input, out_dir, model)
-    log("Parsed scenario. Validated JSON saved.")
+    return user_input
 
-    # ---------- JSON → PRISM via LLM ----------
-    template_text = None
-    template_path = script_dir / 'templates' / 'case-study-model.txt'
-    if template_path.exists():
-        template_text = template_path.read_text(encoding='utf-8')
 
+def _load_scenario(path):
+    """Load and validate a scenario JSON file, returning it as a dict."""
+    try:
+        return Scenario.model_validate_json(path.read_text(encoding='utf-8')).model_dump()
+    except Exception as exc:
+        print(f"Error: {path} is not a valid scenario: {exc}")
+        sys.exit(1)
+
+
+def _saved_options(out_dir):
+    """Options a run directory was made with: from meta.json, or from its recording for older runs."""
+    saved = read_meta(out_dir, "options")
+    if not saved:
+        from utils.replay import Replayer, ReplayError
+
+        for path in (out_dir, pathlib.Path(read_meta(out_dir, "replay").get("dir", out_dir))):
+            try:
+                recorded = argparse.Namespace()
+                Replayer(path, out_dir).apply_options(recorded)
+            except ReplayError:
+                continue
+            saved = vars(recorded)
+            break
+    return {name: value for name, value in saved.items() if name in RUN_OPTIONS}
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+
+    def log(message):
+        """Print message with timestamp prefix"""
+        timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        print(f"{timestamp}: {message}")
+
+    log("Run started...")
+    ts = datetime.datetime.now(datetime.UTC).strftime('%Y%m%dT%H%M%SZ')
+    time_zero = time.time()
+    # Get the directory where this script is located (src/)
+    script_dir = pathlib.Path(__file__).parent
+    if args.run_dir:
+        out_dir = args.run_dir.resolve()
+        if not out_dir.is_dir():
+            print(f"Error: run directory {out_dir} does not exist. Exiting.")
+            sys.exit(1)
+        log(f"Resuming run in {out_dir}")
+        saved = _saved_options(out_dir)
+        restored = [name for name in RUN_OPTIONS if getattr(args, name) is None and name in saved]
+        for name in restored:
+            setattr(args, name, saved[name])
+        if restored:
+            log(f"Using the run's options: {', '.join(f'{n}={saved[n]}' for n in restored)}")
+    else:
+        out_dir = script_dir / 'runs' / 'Prism_Pipeline' / f'prism-pipeline-run-{ts}'
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+    for name, default in RUN_OPTIONS.items():
+        if getattr(args, name) is None:
+            setattr(args, name, default)
+
+    # Record/replay: external calls go through utils.clients, which the harness overrides
+    harness = None
+    if args.replay:
+        from utils.replay import Replayer, ReplayError
+
+        try:
+            harness = Replayer(args.replay, out_dir)
+        except ReplayError as exc:
+            print(f"Error: {exc}")
+            sys.exit(1)
+        harness.apply_options(args)
+        log(f"Replaying recording {harness.rec_dir}")
+    elif args.record:
+        from utils.replay import Recorder
+
+        harness = Recorder(out_dir)
+        harness.record_options(args)
+        log(f"Recording LLM and PRISM calls to {harness.rec_dir}")
+    if harness:
+        harness.install()
+    update_meta(out_dir, "options", {name: getattr(args, name) for name in RUN_OPTIONS})
+
+    start = STAGES.index(args.from_stage) if args.from_stage else 0
+    forced = set(STAGES[start:]) if args.from_stage else set()
     model = "gpt-5-mini-2025-08-07"
-    log(f"Generating PRISM model via {model}...")
-    compose(scenario_obj, template_text, out_dir, model=model)
-    log("PRISM model and properties saved.")
+
+    scenario_path = out_dir / 'validated_scenario.json'
+    reduced_path = out_dir / 'reduced_scenario.json'
+    model_path = out_dir / 'model.prism'
+    props_path = out_dir / 'properties.props'
+    template_path = script_dir / 'templates' / 'case-study-model.txt'
+    strat_files = [out_dir / 'strat.tra', out_dir / 'strat.sta', out_dir / 'strat.lab']
+    restricted_files = [out_dir / 'restricted.tra', out_dir / 'restricted.sta', out_dir / 'restricted.lab']
+    path_txt = out_dir / 'optimal_path.txt'
+    path_json = out_dir / 'optimal_path.json'
+    explanation_path = out_dir / 'strategy_explanation.md'
+    stage_outputs = {
+        'parse': [scenario_path],
+        'compose': [model_path, props_path],
+        'verify': strat_files,
+        'restrict': restricted_files,
+        'path': [path_txt, path_json],
+        'navigate': [explanation_path],
+    }
+
+    # Stages before --from-stage are skipped whenever their outputs (or those of a
+    # later stage) exist, so run directories created before checkpoints were
+    # recorded can still be resumed.
+    trusted = set()
+    for name in reversed(STAGES[:start]):
+        if trusted or all(p.exists() for p in stage_outputs[name]):
+            trusted.add(name)
+
+    # The NL text is only known after prompting, so an existing parse checkpoint
+    # is trusted as-is; use --from-stage parse to enter a new scenario.
+    user_input = None
+    if not args.scenario_json:
+        if "parse" in forced or not scenario_path.exists() or \
+                ("parse" not in trusted and load_checkpoint(out_dir, "parse") is None):
+            user_input = harness.scenario_text(_read_scenario_text) if harness else _read_scenario_text()
+            forced.add("parse")
+        else:
+            trusted.add("parse")
+
+    # Values handed between stages
+    ctx = {}
+
+    def scenario():
+        if 'scenario' not in ctx:
+            ctx['scenario'] = _load_scenario(scenario_path)
+        return ctx['scenario']
+
+    def scenario_inputs():
+        # The files model_scenario() is read from
+        return {'scenario': scenario_path, 'reduced': reduced_path}
+
+    def model_scenario():
+        # The (possibly reduced) scenario the PRISM model is generated from
+        if 'model_scenario' not in ctx:
+            # Not validated against Scenario: macro-edges carry "probability" and "via"
+            ctx['model_scenario'] = json.loads(reduced_path.read_text()) if reduced_path.exists() else scenario()
+        return ctx['model_scenario']
+
+    # ---------- NL → JSON via Structured Outputs ----------
+    def parse_stage():
+        if args.scenario_json:
+            log(f"Loading scenario from {args.scenario_json}...")
+            loaded = _load_scenario(args.scenario_json)
+            scenario_path.write_text(Scenario.model_validate(loaded).model_dump_json(indent=2))
+            update_meta(out_dir, "parse_scenario", {'source': str(args.scenario_json.resolve())})
+            log("Scenario loaded. Validated JSON saved.")
+        else:
+            if args.llm_parse:
+                log(f"Parsing scenario via {model}...")
+            else:
+                log(f"Parsing scenario (grammar fast path, falling back to {model})...")
+            parse_scenario_main(user_input, out_dir, model, fast_path=not args.llm_parse)
+            log("Parsed scenario. Validated JSON saved.")
+
+    def parse_inputs():
+        if args.scenario_json:
+            return {'scenario_json': args.scenario_json.resolve()}
+        return {'user_input': user_input or '', 'model': model, 'fast_path': not args.llm_parse}
+
+    # ---------- Reuse the model and PRISM results of an isomorphic scenario ----------
+    # Off when recording or replaying, so every call of the run goes through the harness
+    cache_dir = args.cache_dir or script_dir / 'runs' / 'cache'
+    use_cache = not args.no_cache and harness is None
+
+    def cache_settings():
+        return {
+            'model': model,
+            'template': hash_input(template_path),
+            'reduce': args.reduce,
+            'metrics': sorted(args.metrics),
+        }
+
+    def reuse_stage():
+        # Only for a run that has no model yet and does not force it to be rebuilt
+        if not use_cache or forced & {"compose", "verify", "restrict"} or model_path.exists():
+            return
+        from prism.scenario_cache import restore
+
+        report = restore(cache_dir, out_dir, scenario(), cache_settings())
+        update_meta(out_dir, "scenario_cache",
+                    {k: v for k, v in report.items() if k not in ('scenario', 'prism_verification')})
+        if not report['hit']:
+            if report.get('reason') and report['key'] is None:
+                log(f"Scenario cache skipped: {report['reason']}")
+            elif report.get('reason'):
+                log(f"Scenario cache entry {report['key']} not reused: {report['reason']}")
+            return
+        # The reused model encodes locations by node index and teams by position
+        scenario_path.write_text(Scenario.model_validate(report['scenario']).model_dump_json(indent=2))
+        ctx.pop('scenario', None)
+        if report['prism_verification']:
+            update_meta(out_dir, "prism_verification", report['prism_verification'], merge=True)
+            record_verification_meta(out_dir, report['prism_verification'].get('verification_probability'))
+        ctx['reused'] = set(report['stages'])
+        print(f"✓ Isomorphic scenario found in cache: reusing {', '.join(report['stages'])} outputs "
+              f"of {report['source_run']}")
+
+    def cache_inputs():
+        inputs = {'model': model_path, **{p.name: p for p in strat_files + restricted_files}, **scenario_inputs()}
+        inputs.update({'settings': json.dumps(cache_settings(), sort_keys=True), 'cache_dir': str(cache_dir)})
+        return inputs
+
+    def cache_stage():
+        if not use_cache or ctx.get('reused'):
+            return
+        from prism.canonical import LabellingBudgetError
+        from prism.scenario_cache import store
+
+        try:
+            entry_dir = store(cache_dir, out_dir, scenario(), cache_settings())
+        except LabellingBudgetError as exc:
+            update_meta(out_dir, "scenario_cache", {'stored': None, 'reason': str(exc)}, merge=True)
+            log(f"Run not stored in the scenario cache: {exc}")
+            return
+        if entry_dir:
+            update_meta(out_dir, "scenario_cache", {'stored': str(entry_dir)}, merge=True)
+            log(f"Model and PRISM results stored in the scenario cache ({entry_dir.name}).")
+
+    # ---------- Graph reduction ----------
+    def reduce_stage():
+        from prism.reduction import apply_reduction, REDUCTION_FILE
+
+        if not args.reduce:
+            for p in (reduced_path, out_dir / REDUCTION_FILE):
+                p.unlink(missing_ok=True)
+            update_meta(out_dir, "reduction", {'applied': False})
+            ctx['model_scenario'] = scenario()
+            return
+        ctx['model_scenario'] = apply_reduction(out_dir, scenario())
+        if reduced_path.exists():
+            nodes = len(ctx['model_scenario']['graph']['nodes'])
+            log(f"Reduced scenario graph to {nodes} of {len(scenario()['graph']['nodes'])} nodes.")
+
+    # ---------- JSON → PRISM via LLM ----------
+    def template_stage():
+        ctx['template'] = template_path.read_text(encoding='utf-8') if template_path.exists() else None
+
+    def compose_stage():
+        if not scenario_path.exists():
+            print("Error: No validated scenario available. Exiting.")
+            sys.exit(1)
+        log(f"Generating PRISM model via {model}...")
+        compose(model_scenario(), ctx.get('template'), out_dir, model=model, metrics=tuple(args.metrics))
+        log("PRISM model and properties saved.")
+
+    def compose_inputs():
+        inputs = {'scenario': scenario_path, 'model': model, 'reduced': reduced_path}
+        if 'steps' in args.metrics:
+            inputs['steps_reward'] = 'steps'
+        if ctx.get('template'):
+            inputs['template'] = template_path
+        return inputs
 
     # ---------- PHASE 1 & 2: Verify model and export strategy ----------
-    from prism.verification import main as verify_and_export_strategy
-    
-    path_strat_file, path_sta_file, path_lab_file = verify_and_export_strategy(
-        out_dir, scenario_obj, template_text, model, log
-    )
+    from prism.verification import verify, record_verification_meta, restrict
+    from prism.runner import PrismLimits
+
+    prism_limits = PrismLimits(timeout_s=args.prism_timeout, max_rss_mb=args.prism_max_rss)
+
+    def verify_stage():
+        ctx['prism_probability'] = verify(out_dir, model_scenario(), ctx.get('template'), model, log,
+                                        prism_limits, tuple(args.metrics))[3]
+
+    def verify_inputs():
+        inputs = {'model': model_path, 'properties': props_path}
+        if args.metrics:
+            inputs['metrics'] = ",".join(sorted(args.metrics))
+        return inputs
+
+    def verify_meta_stage():
+        # Runs alongside PHASE 2; nothing to record if PHASE 1 was skipped
+        if 'prism_probability' in ctx:
+            record_verification_meta(out_dir, ctx['prism_probability'])
+
+    def symmetry_stage():
+        from prism.symmetry import symmetry_report
+
+        # Only the Pareto solver (cost and multi-objective scenarios) uses the quotient
+        applied = model_scenario().get('objective', 'max_reach_prob') != 'max_reach_prob'
+        report = symmetry_report(out_dir, model_scenario(), applied=applied)
+        if report.get('applied'):
+            print(f"✓ Interchangeable teams {report['groups']}: {report['states']} states, "
+                  f"{report['orbits']} orbits (factor {report['factor']})")
+        elif report.get('groups'):
+            log(f"Interchangeable teams {report['groups']} (no quotient: the objective is checked by PRISM).")
+
+    def path_files():
+        # The selected Pareto policy if there is one (see pareto_stage), else the
+        # restricted model if PHASE 2 produced it, else the full strategy
+        from prism.pareto import STRATEGY_FILE
+
+        pareto_files = [out_dir / STRATEGY_FILE, strat_files[1], strat_files[2]]
+        for files in (pareto_files, restricted_files):
+            if all(p.exists() for p in files):
+                return files
+        return strat_files
+
+    # ---------- Pareto front for cost / multi-objective scenarios ----------
+    def pareto_stage():
+        from prism.pareto import compute_pareto, STRATEGY_FILE
+
+        # A stale Pareto policy would be picked up by the policy table
+        (out_dir / STRATEGY_FILE).unlink(missing_ok=True)
+        if model_scenario().get('objective', 'max_reach_prob') == 'max_reach_prob':
+            update_meta(out_dir, "pareto", {'applied': False})
+            return
+
+        log("Computing probability/distance Pareto front...")
+        pareto = compute_pareto(out_dir, model_scenario())
+        if pareto['status'] != 'success':
+            print(f"✗ Pareto computation failed: {pareto.get('message', 'Unknown error')}")
+            update_meta(out_dir, "pareto", {'applied': False, 'error': pareto.get('message')})
+            return
+        solver = pareto['solver']
+        if not solver['converged']:
+            print(f"  ⚠ Pareto value iteration did not converge within {solver['max_iters']} sweeps "
+                  f"(residual {solver['residual']:.2e}); the front is approximate")
+        selected = pareto['selected']
+        print(f"✓ Pareto front: {len(pareto['front'])} points; selected probability={selected['probability']:.6f}, "
+              f"expected distance={selected['expected_distance']:.2f}")
+        ctx['pareto_path'] = pareto['path_result']
+
+    # ---------- Compact policy table for live lookups ----------
+    def policy_inputs():
+        # The files build_policy_table reads
+        from prism.policy import policy_sources
+        from prism.reduction import REDUCTION_FILE
+
+        inputs = {p.suffix: p for p in policy_sources(out_dir) or strat_files}
+        if (out_dir / REDUCTION_FILE).exists():
+            inputs['reduction'] = out_dir / REDUCTION_FILE
+        return inputs
+
+    def policy_stage():
+        from prism.policy import STRATEGIES, build_policy_table, policy_sources
+
+        table_path = build_policy_table(out_dir, model_scenario())
+        strategy = STRATEGIES[policy_sources(out_dir)[0].name]
+        update_meta(out_dir, "policy_table", {'file': str(table_path), 'size_bytes': table_path.stat().st_size,
+                                              'strategy': strategy})
+        log(f"Policy table saved to {table_path.name} ({strategy.split(':')[0]} strategy).")
 
     # ---------- Extract optimal path from strategy (using restricted model if available) ----------
-    log("Extracting optimal path...")
-    
-    from prism.extract_path import extract_optimal_path
-
-    # Use restricted model and Djikstra's algorithm to find optimal path
-    path_result = extract_optimal_path(
-        strategy_file=path_strat_file,
-        states_file=path_sta_file,
-        labels_file=path_lab_file,
-        output_dir=out_dir,
-    )
-    
-    if path_result['status'] == 'success':
-        print(f"✓ Optimal path found: {len(path_result['path'])} steps, probability={path_result.get('optimal_path_probability', 0):.6f}")
-        
+    def path_search_stage():
+        log("Extracting optimal path...")
+
+        from prism.extract_path import extract_optimal_path
+
+        path_strat_file, path_sta_file, path_lab_file = path_files()
+        # Use restricted model and Djikstra's algorithm to find optimal path,
+        # or the policy of the selected Pareto trade-off point
+        path_result = ctx.get('pareto_path') or extract_optimal_path(
+            strategy_file=path_strat_file,
+            states_file=path_sta_file,
+            labels_file=path_lab_file,
+            output_dir=out_dir,
+            write_output=False,
+            scenario=model_scenario(),
+        )
+        ctx['path_result'] = path_result
+
+        if path_result['status'] == 'success':
+            print(f"✓ Optimal path found: {len(path_result['path'])} steps, probability={path_result.get('optimal_path_probability', 0):.6f}")
+        else:
+            print(f"✗ Path extraction failed: {path_result.get('message', 'Unknown error')}")
+
+    def path_stage():
+        from prism.extract_path import write_optimal_path
+
+        path_result = ctx.get('path_result')
+        if not path_result or path_result['status'] != 'success':
+            return
+        write_optimal_path(path_result, out_dir)
+
         # Save path metadata
         path_meta = {
             'num_steps': len(path_result['path']),
@@ -91,23 +467,92 @@ def main():
             'initial_state': path_result.get('initial_state'),
             'final_state': path_result.get('final_state'),
             'files': {
-                'txt': str(path_result.get('txt_file', ''))
+                'txt': str(path_result.get('txt_file', '')),
+                'json': str(path_result.get('json_file', '')),
             }
         }
         update_meta(out_dir, "optimal_path", path_meta)
-        
-        # ---------- Generate human-readable strategy explanation via LLM ----------
-        model = "gpt-5-mini-2025-08-07"
-        log(f"Generating strategy explanation via {model}...")
-        navigator(out_dir, model)
-        
-    else:
-        print(f"✗ Path extraction failed: {path_result.get('message', 'Unknown error')}")
-    
-    elapsed = time.time() - time_zero
-    log(f"Run completed in {elapsed:.2f}s")
 
+    def path_text():
+        # In-memory path text if this run extracted it, else the saved file
+        path_result = ctx.get('path_result')
+        if path_result:
+            return path_result.get('text')
+        return path_txt.read_text(encoding='utf-8') if path_txt.exists() else None
+
+    # ---------- Generate human-readable strategy explanation ----------
+    def navigate_stage():
+        text = path_text()
+        if text is None:
+            return
+        path_result = ctx.get('path_result')
+        path = path_result.get('path') if path_result else None
+        if args.llm_overview:
+            log(f"Generating strategy explanation (overview via {model})...")
+        else:
+            log("Generating strategy explanation...")
+        navigator(out_dir, model, path=path, llm_overview=args.llm_overview)
+
+    stages = [
+        Stage("parse", parse_stage, inputs=parse_inputs, outputs=stage_outputs['parse']),
+        Stage("template", template_stage),
+        Stage("reuse", reuse_stage, deps=("parse",)),
+        Stage("reduce", reduce_stage, deps=("reuse",)),
+        Stage("compose", compose_stage, deps=("reduce", "template"),
+              inputs=compose_inputs, outputs=stage_outputs['compose']),
+        Stage("verify", verify_stage, deps=("compose",),
+              inputs=verify_inputs,
+              outputs=stage_outputs['verify']),
+        Stage("verify_meta", verify_meta_stage, deps=("verify",),
+              inputs=lambda: {p.suffix: p for p in strat_files}, meta_keys=("prism_verification",)),
+        Stage("symmetry", symmetry_stage, deps=("verify",),
+              inputs=lambda: {'states': strat_files[1], **scenario_inputs()}, meta_keys=("symmetry",)),
+        Stage("restrict", lambda: restrict(out_dir, log, prism_limits), deps=("verify",),
+              inputs=lambda: {p.suffix: p for p in strat_files}, outputs=stage_outputs['restrict']),
+        Stage("cache", cache_stage, deps=("restrict", "verify_meta"),
+              inputs=cache_inputs, meta_keys=("scenario_cache",)),
+        Stage("pareto", pareto_stage, deps=("symmetry",),
+              inputs=lambda: {'full': out_dir / 'full.tra', 'states': strat_files[1], 'labels': strat_files[2],
+                              **scenario_inputs()},
+              meta_keys=("pareto",)),
+        Stage("policy", policy_stage, deps=("restrict", "pareto"),
+              inputs=policy_inputs, outputs=[out_dir / 'policy_table.json']),
+        Stage("path_search", path_search_stage, deps=("restrict", "pareto")),
+        Stage("path", path_stage, deps=("path_search",),
+              inputs=lambda: {'path': path_text() or ''}, outputs=stage_outputs['path']),
+        Stage("navigate", navigate_stage, deps=("path_search", "parse"),
+              inputs=lambda: {'path': path_text() or '', 'scenario': scenario_path,
+                              'model': model if args.llm_overview else None},
+              outputs=stage_outputs['navigate']),
+    ]
+
+    def should_skip(stage, inputs):
+        group = STAGE_GROUPS.get(stage.name, stage.name)
+        if group in trusted:
+            if stage.outputs or stage.name in STAGE_GROUPS:
+                log(f"Skipping {stage.name} stage (reusing existing outputs).")
+            return True
+        if stage.name in ctx.get('reused', ()):
+            log(f"Skipping {stage.name} stage (reused from the scenario cache).")
+            record_checkpoint(out_dir, stage.name, inputs, stage.outputs)
+            return True
+        if not (stage.outputs or stage.meta_keys) or group in forced:
+            return False
+        if stage_is_current(out_dir, stage.name, inputs, stage.outputs, stage.meta_keys):
+            log(f"Skipping {stage.name} stage (checkpoint is current).")
+            return True
+        return False
+
+    def on_complete(stage, inputs):
+        if not (stage.outputs or stage.meta_keys):
+            return
+        if all(p.exists() for p in stage.outputs) and all(read_meta(out_dir, k) for k in stage.meta_keys):
+            record_checkpoint(out_dir, stage.name, inputs, stage.outputs, stage.meta_keys)
 
+    _, schedule, failure = run_stages(stages, should_skip, on_complete)
+    update_meta(out_dir, "schedule", schedule)
+    log(f"Critical path: {' → '.join(schedule['critical_path'])} "
+        f"({schedule['critical_path_s']:.2f}s of {schedule['serial_time_s']:.2f}s stage time)")
 
     # ---------- Save metadata from run ----------
     elapsed = time.time() - time_zero
@@ -116,8 +561,15 @@ def main():
         'time_started': ts,
         'elapsed_time': elapsed_human,
     }
+    if args.run_dir:
+        meta['resumed_from_stage'] = args.from_stage
     update_meta(out_dir, "overall", meta)
-    log(f"Run completed. Outputs in {out_dir}")
+    if harness:
+        harness.uninstall()
+        update_meta(out_dir, "replay" if args.replay else "recording", harness.summary())
+    if failure is not None:
+        raise failure
+    log(f"Run completed in {elapsed:.2f}s. Outputs in {out_dir}")
 
 
 if __name__ == "__main__":
@@ -1,70 +1,91 @@
 from utils.meta import update_meta
-from openai import OpenAI
+from utils.clients import get_openai_client
+from navigator.render import parse_path_text, render_explanation
+from prism.extract_path import path_to_json, path_from_json, compact_path_text
+from prism.reduction import load_reduction, route_lookup, REDUCED_SCENARIO_FILE
+import json, time
 
 
-client = OpenAI()
-
-def main(out_dir: str, model: str = "gpt-5-mini-2025-08-07"):
-    # Read the TXT file for human-readable path data
-    txt_path = out_dir / 'optimal_path.txt'
-    txt_content = txt_path.read_text(encoding='utf-8') if txt_path.exists() else ""
-
-    # Read original scenario for context
-    scenario_path = out_dir / 'validated_scenario.json'
-    scenario_content = scenario_path.read_text(encoding='utf-8') if scenario_path.exists() else "{}"
-
-    explanation_prompt = f"""You are a disaster response expert analyzing an optimal resource delivery strategy.
+def _llm_overview(model, scenario_content, path_summary):
+    """Ask the LLM for the 2-3 sentence narrative overview only."""
+    overview_prompt = f"""You are a disaster response expert analyzing an optimal resource delivery strategy.
 
     INPUT DATA:
     1. Original Scenario (JSON):
-    {scenario_content[:10000]}
+    {scenario_content}
 
-    2. Optimal Path (structured format):
-    {txt_content}
+    2. Optimal Path (one line per move: action, success probability -> changed variables):
+    {path_summary}
 
     TASK:
-    Write a step-by-step strategy summary with running success probabilities.
-
-    STRUCTURE YOUR RESPONSE AS:
-    1. **Overview** (2-3 sentences): Total steps, final success probability, and key challenge
-
-    2. **Step-by-Step Actions** (numbered list): For EVERY step with an action:
-    - Number steps sequentially starting from 1
-    - Team action (e.g., "Team 1: c→d carrying 4 resources")
-    - Transition probability (e.g., "60% success")
-    - Running cumulative probability (e.g., "Overall: 0.54%")
-
-    3. **Final State**: List where each team ends and where all resources are located
-
-    GUIDELINES:
-    - Only include rows with actual actions in the Action column (skip the final goal state row)
-    - Number steps 1, 2, 3, ... instead of 0, 1, 2, ...
-    - Show ALL transition probabilities and running cumulative probability
-    - Use location names (a, b, c, etc.) not state IDs
-    - Format: "Step X: Team Y: loc1→loc2 carrying N resources (P% success) | Overall: X%"
-    - End with clear summary of final locations of every team and all resources.
+    Write the Overview of this strategy in 2-3 sentences: total steps, final success
+    probability, and the key challenge.
 
     OUTPUT FORMAT:
-    Plain markdown with ## headings, numbered list for steps. No JSON, no code blocks."""
+    Plain text only. No headings, no lists, no JSON, no code blocks."""
 
+    client = get_openai_client("overview")
     resp = client.responses.create(
         model=model,
-        input=[{"role": "user", "content": explanation_prompt}],
+        input=[{"role": "user", "content": overview_prompt}],
     )
+    return resp.output_text, str(getattr(resp, "usage", None))
+
+
+def _path_probability(path):
+    probability = 1.0
+    for entry in path:
+        probability *= entry.get('transition_prob', 1.0) if entry.get('action') else 1.0
+    return probability
+
+
+def main(out_dir: str, model: str = "gpt-5-mini-2025-08-07", path_text: str | None = None,
+         path: list | None = None, llm_overview: bool = False):
+    time_zero = time.time()
+    # Path entries from the caller, else the structured path file (or the text one)
+    json_path = out_dir / 'optimal_path.json'
+    if path is None:
+        if path_text is None and json_path.exists():
+            path = path_from_json(json.loads(json_path.read_text(encoding='utf-8')))
+        else:
+            txt_path = out_dir / 'optimal_path.txt'
+            if path_text is None:
+                path_text = txt_path.read_text(encoding='utf-8') if txt_path.exists() else ""
+            path = parse_path_text(path_text)
 
-    strategy_explanation = resp.output_text
+    # Read original scenario for context
+    scenario_path = out_dir / 'validated_scenario.json'
+    scenario = json.loads(scenario_path.read_text(encoding='utf-8')) if scenario_path.exists() else {}
+    # The model was built from the reduced graph, if any; moves over macro-edges
+    # are expanded back to the original routes
+    reduced_path = out_dir / REDUCED_SCENARIO_FILE
+    model_scenario = json.loads(reduced_path.read_text(encoding='utf-8')) if reduced_path.exists() else scenario
+    routes = route_lookup(load_reduction(out_dir))
+
+    overview, usage = None, None
+    if llm_overview:
+        # Compact encodings keep the prompt small without truncating anything
+        scenario_content = json.dumps(scenario, separators=(',', ':'))
+        path_data = path_to_json({'path': path, 'optimal_path_probability': _path_probability(path)})
+        path_summary = compact_path_text(path_data, model_scenario.get('graph', {}).get('nodes'))
+        overview, usage = _llm_overview(model, scenario_content, path_summary)
+
+    strategy_explanation = render_explanation(path, model_scenario, overview, routes,
+                                              scenario.get('graph', {}).get('nodes'))
 
     # Save explanation
     explanation_file = out_dir / 'strategy_explanation.md'
     explanation_file.write_text(strategy_explanation, encoding='utf-8')
-            
+
     # Save full explanation to metadata
     explanation_meta = {
         "file": str(explanation_file),
-        "model": "gpt-5-mini-2025-08-07",
+        "renderer": "deterministic",
+        "model": model if llm_overview else None,
         "explanation": strategy_explanation,
-        "usage": str(getattr(resp, "usage", None)),
+        "usage": usage,
+        "elapsed_s": round(time.time() - time_zero, 3),
     }
     update_meta(out_dir, "strategy_explanation", explanation_meta)
-    
+
     return
@@ -0,0 +1,143 @@
+"""
+Deterministic markdown rendering of the optimal path.
+
+Everything in the strategy explanation except the narrative overview follows
+directly from the path entries (state variables, action label and transition
+probability of each step), so it is computed here instead of by the LLM:
+action labels such as team1_a_b_2 become "Team 1: a→b carrying 2 resources"
+and the running probability is the product of the transition probabilities.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from prism.actions import decode_action
+from prism.predicates import FAIL_LOCATION, team_location_vars
+
+STEP_RE = re.compile(r"^Step (\d+): State (\d+)")
+VAR_RE = re.compile(r"^\s{4}(\w+) = (-?\d+)")
+ACTION_RE = re.compile(r"^\s+Action: (\S+) \(prob=([\d.eE+-]+)\)")
+
+
+def parse_path_text(text: str) -> List[Dict[str, Any]]:
+    """Parse optimal_path.txt back into path entries (step, state_id, state, action, transition_prob)."""
+    path: List[Dict[str, Any]] = []
+    for line in text.split('\n'):
+        m = STEP_RE.match(line)
+        if m:
+            path.append({'step': int(m.group(1)), 'state_id': int(m.group(2)), 'state': {}})
+            continue
+        if not path:
+            continue
+        m = VAR_RE.match(line)
+        if m:
+            path[-1]['state'][m.group(1)] = int(m.group(2))
+            continue
+        m = ACTION_RE.match(line)
+        if m:
+            path[-1]['action'] = m.group(1)
+            path[-1]['transition_prob'] = float(m.group(2))
+    return path
+
+
+def describe_action(label: str, routes: Optional[Dict[Tuple[str, str], List[str]]] = None) -> str:
+    """
+    'team1_a_b_2' -> 'Team 1: a→b carrying 2 resources' (unknown labels are returned as-is).
+
+    routes maps contracted macro-edges back to their original node sequence
+    (see prism.reduction.route_lookup), e.g. 'Team 1: d→e→f carrying 2 resources'.
+    """
+    move = decode_action(label)
+    if not move:
+        return label
+    hops = (routes or {}).get((move['src'], move['dst']), [move['src'], move['dst']])
+    return f"Team {move['team']}: {'→'.join(hops)} carrying {move['qty']} resources"
+
+
+def _percent(p: float, digits: Optional[int] = None) -> str:
+    return f"{p * 100:.{digits}f}%" if digits is not None else f"{p * 100:g}%"
+
+
+def step_rows(path: List[Dict[str, Any]],
+              routes: Optional[Dict[Tuple[str, str], List[str]]] = None) -> List[Dict[str, Any]]:
+    """One row per step with an action: description, transition and running probability."""
+    rows = []
+    running = 1.0
+    for entry in path:
+        if not entry.get('action'):
+            continue
+        prob = entry.get('transition_prob', 1.0)
+        running *= prob
+        rows.append({'action': entry['action'], 'description': describe_action(entry['action'], routes),
+                     'prob': prob, 'overall': running})
+    return rows
+
+
+def render_steps(rows: List[Dict[str, Any]]) -> str:
+    lines = ["## Step-by-Step Actions"]
+    for i, row in enumerate(rows, start=1):
+        lines.append(f"{i}. Step {i}: {row['description']} ({_percent(row['prob'])} success) | "
+                     f"Overall: {_percent(row['overall'], 4)}")
+    if not rows:
+        lines.append("No moves are needed: the initial state already meets every demand.")
+    return "\n".join(lines)
+
+
+def render_final_state(path: List[Dict[str, Any]], scenario: Optional[dict] = None,
+                       all_nodes: Optional[List[str]] = None) -> str:
+    """
+    Final location of every team and the resources at every node.
+
+    scenario is the one the model was built from; all_nodes (the original
+    scenario's nodes) also lists nodes removed by graph reduction, which hold 0.
+    """
+    final = path[-1]['state'] if path else {}
+    var_names = list(final)
+    nodes = (scenario or {}).get('graph', {}).get('nodes', [])
+    teams = (scenario or {}).get('teams', [])
+
+    lines = ["## Final State"]
+    for i, var in enumerate(team_location_vars(var_names, scenario)):
+        name = f"Team {i + 1}" + (f" ({teams[i]['id']})" if i < len(teams) else "")
+        loc = final[var]
+        if loc == FAIL_LOCATION:
+            where = "failed"
+        else:
+            where = nodes[loc] if 0 <= loc < len(nodes) else str(loc)
+        lines.append(f"- {name} final location: {where}")
+    counts = {v[1:]: final[v] for v in var_names if v.startswith('x')}
+    resources = ", ".join(f"{n}={counts.get(n, 0)}" for n in (all_nodes or counts))
+    lines.append(f"- Resource distribution: {resources}")
+    return "\n".join(lines)
+
+
+def render_overview(rows: List[Dict[str, Any]]) -> str:
+    """Deterministic overview: step count, final probability and the riskiest move."""
+    lines = ["## Overview"]
+    if not rows:
+        lines.append("Total actions: 0. The demands are met in the initial state.")
+        return "\n".join(lines)
+    overall = rows[-1]['overall']
+    riskiest = min(range(len(rows)), key=lambda i: rows[i]['prob'])
+    risky = sum(1 for r in rows if r['prob'] < 0.9)
+    lines.append(
+        f"Total actions: {len(rows)}. Final path success probability: {_percent(overall, 4)}. "
+        f"Key challenge: {risky} of the {len(rows)} moves succeed with less than 90% probability; "
+        f"the riskiest is step {riskiest + 1} ({rows[riskiest]['description']}, "
+        f"{_percent(rows[riskiest]['prob'])} success)."
+    )
+    return "\n".join(lines)
+
+
+def render_explanation(path: List[Dict[str, Any]], scenario: Optional[dict] = None,
+                       overview: Optional[str] = None,
+                       routes: Optional[Dict[Tuple[str, str], List[str]]] = None,
+                       all_nodes: Optional[List[str]] = None) -> str:
+    """Full strategy_explanation.md; `overview` replaces the deterministic overview paragraph."""
+    rows = step_rows(path, routes)
+    head = f"## Overview\n{overview.strip()}" if overview else render_overview(rows)
+    return "\n\n".join([head, render_steps(rows), render_final_state(path, scenario, all_nodes)]) + "\n"
+
+
+__all__ = ['parse_path_text', 'describe_action', 'step_rows', 'render_explanation',
+           'render_overview', 'render_steps', 'render_final_state']
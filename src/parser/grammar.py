@@ -0,0 +1,266 @@
+"""
+Deterministic parser for the controlled scenario language operators use, e.g.
+
+    Two teams: T1 at a, and T2 at c, each can carry 4 resources at a time.
+    Point c has 4 resources, a and d each have 2. Point g wants 7 resources.
+    Routes: a-b red distance 9, a-d red distance 5, ..., f-g yellow distance 10. Undirected.
+    Safety probabilities are green = 0.99, yellow = 0.85, red = 0.5.
+    Objective is to maximise probability of reaching the goal.
+
+Every field is reported as "parsed" (matched by a rule), "default" (not stated;
+a safe default was used) or "missing"/"ambiguous". Every sentence must be
+covered by the rules' matches, apart from filler words ("resources", "the",
+"Objective is to", ...), so text the grammar does not understand (e.g. a
+constraint it has no rule for, even in a sentence another rule matched) makes
+the coverage incomplete and the caller falls back to the LLM parser.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from schema.scenario_schema import Scenario
+
+# Fields that must be stated; the others may fall back to their defaults
+REQUIRED_FIELDS = ("edges", "teams", "capacity", "resources", "demands", "safety_probs", "objective")
+DEFAULTS = {"undirected": True, "node_capacity": None}
+
+COLORS = {"green": "G", "yellow": "Y", "amber": "Y", "orange": "Y", "red": "R", "g": "G", "y": "Y", "r": "R"}
+NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8,
+                "nine": 9, "ten": 10}
+
+_COLOR = r"((?i:green|yellow|amber|orange|red)|[GYR])"
+_NUM = r"(\d+(?:\.\d+)?)"
+_LIST = r"(\w+(?:\s*,\s*\w+)*(?:\s*,?\s*and\s+\w+)?)"
+
+ROUTE_RE = re.compile(
+    rf"\b(\w+)\s*-\s*(\w+)\s*(?:\(|,|:)?\s*(?:{_COLOR}\s*,?\s*(?:distance|dist\.?|d)\s*=?\s*{_NUM}"
+    rf"|(?:distance|dist\.?|d)\s*=?\s*{_NUM}\s*,?\s*{_COLOR})\b", re.IGNORECASE)
+TEAM_RE = re.compile(r"\b(T\d+|Team\s*\d+)\s+(?:is\s+|starts?\s+|starting\s+)?(?:at|from|in)\s+(?:point\s+|node\s+)?(\w+)",
+                     re.IGNORECASE)
+TEAM_COUNT_RE = re.compile(r"\b(\d+|one|two|three|four|five|six|seven|eight|nine|ten)\s+teams\b", re.IGNORECASE)
+CARRY_RE = re.compile(r"\b(?:carry|carries|capacity(?:\s+of)?)\s*=?\s*(\d+)", re.IGNORECASE)
+SHARED_RE = re.compile(r"\b(each|both|all)\b", re.IGNORECASE)
+TEAM_CARRY_RE = re.compile(r"\b(T\d+|Team\s*\d+)\b[^,]*?\b(?:carry|carries|capacity(?:\s+of)?)\s*=?\s*(\d+)",
+                           re.IGNORECASE)
+SUPPLY_RE = re.compile(rf"(?:(?:points?|nodes?|locations?)\s+)?{_LIST}\s+(?:each\s+)?(?:has|have|holds?)\s+(\d+)",
+                       re.IGNORECASE)
+DEMAND_RE = re.compile(rf"(?:(?:points?|nodes?|locations?)\s+)?{_LIST}\s+(?:each\s+)?"
+                       rf"(?:wants?|needs?|requires?|demands?)\s+(\d+)", re.IGNORECASE)
+NODE_CAP_RE = re.compile(r"(?:(?:points?|nodes?|locations?)\s+)?(\w+)\s+can\s+(?:hold|store)\s+(?:at\s+most\s+|up\s+to\s+)?(\d+)",
+                         re.IGNORECASE)
+# Single-letter colours must be upper case here, so node names (g, r, y) are not taken for them
+SAFETY_RE = re.compile(rf"\b{_COLOR}\s*(?:=|:|is)?\s*(0?\.\d+|[01](?:\.\d+)?)\b")
+DIRECTION_RE = re.compile(r"\b(undirected|bidirectional|two-way|directed|one-way)\b", re.IGNORECASE)
+OBJECTIVES = (
+    ("multi_objective", re.compile(r"\b(trade-?off|multi-?objective|balanc\w+)\b", re.IGNORECASE)),
+    ("min_expected_cost", re.compile(r"\bminimi[sz]e\s+(?:the\s+)?(?:expected\s+)?(?:cost|distance)\b", re.IGNORECASE)),
+    ("max_reach_prob", re.compile(r"\bmaximi[sz]e\s+(?:the\s+)?(?:success\s+)?probability\b", re.IGNORECASE)),
+)
+# Sentence ends, except decimal points and the "dist." abbreviation ROUTE_RE accepts
+SENTENCE_RE = re.compile(r"(?<![Dd]ist)\.(?!\d)|\n|;")
+# Words that may be left over once the rules have matched a sentence
+FILLER_RE = re.compile(
+    r"\b(?:at\s+a\s+time|and|the|is|are|to|of|with|there|each|both|all|can|resources?|units?|supplies|"
+    r"routes?|edges?|roads?|graph|teams?|points?|nodes?|locations?|safety|probabilit(?:y|ies)|"
+    r"objective|goal|reach(?:ing)?)\b", re.IGNORECASE)
+
+
+def _sentences(text: str) -> List[str]:
+    return [s.strip() for s in SENTENCE_RE.split(text) if s.strip()]
+
+
+def _leftover(sentence: str, covered: bytearray) -> str:
+    """Text of a sentence outside the matched spans that is not filler or punctuation."""
+    rest = "".join(" " if covered[k] else c for k, c in enumerate(sentence))
+    return " ".join(re.findall(r"\w+(?:\.\d+)?", FILLER_RE.sub(" ", rest)))
+
+
+def _node_list(text: str, nodes: set) -> List[str]:
+    tokens = re.split(r"\s*,\s*|\s+and\s+|\s+", text.strip())
+    return [t for t in tokens if t in nodes]
+
+
+def _team_id(text: str) -> str:
+    """'Team 1' / 'team1' / 't1' -> 'T1'."""
+    compact = re.sub(r"\s+", "", text)
+    return "T" + compact[4:] if compact.lower().startswith("team") else compact.upper()
+
+
+def _natural_key(name: str):
+    return [int(p) if p.isdigit() else p for p in re.split(r"(\d+)", name)]
+
+
+def parse_controlled(text: str) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Parse controlled-language scenario text.
+
+    Returns (scenario, coverage). scenario is a validated Scenario dump, or None
+    when coverage is incomplete or validation fails; coverage maps each field to
+    its status and lists the text of each sentence the rules did not cover.
+    """
+    sentences = _sentences(text)
+    covered = [bytearray(len(s)) for s in sentences]
+    fields: Dict[str, str] = {}
+
+    def mark(i, span):
+        covered[i][span[0]:span[1]] = b"\x01" * (span[1] - span[0])
+
+    # Routes first: they define the node set used to filter the other rules
+    edges = []
+    for i, s in enumerate(sentences):
+        for m in ROUTE_RE.finditer(s):
+            a, b = m.group(1), m.group(2)
+            color = m.group(3) or m.group(6)
+            distance = m.group(4) or m.group(5)
+            edges.append({"from": a, "to": b, "distance": float(distance), "safety": COLORS[color.lower()]})
+            mark(i, m.span())
+    fields["edges"] = "parsed" if edges else "missing"
+    nodes = sorted({n for e in edges for n in (e["from"], e["to"])}, key=_natural_key)
+    node_set = set(nodes)
+
+    undirected = None
+    for i, s in enumerate(sentences):
+        for m in DIRECTION_RE.finditer(s):
+            value = m.group(1).lower() in ("undirected", "bidirectional", "two-way")
+            if undirected is not None and undirected != value:
+                fields["undirected"] = "ambiguous"
+            undirected = value
+            mark(i, m.span())
+    fields.setdefault("undirected", "parsed" if undirected is not None else "default")
+    if undirected is None:
+        undirected = DEFAULTS["undirected"]
+
+    # Teams: capacity is the nearest "carry N" after the team, or an "each ... carry N"
+    teams: List[Dict[str, Any]] = []
+    expected_teams = None
+    for i, s in enumerate(sentences):
+        count = TEAM_COUNT_RE.search(s)
+        if count:
+            word = count.group(1).lower()
+            expected_teams = int(word) if word.isdigit() else NUMBER_WORDS[word]
+            mark(i, count.span())
+        mentions = list(TEAM_RE.finditer(s))
+        shared = None
+        for k, m in enumerate(mentions):
+            team_id = _team_id(m.group(1))
+            end = mentions[k + 1].start() if k + 1 < len(mentions) else len(s)
+            carry = CARRY_RE.search(s, m.end(), end)
+            capacity = None
+            if carry:
+                mark(i, carry.span())
+                each = SHARED_RE.search(s, m.end(), carry.start())
+                if each:
+                    shared = int(carry.group(1))
+                    mark(i, each.span())
+                else:
+                    capacity = int(carry.group(1))
+            teams.append({"id": team_id, "start": m.group(2), "capacity": capacity})
+            mark(i, m.span())
+        if shared is not None:
+            for team in teams:
+                if team["capacity"] is None:
+                    team["capacity"] = shared
+    # Capacities stated separately ("T1 can carry 3, T2 carries 2")
+    by_id = {t["id"]: t for t in teams}
+    for i, s in enumerate(sentences):
+        for m in TEAM_CARRY_RE.finditer(s):
+            team = by_id.get(_team_id(m.group(1)))
+            if team is not None:
+                if team["capacity"] not in (None, int(m.group(2))):
+                    fields["capacity"] = "ambiguous"
+                team["capacity"] = int(m.group(2))
+                mark(i, m.span(1))
+                mark(i, CARRY_RE.search(s, m.start(), m.end()).span())
+    if not teams:
+        fields["teams"] = "missing"
+    elif expected_teams is not None and expected_teams != len(teams):
+        fields["teams"] = "ambiguous"
+    else:
+        fields["teams"] = "parsed"
+    fields.setdefault("capacity", "parsed" if teams and all(t["capacity"] for t in teams) else "missing")
+
+    def quantities(pattern):
+        found: Dict[str, int] = {}
+        conflict = False
+        for i, s in enumerate(sentences):
+            for m in pattern.finditer(s):
+                listed = _node_list(m.group(1), node_set)
+                for node in listed:
+                    conflict |= node in found and found[node] != int(m.group(2))
+                    found[node] = int(m.group(2))
+                if listed:
+                    mark(i, m.span())
+        status = "ambiguous" if conflict else ("parsed" if found else "missing")
+        return [{"node": n, "qty": q} for n, q in found.items()], status
+
+    resources, fields["resources"] = quantities(SUPPLY_RE)
+    demands, fields["demands"] = quantities(DEMAND_RE)
+
+    node_capacity = []
+    for i, s in enumerate(sentences):
+        for m in NODE_CAP_RE.finditer(s):
+            if m.group(1) in node_set:
+                node_capacity.append({"node": m.group(1), "qty": int(m.group(2))})
+                mark(i, m.span())
+    fields["node_capacity"] = "parsed" if node_capacity else "default"
+
+    safety: Dict[str, float] = {}
+    for i, s in enumerate(sentences):
+        if ROUTE_RE.search(s):
+            continue
+        for m in SAFETY_RE.finditer(s):
+            safety[COLORS[m.group(1).lower()]] = float(m.group(2))
+            mark(i, m.span())
+    fields["safety_probs"] = "parsed" if set(safety) == {"G", "Y", "R"} else "missing"
+
+    objectives = set()
+    for i, s in enumerate(sentences):
+        for name, pattern in OBJECTIVES:
+            for m in pattern.finditer(s):
+                objectives.add(name)
+                mark(i, m.span())
+    if not objectives:
+        fields["objective"] = "missing"
+    elif len(objectives) > 1 and objectives != {"multi_objective", "max_reach_prob"} \
+            and objectives != {"multi_objective", "min_expected_cost"}:
+        fields["objective"] = "ambiguous"
+    else:
+        fields["objective"] = "parsed"
+    objective = "multi_objective" if "multi_objective" in objectives else next(iter(objectives), None)
+
+    unconsumed = [rest for rest in (_leftover(s, covered[i]) for i, s in enumerate(sentences)) if rest]
+    complete = all(fields[f] == "parsed" for f in REQUIRED_FIELDS) and \
+        all(fields[f] in ("parsed", "default") for f in DEFAULTS) and not unconsumed
+    coverage = {
+        "fields": fields,
+        "confident": [f for f, status in fields.items() if status == "parsed"],
+        "unconsumed": unconsumed,
+        "complete": complete,
+    }
+    if not complete:
+        return None, coverage
+
+    raw = {
+        "graph": {"nodes": nodes, "edges": edges, "undirected": undirected},
+        "teams": teams,
+        "resources": resources,
+        "demands": demands,
+        "constraints": {
+            "safety_probs": safety,
+            "node_capacity": node_capacity or DEFAULTS["node_capacity"],
+        },
+        "objective": objective,
+    }
+    unknown = sorted({t["start"] for t in teams} - node_set)
+    if unknown:
+        coverage.update(complete=False, error=f"Team start nodes not on any route: {', '.join(unknown)}")
+        return None, coverage
+    try:
+        scenario = Scenario.model_validate(raw)
+    except ValueError as exc:
+        coverage.update(complete=False, error=str(exc))
+        return None, coverage
+    return scenario.model_dump(), coverage
+
+
+__all__ = ['parse_controlled', 'REQUIRED_FIELDS']
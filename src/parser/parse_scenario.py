@@ -1,6 +1,7 @@
 from utils.meta import update_meta
-from openai import OpenAI
+from utils.clients import get_openai_client
 from schema.scenario_schema import Scenario
+from parser.grammar import parse_controlled
 import json, pathlib, time, datetime
 
 # ---------- NL → JSON via Structured Outputs ----------
@@ -12,7 +13,7 @@ SYSTEM = (
 MODEL = "gpt-5-2025-08-07"
 
 def _call_llm(messages: list[dict[str, str]], model: str) -> str:
-    client = OpenAI()
+    client = get_openai_client("parse")
     resp = client.responses.parse(
         model=model,
         input=messages,
@@ -21,7 +22,8 @@ def _call_llm(messages: list[dict[str, str]], model: str) -> str:
 
     return resp
 
-def _log_response(resp, out_dir: pathlib.Path, start_time: float, messages: list[dict[str, str]]):
+def _log_response(resp, out_dir: pathlib.Path, start_time: float, messages: list[dict[str, str]],
+                  grammar_coverage: dict | None = None):
     out_dir.mkdir(parents=True, exist_ok=True)
 
     # Find first content item, which should be the JSON output
@@ -37,9 +39,11 @@ def _log_response(resp, out_dir: pathlib.Path, start_time: float, messages: list
 
     meta = {
         "input": messages,
+        "parser": "llm",
         "used_model": resp.model,
         "usage": str(getattr(resp, "usage", None)),
         "elapsed_time": elapsed_human,
+        "grammar_coverage": grammar_coverage,
     }
 
     update_meta(out_dir, "parse_scenario", meta)
@@ -47,15 +51,43 @@ def _log_response(resp, out_dir: pathlib.Path, start_time: float, messages: list
 
     return validated_scenario.model_dump()
 
-def main(user_input: str, out_dir: str, model: str = MODEL):
+def _save_fast_path(scenario: dict, out_dir: pathlib.Path, start_time: float, user_input: str, coverage: dict):
+    out_dir.mkdir(parents=True, exist_ok=True)
+    validated_scenario = Scenario.model_validate(scenario)
+    elapsed = time.time() - start_time
+
+    meta = {
+        "input": [{"role": "user", "content": user_input}],
+        "parser": "grammar",
+        "used_model": None,
+        "usage": None,
+        "elapsed_time": str(datetime.timedelta(seconds=elapsed)),
+        "grammar_coverage": coverage,
+    }
+
+    update_meta(out_dir, "parse_scenario", meta)
+    (out_dir / "validated_scenario.json").write_text(validated_scenario.model_dump_json(indent=2))
+
+    return validated_scenario.model_dump()
+
+def main(user_input: str, out_dir: str, model: str = MODEL, fast_path: bool = True):
     time_zero = time.time()
+
+    # Controlled-language scenarios are parsed deterministically; the LLM is
+    # only called when the grammar does not cover every field
+    coverage = None
+    if fast_path:
+        scenario, coverage = parse_controlled(user_input)
+        if scenario is not None:
+            return _save_fast_path(scenario, out_dir, time_zero, user_input, coverage)
+
     messages = [
             {"role": "system", "content": SYSTEM},
             {"role": "user", "content": user_input},
         ]
 
     resp = _call_llm(messages, model)
-    validated_json_obj = _log_response(resp, out_dir, time_zero, messages)
+    validated_json_obj = _log_response(resp, out_dir, time_zero, messages, coverage)
 
     # Return as dict for programmatic use
     return validated_json_obj
@@ -0,0 +1,47 @@
+"""
+Decode the move action labels used by the generated PRISM models.
+
+Models name every move command <team>_<from>_<to>_<qty>, e.g. team1_a_b_2 or
+t2_c_g_4: team 1 moves from a to b carrying 2 resources.
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+ACTION_RE = re.compile(r"^(?:team|t)(\d+)_([A-Za-z0-9]+)_([A-Za-z0-9]+)_(\d+)$")
+COMMAND_LABEL_RE = re.compile(r"^\s*\[(\w+)\]", re.MULTILINE)
+
+
+def decode_action(label: Optional[str]) -> Optional[Dict[str, object]]:
+    """Return {'team', 'src', 'dst', 'qty'} for a move label, or None if it is not one."""
+    if not label:
+        return None
+    m = ACTION_RE.match(label)
+    if not m:
+        return None
+    return {'team': int(m.group(1)), 'src': m.group(2), 'dst': m.group(3), 'qty': int(m.group(4))}
+
+
+def model_action_labels(model_text: str) -> List[str]:
+    """Return the distinct command labels of a PRISM model, in order of appearance."""
+    seen = {}
+    for label in COMMAND_LABEL_RE.findall(model_text):
+        seen.setdefault(label, None)
+    return list(seen)
+
+
+def edge_lookup(scenario: dict) -> Dict[Tuple[str, str], dict]:
+    """Map (from, to) node pairs to scenario edges.
+
+    Reverse directions are included too (without overriding an explicit edge),
+    since the composer treats routes as bidirectional unless told otherwise.
+    """
+    lookup = {}
+    for edge in scenario['graph']['edges']:
+        lookup[(edge.get('from_', edge.get('from')), edge['to'])] = edge
+    for (src, dst), edge in list(lookup.items()):
+        lookup.setdefault((dst, src), edge)
+    return lookup
+
+
+__all__ = ['decode_action', 'model_action_labels', 'edge_lookup']
@@ -0,0 +1,353 @@
+"""
+Canonical form of a scenario, up to renaming.
+
+Two scenarios that differ only in node names, team ids or the order of their
+lists describe the same problem and have the same optimal strategy. The
+canonical form makes that visible: nodes are renamed n0, n1, ... by a
+canonical labelling of the graph, teams T1, T2, ... in order of their
+canonical start node and capacity, and resources, demands and capacities are
+summed per node. Isomorphic scenarios get the same canonical form and hash.
+
+The labelling is colour refinement (1-dimensional Weisfeiler-Lehman) with
+individualization, as in nauty: nodes start coloured by what is on them
+(supply, demand, capacity, teams starting there), colours are refined by the
+multiset of (edge safety, distance, direction, neighbour colour) until stable,
+and ties are broken by trying every node of the first non-singleton colour
+class, keeping the smallest encoding of the relabelled graph. Automorphisms
+found on the way prune equivalent branches: each level of the search keeps
+the orbits of the automorphisms that fix its prefix (union-find), and a leaf
+equivalent to the best one ends the subtree it diverged into. Highly
+symmetric graphs can still need many branches, so the search is capped at
+SEARCH_BUDGET nodes and raises LabellingBudgetError beyond it; callers treat
+the scenario as uncacheable then.
+
+Node names also appear in the PRISM artifacts (x<node> counters, node
+constants, action labels t1_a_b_2) as do team ids (loc<team>), so results
+computed for one scenario are carried over to an isomorphic one by renaming
+these identifiers (relabel_prism_text).
+"""
+
+import hashlib
+import json
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from prism.actions import ACTION_RE
+
+IDENT_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+QUOTED_RE = re.compile(r'"([^"\n]*)"')
+# A quoted string or an identifier, so relabel_prism_text renames every token once
+TOKEN_RE = re.compile(rf'{QUOTED_RE.pattern}|{IDENT_RE.pattern}')
+# Identifiers the generated models derive from a node name (x<node>, init<node>)
+NODE_PREFIXES = ("x", "init")
+# Search tree nodes a canonical labelling may visit
+SEARCH_BUDGET = 2000
+# PRISM keywords and built-in labels, which a renamed node or team may not collide with
+PRISM_RESERVED = frozenset("""
+    A bool ceil clock const ctmc C double dtmc E endinit endinvariant endmodule endobservables endrewards
+    endsystem F false filter floor formula func G global I init invariant int label log max mdp min mod
+    module nondeterministic observable observables of P Pmax Pmin pomdp popta pow prob probabilistic pta
+    R rate rewards Rmax Rmin S stochastic system true U W X deadlock goal
+""".split())
+
+
+class RelabelError(ValueError):
+    """The PRISM artifacts cannot be renamed without identifier collisions."""
+
+
+class LabellingBudgetError(RuntimeError):
+    """The canonical labelling search exceeded its node budget."""
+
+
+def _src(edge: dict) -> str:
+    return edge.get('from_', edge.get('from'))
+
+
+def _value(v):
+    return getattr(v, 'value', v)
+
+
+def _totals(entries: Optional[List[dict]]) -> Dict[str, int]:
+    totals: Dict[str, int] = {}
+    for entry in entries or []:
+        totals[entry['node']] = totals.get(entry['node'], 0) + int(entry['qty'])
+    return totals
+
+
+class _Labelling:
+    """Canonical ordering of the nodes of one scenario graph."""
+
+    def __init__(self, scenario: dict, budget: int = SEARCH_BUDGET):
+        graph = scenario['graph']
+        referenced = [n for e in graph['edges'] for n in (_src(e), e['to'])]
+        referenced += [t['start'] for t in scenario.get('teams', [])]
+        self.names = list(dict.fromkeys(list(graph['nodes']) + referenced))
+        index = {n: i for i, n in enumerate(self.names)}
+        self.undirected = bool(graph.get('undirected', True))
+
+        supply = _totals(scenario.get('resources'))
+        demand = _totals(scenario.get('demands'))
+        capacity: Dict[str, List[int]] = {}
+        for entry in (scenario.get('constraints') or {}).get('node_capacity') or []:
+            capacity.setdefault(entry['node'], []).append(int(entry['qty']))
+        team_caps: Dict[str, List[int]] = {}
+        for team in scenario.get('teams', []):
+            team_caps.setdefault(team['start'], []).append(int(team['capacity']))
+        # Absent demand (-1) differs from a demand of 0
+        self.keys = [(supply.get(n, 0), demand.get(n, -1), tuple(sorted(capacity.get(n, ()))),
+                      tuple(sorted(team_caps.get(n, ())))) for n in self.names]
+
+        self.edges: List[Tuple[int, int, Tuple[str, float]]] = []
+        self.adj: List[List[Tuple[tuple, int]]] = [[] for _ in self.names]
+        for edge in graph['edges']:
+            u, v = index[_src(edge)], index[edge['to']]
+            label = (str(_value(edge['safety'])), float(edge['distance']))
+            self.edges.append((u, v, label))
+            if self.undirected:
+                self.adj[u].append(((label, 0), v))
+                self.adj[v].append(((label, 0), u))
+            else:
+                self.adj[u].append(((label, 1), v))
+                self.adj[v].append(((label, 2), u))
+
+        self.best: Optional[tuple] = None
+        self.best_pos: Optional[List[int]] = None
+        self.best_prefix: List[int] = []
+        self.budget = budget
+        self.visited = 0
+        # Orbit union-find per search level, under the automorphisms fixing that level's prefix
+        self.orbits: List[List[int]] = []
+        self._search(self._rank(self.keys), [])
+
+    @staticmethod
+    def _rank(keys: List[Any]) -> List[int]:
+        order = {k: i for i, k in enumerate(sorted(set(keys)))}
+        return [order[k] for k in keys]
+
+    def _refine(self, colors: List[int]) -> List[int]:
+        while True:
+            signatures = [(colors[v], tuple(sorted((label, colors[w]) for label, w in self.adj[v])))
+                          for v in range(len(colors))]
+            refined = self._rank(signatures)
+            if len(set(refined)) == len(set(colors)):
+                return refined
+            colors = refined
+
+    def _certificate(self, pos: List[int]) -> tuple:
+        nodes = [None] * len(pos)
+        for v, p in enumerate(pos):
+            nodes[p] = self.keys[v]
+        edges = []
+        for u, v, label in self.edges:
+            a, b = pos[u], pos[v]
+            edges.append((min(a, b), max(a, b), label) if self.undirected else (a, b, label))
+        return tuple(nodes), tuple(sorted(edges))
+
+    @staticmethod
+    def _find(parent: List[int], x: int) -> int:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def _automorphism(self, colors: List[int], prefix: List[int]) -> int:
+        """
+        Record the automorphism taking the best leaf to this equivalent one and
+        return the level where their paths diverge: the automorphism fixes the
+        common prefix, so it joins orbits at that level and every level above.
+        """
+        order = sorted(range(len(colors)), key=colors.__getitem__)
+        perm = [order[self.best_pos[v]] for v in range(len(colors))]
+        level = 0
+        while level < min(len(prefix), len(self.best_prefix)) and prefix[level] == self.best_prefix[level]:
+            level += 1
+        for parent in self.orbits[:level + 1]:
+            for x, y in enumerate(perm):
+                parent[self._find(parent, x)] = self._find(parent, y)
+        return level
+
+    def _search(self, colors: List[int], prefix: List[int]) -> Optional[int]:
+        """Search below prefix; returns the level to backtrack to after an automorphism, if any."""
+        self.visited += 1
+        if self.visited > self.budget:
+            raise LabellingBudgetError(f"canonical labelling needs more than {self.budget} search nodes "
+                                       f"({len(self.names)} nodes, highly symmetric graph)")
+        colors = self._refine(colors)
+        cells: Dict[int, List[int]] = {}
+        for v, c in enumerate(colors):
+            cells.setdefault(c, []).append(v)
+        target = next((cells[c] for c in sorted(cells) if len(cells[c]) > 1), None)
+        if target is None:
+            certificate = self._certificate(colors)
+            if self.best is None or certificate < self.best:
+                self.best, self.best_pos, self.best_prefix = certificate, colors, prefix
+            elif certificate == self.best:
+                return self._automorphism(colors, prefix)
+            return None
+        depth = len(prefix)
+        del self.orbits[depth:]
+        self.orbits.append(list(range(len(colors))))
+        explored: List[int] = []
+        for v in target:
+            parent = self.orbits[depth]
+            if any(self._find(parent, u) == self._find(parent, v) for u in explored):
+                continue
+            explored.append(v)
+            back = self._search(self._rank([(c, 0 if u == v else 1) for u, c in enumerate(colors)]), prefix + [v])
+            if back is not None and back < depth:
+                return back
+        return None
+
+
+class CanonicalScenario:
+    """
+    Canonical form of a scenario.
+
+    scenario: the canonical scenario dict (nodes n0..., teams T1...)
+    digest: sha256 of its JSON encoding
+    node_map / team_map: the scenario's node names / team ids -> canonical ones
+    """
+
+    def __init__(self, scenario: dict, digest: str, node_map: Dict[str, str], team_map: Dict[str, str]):
+        self.scenario = scenario
+        self.digest = digest
+        self.node_map = node_map
+        self.team_map = team_map
+
+    def mapping_to(self, other: "CanonicalScenario") -> Tuple[Dict[str, str], Dict[str, str]]:
+        """Node names and team ids of this scenario -> those of an isomorphic one."""
+        if self.digest != other.digest:
+            raise ValueError("scenarios are not isomorphic")
+        nodes = {c: n for n, c in other.node_map.items()}
+        teams = {c: t for t, c in other.team_map.items()}
+        return ({n: nodes[c] for n, c in self.node_map.items()},
+                {t: teams[c] for t, c in self.team_map.items()})
+
+
+def canonicalize(scenario: dict) -> CanonicalScenario:
+    """Canonical form, hash and name mapping of a scenario (validated Scenario dict)."""
+    labelling = _Labelling(scenario)
+    pos = labelling.best_pos
+    index = {n: i for i, n in enumerate(labelling.names)}
+    node_map = {n: f"n{pos[i]}" for i, n in enumerate(labelling.names)}
+
+    edges = []
+    for u, v, (safety, distance) in labelling.edges:
+        a, b = pos[u], pos[v]
+        if labelling.undirected and a > b:
+            a, b = b, a
+        edges.append((a, b, distance, safety))
+    teams = sorted(enumerate(scenario.get('teams', [])),
+                   key=lambda it: (pos[index[it[1]['start']]], int(it[1]['capacity']), it[0]))
+    team_map = {team['id']: f"T{k}" for k, (_, team) in enumerate(teams, start=1)}
+
+    def per_node(totals, keep_zero):
+        return [{'node': f"n{p}", 'qty': q} for p, q in sorted((pos[index[n]], q) for n, q in totals.items())
+                if q or keep_zero]
+
+    constraints = scenario.get('constraints') or {}
+    capacity = constraints.get('node_capacity') or []
+    canonical = {
+        'graph': {
+            'nodes': [f"n{i}" for i in range(len(labelling.names))],
+            'edges': [{'from': f"n{a}", 'to': f"n{b}", 'distance': d, 'safety': s} for a, b, d, s in sorted(edges)],
+            'undirected': labelling.undirected,
+        },
+        'teams': [{'id': f"T{k}", 'start': node_map[team['start']], 'capacity': int(team['capacity'])}
+                  for k, (_, team) in enumerate(teams, start=1)],
+        'resources': per_node(_totals(scenario.get('resources')), keep_zero=False),
+        'demands': per_node(_totals(scenario.get('demands')), keep_zero=True),
+        'constraints': {
+            'safety_probs': {k: float(v) for k, v in dict(constraints.get('safety_probs') or {}).items()},
+            'node_capacity': [{'node': f"n{p}", 'qty': q} for p, q in
+                              sorted((pos[index[e['node']]], int(e['qty'])) for e in capacity)] or None,
+        },
+        'objective': str(_value(scenario.get('objective', 'max_reach_prob'))),
+    }
+    encoded = json.dumps(canonical, sort_keys=True, separators=(',', ':'))
+    return CanonicalScenario(canonical, hashlib.sha256(encoded.encode('utf-8')).hexdigest(), node_map, team_map)
+
+
+def scenario_digest(scenario: dict) -> str:
+    """Hash of a scenario that is equal for every isomorphic scenario."""
+    return canonicalize(scenario).digest
+
+
+def _renamer(nodes: Dict[str, str], teams: Dict[str, str]) -> Callable[[str], str]:
+    team_locs = {}
+    for src, dst in teams.items():
+        team_locs[f"loc{src.lower()}"] = f"loc{dst.lower()}"
+        team_locs[f"loc{src}"] = f"loc{dst}"
+
+    def rename(token: str) -> str:
+        m = ACTION_RE.match(token)
+        if m and (m.group(2) in nodes or m.group(3) in nodes):
+            return (f"{token[:m.start(2)]}{nodes.get(m.group(2), m.group(2))}_"
+                    f"{nodes.get(m.group(3), m.group(3))}{token[m.end(3):]}")
+        if token in nodes:
+            return nodes[token]
+        for prefix in NODE_PREFIXES:
+            if token.startswith(prefix) and token[len(prefix):] in nodes:
+                return prefix + nodes[token[len(prefix):]]
+        return team_locs.get(token, token)
+
+    return rename
+
+
+def check_relabel(text: str, nodes: Dict[str, str], teams: Dict[str, str]) -> None:
+    """
+    Raise RelabelError unless renaming text (a model and its properties) keeps
+    every identifier distinct and clear of PRISM keywords.
+    """
+    reserved = sorted((set(nodes) | set(nodes.values())) & PRISM_RESERVED)
+    if reserved:
+        raise RelabelError(f"node names collide with PRISM keywords: {', '.join(reserved)}")
+    rename = _renamer(nodes, teams)
+    identifiers = set(IDENT_RE.findall(text))
+    renamed = {rename(t) for t in identifiers}
+    if len(renamed) != len(identifiers):
+        raise RelabelError("renamed identifiers collide with other identifiers of the model")
+
+
+def relabel_prism_text(text: str, nodes: Dict[str, str], teams: Dict[str, str]) -> str:
+    """
+    Rename the nodes and teams in a PRISM model, properties file or export.
+
+    Renames node constants, x<node>/init<node> counters, the nodes of action
+    labels, loc<team> variables and quoted node names/team ids (in comments).
+    Every token is renamed exactly once, in a single pass, so swapped names
+    ({'a': 'g', 'g': 'a'}) are handled.
+    """
+    rename = _renamer(nodes, teams)
+    names = {**nodes, **teams}
+
+    def token(m):
+        name = m.group(1)
+        if name is None:
+            return rename(m.group(0))
+        if name in names and name not in PRISM_RESERVED:
+            return f'"{names[name]}"'
+        return f'"{IDENT_RE.sub(lambda i: rename(i.group(0)), name)}"'
+
+    return TOKEN_RE.sub(token, text)
+
+
+def reorder_like(scenario: dict, source: dict, nodes: Dict[str, str], teams: Dict[str, str]) -> dict:
+    """
+    The scenario with its nodes and teams in the order of an isomorphic source
+    scenario (nodes/teams map the source's names to this scenario's).
+
+    PRISM models encode locations as node indices and teams by position, so a
+    model reused from the source is only valid for this order.
+    """
+    node_order = {nodes[n]: i for i, n in enumerate(source['graph']['nodes'])}
+    team_order = {teams[t['id']]: i for i, t in enumerate(source.get('teams', []))}
+    reordered = json.loads(json.dumps(scenario))
+    graph = reordered['graph']
+    graph['nodes'] = sorted(graph['nodes'], key=lambda n: node_order.get(n, len(node_order)))
+    reordered['teams'] = sorted(reordered.get('teams', []), key=lambda t: team_order.get(t['id'], len(team_order)))
+    return reordered
+
+
+__all__ = ['CanonicalScenario', 'RelabelError', 'LabellingBudgetError', 'canonicalize', 'scenario_digest', 'check_relabel',
+           'relabel_prism_text', 'reorder_like']
@@ -1,7 +1,8 @@
 import json, re, datetime, pathlib, time
 from utils.meta import update_meta
+from prism.objectives import apply_objective
 from typing import Optional
-from openai import OpenAI
+from utils.clients import get_openai_client
 
 # ------------------- Prompts -------------------
 SYSTEM = (
@@ -24,6 +25,8 @@ USER_TASK = (
     "- If a template is provided, use it as a reference but do not copy it verbatim.\n"
     "- Ensure syntax is valid for PRISM 4.7+.\n"
     "- Unless specified, assume all routes are bidirectional.\n"
+    "- If an edge has a \"probability\" field, use it as that route's success probability instead of "
+    "constraints.safety_probs[safety] (such edges replace a chain of routes; \"via\" lists the nodes in between).\n"
 )
 
 FENCE_MODEL_RE = re.compile(r"```prism\s*(.*?)```", re.DOTALL | re.IGNORECASE)
@@ -59,7 +62,7 @@ def _build_messages(scenario_json: str, template_text: Optional[str]) -> list[di
 
 
 def compose_prism_llm(messages: list[dict[str, str]], model: str) -> dict:
-    client = OpenAI()
+    client = get_openai_client("compose")
     resp = client.responses.create(
         model=model,
         input=messages
@@ -101,10 +104,13 @@ def _log_response(resp, out_dir: pathlib.Path, template_used: bool, start_time:
 
 
 
-def main(scenario_obj: dict, template_text: Optional[str], out_dir: pathlib.Path, model: str = "gpt-5-mini-2025-08-07"):
+def main(scenario_obj: dict, template_text: Optional[str], out_dir: pathlib.Path, model: str = "gpt-5-mini-2025-08-07",
+         metrics: tuple = ()):
     time_zero = time.time()
     messages = _build_messages(json.dumps(scenario_obj, indent=2), template_text)
     resp = compose_prism_llm(messages, model)
     _log_response(resp, out_dir, bool(template_text), time_zero, messages)
+    # Distance rewards and cost/multi-objective properties are generated, not left to the LLM
+    apply_objective(out_dir, scenario_obj, metrics)
 
     return
@@ -4,15 +4,22 @@ Extract optimal path from PRISM strategy exports.
 Parses PRISM's induced strategy (.tra), state space (.sta), and labels (.lab)
 to reconstruct the optimal path from initial state to goal using Dijkstra's algorithm.
 
-Note that, while it tries to find the goal state, if no goal state is labeled,
-it infers one based on xg >= 7 as a fallback.
+Successful paths are written as human-readable text (optimal_path.txt) and as
+delta-encoded JSON (optimal_path.json, only changed variables per step); a
+compact one-line-per-move rendering of the JSON is used in LLM prompts.
+
+Goal states are taken from the "goal" label; if the model has no such label,
+they are derived from the scenario's demands (see prism/predicates.py).
 """
 
+import json
 import pathlib
 import heapq
 import math
 from typing import Dict, List, Tuple, Any, Optional
 
+from prism.predicates import StatePredicates, compile_predicates, team_location_vars
+
 
 def parse_labels(labels_file: pathlib.Path) -> Tuple[Dict[str, int], Dict[int, List[str]]]:
     """Parse PRISM labels file (.lab) and return label mappings."""
@@ -102,15 +109,6 @@ def parse_strategy(strategy_file: pathlib.Path) -> Tuple[Dict[int, int], Dict[Tu
     return state_to_choice, transitions
 
 
-def _is_failed_state(state_id: int, states: Dict[int, Dict[str, Any]]) -> bool:
-    """Check if any team in this state has failed (location = -1)."""
-    state_vars = states.get(state_id, {})
-    for var_name, var_value in state_vars.items():
-        if var_name.startswith('loc') and var_value == -1:
-            return True
-    return False
-
-
 def _build_human_readable_output(path: List[Dict], initial_state: int, 
                                   final_state: int, path_probability: float) -> str:
     """Generate human-readable text summary of the optimal path."""
@@ -141,12 +139,114 @@ def _build_human_readable_output(path: List[Dict], initial_state: int,
     return '\n'.join(lines)
 
 
+def path_to_json(path_result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Delta-encoded form of a successful extraction (optimal_path.json).
+
+    The first step carries the full initial state; every later step lists only
+    the variables that changed. Labels, actions and transition probabilities
+    are kept per step, so path_from_json restores the path entries exactly.
+    """
+    path = path_result['path']
+    steps = []
+    previous: Dict[str, Any] = {}
+    for entry in path:
+        step: Dict[str, Any] = {'state_id': entry['state_id']}
+        if not previous:
+            step['state'] = dict(entry['state'])
+        else:
+            step['changes'] = {var: val for var, val in entry['state'].items() if previous.get(var) != val}
+        if entry.get('labels'):
+            step['labels'] = entry['labels']
+        if entry.get('action'):
+            step['action'] = entry['action']
+            step['prob'] = entry['transition_prob']
+        steps.append(step)
+        previous = entry['state']
+    return {
+        'goal_reached': path_result.get('goal_reached', True),
+        'path_probability': path_result.get('optimal_path_probability'),
+        'initial_state': path_result.get('initial_state'),
+        'final_state': path_result.get('final_state'),
+        'variables': list(path[0]['state']) if path else [],
+        'steps': steps,
+    }
+
+
+def path_from_json(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Expand optimal_path.json back into path entries (as in search_optimal_path results)."""
+    path = []
+    state: Dict[str, Any] = {}
+    cumulative = 1.0
+    for i, step in enumerate(data['steps']):
+        state = dict(step['state']) if 'state' in step else {**state, **step.get('changes', {})}
+        entry = {'step': i, 'state_id': step['state_id'], 'state': state,
+                 'labels': step.get('labels', []), 'cumulative_prob': cumulative}
+        if 'action' in step:
+            entry['action'] = step['action']
+            entry['transition_prob'] = step['prob']
+            cumulative *= step['prob']
+        path.append(entry)
+    return path
+
+
+def compact_path_text(data: Dict[str, Any], nodes: Optional[List[str]] = None) -> str:
+    """
+    One line per move, for LLM prompts: action, probability, the state it leads
+    to (id and labels) and the variables that changed.
+
+    Carries the same information as optimal_path.txt: unchanged variables are
+    left out and, with the scenario's node names, team locations are shown as
+    names (-1 = failed).
+    """
+    loc_vars = set(team_location_vars(data['variables']))
+
+    def fmt(var, val):
+        if nodes and var in loc_vars and 0 <= val < len(nodes):
+            val = nodes[val]
+        return f"{var}={val}"
+
+    def where(step):
+        labels = step.get('labels')
+        return f"state {step['state_id']}" + (f" [{','.join(labels)}]" if labels else "")
+
+    steps = data['steps']
+    moves = sum(1 for s in steps if 'action' in s)
+    lines = [f"Path: {moves} moves, goal {'reached' if data.get('goal_reached') else 'not reached'}, "
+             f"probability {data.get('path_probability') or 0:.6f}"]
+    if steps:
+        lines.append(f"Start ({where(steps[0])}): " + " ".join(fmt(v, x) for v, x in steps[0]['state'].items()))
+    for i, step in enumerate(steps):
+        if 'action' not in step:
+            continue
+        following = steps[i + 1] if i + 1 < len(steps) else None
+        target = f" {where(following)}:" if following else ""
+        changes = following.get('changes', {}) if following else {}
+        lines.append(f"{i + 1}. {step['action']} p={step['prob']:g} ->{target} "
+                     + " ".join(fmt(v, x) for v, x in changes.items()))
+    return '\n'.join(lines)
+
+
+def write_optimal_path(path_result: Dict[str, Any], output_dir: pathlib.Path,
+                       filename: str = 'optimal_path.txt') -> pathlib.Path:
+    """Write a successful extraction as text (default optimal_path.txt) and delta-encoded JSON alongside."""
+    human_file = output_dir / filename
+    human_file.write_text(path_result['text'])
+    json_file = human_file.with_suffix('.json')
+    json_file.write_text(json.dumps(path_to_json(path_result), separators=(',', ':')))
+    path_result['txt_file'] = str(human_file)
+    path_result['json_file'] = str(json_file)
+    return human_file
+
+
 def extract_optimal_path(
     strategy_file: pathlib.Path,
     states_file: pathlib.Path,
     labels_file: pathlib.Path,
     output_dir: pathlib.Path,
-    max_steps: int = 100
+    max_steps: int = 100,
+    write_output: bool = True,
+    scenario: Optional[dict] = None
 ) -> Dict[str, Any]:
     """
     Extract the optimal path from PRISM strategy exports.
@@ -154,7 +254,12 @@ def extract_optimal_path(
     Uses Dijkstra's algorithm to find the highest probability path from 
     initial to goal state, excluding states where teams have failed.
     
-    Returns a dictionary with path information and success status.
+    If the exports carry no "goal" label, goal states are derived from
+    scenario (the validated scenario dict) demands.
+
+    Returns a dictionary with path information and success status. The
+    human-readable rendering is returned under 'text'; with write_output=False
+    it is not written to disk (see write_optimal_path).
     """
     # Parse all files
     label_to_id, state_to_labels = parse_labels(labels_file)
@@ -167,15 +272,38 @@ def extract_optimal_path(
         return {'status': 'error', 'message': 'No initial state found'}
     initial_state = init_states[0]
     
-    # Find goal states
-    goal_states = set(sid for sid, labels in state_to_labels.items() if "goal" in labels)
-    if not goal_states:
-        # Fallback: infer from xg >= 7
-        print("  ⚠ No 'goal' label found, inferring from xg >= 7...")
-        for state_id, state_vars in states.items():
-            if 'xg' in state_vars and state_vars['xg'] >= 7:
-                goal_states.add(state_id)
-    
+    # Goal and failure masks, evaluated once over the whole state space
+    if scenario and not any("goal" in labels for labels in state_to_labels.values()):
+        print("  ⚠ No 'goal' label found, deriving goal from scenario demands...")
+    try:
+        predicates = compile_predicates(var_names, states, scenario, state_to_labels)
+    except ValueError as exc:
+        return {'status': 'error', 'message': str(exc)}
+
+    result = search_optimal_path(initial_state, states, state_to_labels, state_to_choice,
+                                 transitions, predicates, max_steps)
+    if result['status'] == 'success' and write_output:
+        write_optimal_path(result, output_dir)
+    return result
+
+
+def search_optimal_path(
+    initial_state: int,
+    states: Dict[int, Dict[str, Any]],
+    state_to_labels: Dict[int, List[str]],
+    state_to_choice: Dict[int, int],
+    transitions: Dict[Tuple[int, int], List[Tuple[int, float, Optional[str]]]],
+    predicates: StatePredicates,
+    max_steps: int = 100
+) -> Dict[str, Any]:
+    """
+    Find the highest probability path under a fixed strategy.
+
+    state_to_choice/transitions are in the format returned by parse_strategy;
+    any strategy (PRISM's induced strategy, a Pareto trade-off policy, a
+    re-planned policy) can be searched from any initial state.
+    """
+    goal_states = predicates.goal_states()
     if not goal_states:
         return {'status': 'error', 'message': 'No goal states found'}
     
@@ -193,7 +321,7 @@ def extract_optimal_path(
             continue
         
         # Skip failed states
-        if _is_failed_state(current_state, states):
+        if predicates.is_failed(current_state):
             continue
         
         # Build current step
@@ -207,7 +335,7 @@ def extract_optimal_path(
         path = path_so_far + [current_entry]
         
         # Check if we reached goal
-        if current_state in goal_states:
+        if predicates.is_goal(current_state):
             # Annotate path with actions and probabilities
             path_probability = 1.0
             for i in range(len(path) - 1):
@@ -222,21 +350,17 @@ def extract_optimal_path(
                         path[i]['transition_prob'] = prob
                         break
             
-            # Write human-readable output
-            output_text = _build_human_readable_output(path, initial_state, current_state, path_probability)
-            human_file = output_dir / 'optimal_path.txt'
-            human_file.write_text(output_text)
-            
-            return {
+            result = {
                 'status': 'success',
                 'path': path,
                 'num_steps': len(path),
-                'txt_file': str(human_file),
+                'text': _build_human_readable_output(path, initial_state, current_state, path_probability),
                 'goal_reached': True,
                 'optimal_path_probability': path_probability,
                 'initial_state': initial_state,
                 'final_state': current_state
             }
+            return result
         
         # Check max steps limit
         if len(path) > max_steps:
@@ -269,4 +393,5 @@ def extract_optimal_path(
     }
 
 
-__all__ = ['extract_optimal_path', 'parse_labels', 'parse_states', 'parse_strategy']
+__all__ = ['extract_optimal_path', 'search_optimal_path', 'write_optimal_path', 'path_to_json', 'path_from_json',
+           'compact_path_text', 'parse_labels', 'parse_states', 'parse_strategy']
@@ -1,16 +1,213 @@
-from openai import OpenAI
-import datetime
+"""
+LLM auto-fix of PRISM models that PRISM rejects.
 
+The fixer first tries a localized patch: the error location is taken from
+PRISM's output ('... ("xb", line 70, column 74)'), and only the lines around it
+plus the declarations of the identifiers on the offending line are sent. The
+LLM answers with a unified diff, which is applied to model.prism. When the
+error has no location in the model (e.g. it is in the properties file or is
+found during model checking) or the patch does not apply, the whole model is
+sent and returned as before.
+
+Every attempt records its tokens, latency and prompt size next to the
+full-model baseline (the size of the prompt and of the output a full-model
+round trip would have needed).
+"""
+
+from utils.clients import get_openai_client
+import datetime, re, time
+
+ERROR_LINE_RE = re.compile(r"^Error:.*$", re.MULTILINE)
+LOCATION_RE = re.compile(r'(?:\("(?P<token>[^"]*)", )?line (?P<line>\d+)(?:-(?P<end>\d+))?, column (?P<col>\d+)')
+PARSING_RE = re.compile(r'^Parsing (PRISM model|properties) file', re.MULTILINE)
+DECLARATION_RES = (
+    re.compile(r"^\s*(?:global\s+)?([A-Za-z_]\w*)\s*:\s*(?:\[|bool\b)"),
+    re.compile(r"^\s*const\s+(?:int\s+|double\s+|bool\s+)?([A-Za-z_]\w*)\b"),
+    re.compile(r"^\s*formula\s+([A-Za-z_]\w*)\b"),
+    re.compile(r"^\s*label\s+\"([^\"]+)\""),
+)
+MODULE_RE = re.compile(r"^\s*module\s+(\w+)")
+IDENT_RE = re.compile(r"\b[A-Za-z_]\w*\b")
+HUNK_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+# Lines of context on each side of the offending line(s)
+CONTEXT_LINES = 3
+# Rough characters per token, for the baseline output estimate
+CHARS_PER_TOKEN = 4
+
+
+class PatchError(ValueError):
+    """The LLM's diff could not be applied to the model."""
+
+
+def locate_error(error_output):
+    """
+    Location of the first PRISM error in model.prism, or None.
+
+    Returns {'message', 'line', 'end_line', 'column', 'token'}; None when there
+    is no line number or the error was raised while parsing the properties file.
+    """
+    m = ERROR_LINE_RE.search(error_output)
+    if not m:
+        return None
+    parsing = [p.group(1) for p in PARSING_RE.finditer(error_output, 0, m.start())]
+    if parsing and parsing[-1] == 'properties':
+        return None
+    loc = LOCATION_RE.search(m.group(0))
+    if not loc:
+        return None
+    line = int(loc.group('line'))
+    return {
+        'message': m.group(0),
+        'line': line,
+        'end_line': int(loc.group('end') or line),
+        'column': int(loc.group('col')),
+        'token': loc.group('token'),
+    }
+
+
+def error_excerpt(model_code, location, context=CONTEXT_LINES):
+    """
+    The offending lines with their context, the declarations of every identifier
+    on them and the headers of the modules involved, as numbered lines.
+
+    Returns (excerpt text, number of model lines included).
+    """
+    lines = model_code.split('\n')
+    first = max(location['line'] - context, 1)
+    last = min(location['end_line'] + context, len(lines))
+    keep = set(range(first, last + 1))
+
+    used = set()
+    for n in range(location['line'], min(location['end_line'], len(lines)) + 1):
+        code = lines[n - 1].split('//', 1)[0]
+        used.update(IDENT_RE.findall(code))
+    if location.get('token'):
+        used.add(location['token'])
+
+    module_of = {}
+    current = None
+    for n, text in enumerate(lines, start=1):
+        header = MODULE_RE.match(text)
+        if header:
+            current = n
+        elif text.strip() == 'endmodule':
+            current = None
+        module_of[n] = current
+        for pattern in DECLARATION_RES:
+            decl = pattern.match(text)
+            if decl and decl.group(1) in used:
+                keep.add(n)
+    keep |= {module_of[n] for n in list(keep) if module_of.get(n)}
+
+    out = []
+    previous = 0
+    for n in sorted(keep):
+        if n > previous + 1:
+            out.append("   ...")
+        out.append(f"{n:>4}| {lines[n - 1]}")
+        previous = n
+    if previous < len(lines):
+        out.append("   ...")
+    return "\n".join(out), len(keep)
+
+
+def _strip_fences(text):
+    text = text.strip()
+    if text.startswith("```"):
+        lines = text.split('\n')
+        text = '\n'.join(lines[1:-1]) if lines[-1].strip() == "```" else '\n'.join(lines[1:])
+    return text
+
+
+def _parse_hunks(diff):
+    hunks = []
+    for line in _strip_fences(diff).split('\n'):
+        m = HUNK_RE.match(line)
+        if m:
+            hunks.append({'start': int(m.group(1)), 'ops': []})
+            continue
+        # File headers (---/+++) come before the first hunk; inside a hunk they
+        # are removed or added lines
+        if not hunks or line.startswith('\\'):
+            continue
+        # A blank context line often loses its leading space
+        op = line[0] if line[:1] in ('-', '+') else ' '
+        hunks[-1]['ops'].append((op, line[1:]))
+    for hunk in hunks:
+        hunk['old'] = [text for op, text in hunk['ops'] if op != '+']
+    return hunks
+
+
+def _find_block(lines, block, start):
+    """Index where block occurs in lines, nearest to start; exact match first, then ignoring whitespace."""
+    for norm in (str.rstrip, lambda s: " ".join(s.split())):
+        wanted = [norm(b) for b in block]
+        hits = [i for i in range(len(lines) - len(block) + 1)
+                if [norm(l) for l in lines[i:i + len(block)]] == wanted]
+        if hits:
+            return min(hits, key=lambda i: abs(i - start))
+    return None
+
+
+def apply_unified_diff(model_code, diff):
+    """
+    Apply a unified diff to the model text.
+
+    Hunks are located by their context and removed lines (nearest to the line
+    number in the hunk header), so slightly wrong line numbers still apply.
+    Raises PatchError if the diff has no hunks or a hunk does not match.
+    """
+    hunks = _parse_hunks(diff)
+    if not hunks:
+        raise PatchError("no hunks in the reply")
+    lines = model_code.split('\n')
+    placed = []
+    for hunk in hunks:
+        if not hunk['old']:
+            index = min(max(hunk['start'], 0), len(lines))
+        else:
+            index = _find_block(lines, hunk['old'], hunk['start'] - 1)
+            if index is None:
+                raise PatchError(f"hunk at line {hunk['start']} does not match the model")
+        placed.append((index, hunk))
+    placed.sort(key=lambda p: p[0])
+    for (i, a), (j, _) in zip(placed, placed[1:]):
+        if i + len(a['old']) > j:
+            raise PatchError("overlapping hunks")
+    for index, hunk in reversed(placed):
+        # Context lines keep the model's own text (the reply may have altered their whitespace)
+        original = iter(lines[index:index + len(hunk['old'])])
+        new = []
+        for op, text in hunk['ops']:
+            if op == '+':
+                new.append(text)
+            elif op == ' ':
+                new.append(next(original))
+            else:
+                next(original)
+        lines[index:index + len(hunk['old'])] = new
+    return '\n'.join(lines)
 
-def attempt_autofix(model_path, props_path, error_output, model):
-    """Attempt to fix PRISM model errors using ChatGPT."""
-    client = OpenAI()
-    
-    # Read current model and properties
-    model_code = model_path.read_text(encoding='utf-8')
-    props_code = props_path.read_text(encoding='utf-8')
-    
-    fix_prompt = f"""You are a PRISM model checker expert. The following PRISM model has errors.
+
+def _respond(prompt, model):
+    """Send one prompt; returns (output text, usage dict, latency in seconds)."""
+    client = get_openai_client("autofix")
+    started = time.time()
+    resp = client.responses.create(
+        model=model,
+        input=[{"role": "user", "content": prompt}],
+    )
+    usage = getattr(resp, "usage", None)
+    tokens = {
+        'input_tokens': getattr(usage, 'input_tokens', None),
+        'output_tokens': getattr(usage, 'output_tokens', None),
+    }
+    return resp.output_text, tokens, round(time.time() - started, 3)
+
+
+def _full_prompt(model_code, props_code, error_output):
+    return f"""You are a PRISM model checker expert. The following PRISM model has errors.
 
 MODEL:
 ```
@@ -30,12 +227,64 @@ ERROR OUTPUT:
 TASK:
 Fix the PRISM model to resolve the errors. Return ONLY the corrected model code, no explanations or markdown formatting."""
 
-    resp = client.responses.create(
-        model=model,
-        input=[{"role": "user", "content": fix_prompt}],
-    )
-    
-    return resp.output_text
+
+def _patch_prompt(excerpt, message):
+    return f"""You are a PRISM model checker expert. PRISM rejected the model model.prism.
+
+ERROR:
+{message}
+
+EXCERPT of model.prism (line numbers on the left, "..." marks omitted lines). It shows the lines around
+the error, the declarations of the identifiers used on the offending line and their module headers:
+```
+{excerpt}
+```
+
+TASK:
+Fix the error with the smallest possible change. Return ONLY a unified diff against model.prism:
+--- a/model.prism
++++ b/model.prism
+@@ -<line>,<count> +<line>,<count> @@
+Use the line numbers shown, and copy unchanged context lines exactly as shown but without the line
+numbers. No explanations or markdown."""
+
+
+def autofix(model_path, props_path, error_output, model):
+    """
+    Fix the model with a localized patch, falling back to a full-model round trip.
+
+    Returns (fixed model code, attempt record for prism_error_recovery).
+    """
+    model_code = model_path.read_text(encoding='utf-8')
+    props_code = props_path.read_text(encoding='utf-8')
+    full_prompt = _full_prompt(model_code, props_code, error_output)
+    record = {
+        'baseline_prompt_chars': len(full_prompt),
+        'baseline_output_tokens_est': len(model_code) // CHARS_PER_TOKEN,
+        'model_lines': len(model_code.split('\n')),
+    }
+
+    location = locate_error(error_output)
+    if location:
+        excerpt, excerpt_lines = error_excerpt(model_code, location)
+        prompt = _patch_prompt(excerpt, location['message'])
+        diff, tokens, latency = _respond(prompt, model)
+        record['patch'] = {'line': location['line'], 'excerpt_lines': excerpt_lines,
+                           'prompt_chars': len(prompt), **tokens, 'latency_s': latency}
+        try:
+            patched = apply_unified_diff(model_code, diff)
+        except PatchError as exc:
+            record['patch']['error'] = str(exc)
+        else:
+            if patched != model_code:
+                record['fix'] = 'patch'
+                return patched, record
+            record['patch']['error'] = "patch left the model unchanged"
+
+    fixed, tokens, latency = _respond(full_prompt, model)
+    record['fix'] = 'full'
+    record['full'] = {'prompt_chars': len(full_prompt), **tokens, 'latency_s': latency}
+    return fixed, record
 
 
 def save_fixed_model(model_path, fixed_code):
@@ -45,13 +294,10 @@ def save_fixed_model(model_path, fixed_code):
     backup_path = model_path.with_suffix(f'.prism.broken-{timestamp}')
     if model_path.exists():
         backup_path.write_text(model_path.read_text(encoding='utf-8'), encoding='utf-8')
-    
+
     # Strip markdown code blocks if present
-    fixed_code = fixed_code.strip()
-    if fixed_code.startswith("```"):
-        lines = fixed_code.split('\n')
-        fixed_code = '\n'.join(lines[1:-1]) if lines[-1].strip() == "```" else '\n'.join(lines[1:])
-    
+    fixed_code = _strip_fences(fixed_code)
+
     model_path.write_text(fixed_code, encoding='utf-8')
-    
+
     return str(backup_path)
@@ -0,0 +1,189 @@
+"""
+Reward structures and properties for the non-reachability objectives.
+
+ScenarioObjective.min_expected_cost and .multi_objective need the distance of
+every move. Rather than relying on the composer LLM to write them, a
+"dist" reward structure is generated from the model's move labels and the
+scenario's edge distances, and the matching R{"dist"} / multi(...) property is
+appended after the primary Pmax property (property 1 stays the one PRISM
+verifies and exports a strategy for).
+
+Optional metric properties (METRICS) are evaluated in the same PRISM run as
+the properties file: the minimum goal probability, the maximum probability of
+meeting each demand on its own, and the minimum expected number of steps
+until the mission ends (from a generated "steps" reward). write_run_properties
+puts them, with every property of properties.props, into verification.props;
+the primary property goes last, so the strategy and value vector PRISM
+exports (overwritten per property) belong to it.
+"""
+
+import pathlib
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from prism.actions import decode_action, edge_lookup, model_action_labels
+from utils.meta import update_meta
+
+REWARD_NAME = "dist"
+STEPS_REWARD = "steps"
+METRICS = ("pmin", "demands", "steps")
+RUN_PROPERTIES_FILE = "verification.props"
+
+OBJECTIVE_PROPERTIES = {
+    "max_reach_prob": [],
+    # Until the goal or a deadlock: F "goal" alone is infinite whenever a team can fail
+    "min_expected_cost": [f'R{{"{REWARD_NAME}"}}min=? [ F ("goal" | "deadlock") ]'],
+    "multi_objective": [f'multi(Pmax=? [ F "goal" ], R{{"{REWARD_NAME}"}}min=? [ C ])'],
+}
+
+
+def distance_rewards(model_text: str, scenario: dict) -> Optional[str]:
+    """Build a rewards "dist" block charging each move its edge distance."""
+    lookup = edge_lookup(scenario)
+    lines = [f'rewards "{REWARD_NAME}" // JSON:/graph/edges[*].distance']
+    for label in model_action_labels(model_text):
+        move = decode_action(label)
+        edge = lookup.get((move['src'], move['dst'])) if move else None
+        if edge is not None:
+            lines.append(f"    [{label}] true : {edge['distance']};")
+    if len(lines) == 1:
+        return None
+    lines.append("endrewards")
+    return "\n".join(lines)
+
+
+def goal_expression(scenario: dict) -> Optional[str]:
+    """All demands met, as a PRISM expression over the node counters."""
+    terms = [f"(x{d['node']} >= {d['qty']})" for d in scenario.get('demands', []) if d['qty'] > 0]
+    return " & ".join(terms) if terms else None
+
+
+def goal_label(scenario: dict) -> Optional[str]:
+    """Build a "goal" label from Scenario.demands (all demands met)."""
+    goal = goal_expression(scenario)
+    if goal is None:
+        return None
+    return f'label "goal" = {goal}; // JSON:/demands'
+
+
+def steps_rewards() -> str:
+    """A rewards "steps" block: one per state visited, so reachability rewards count moves."""
+    return f'rewards "{STEPS_REWARD}" // generated for the steps metric\n    true : 1;\nendrewards'
+
+
+def metric_properties(scenario: dict, metrics: Sequence[str], model_text: str) -> List[Tuple[str, str]]:
+    """(name, property) of each requested metric that the model supports."""
+    goal = goal_expression(scenario)
+    if goal is None:
+        return []
+    props = []
+    if "pmin" in metrics:
+        props.append(("pmin", f"Pmin=? [ F ({goal}) ]"))
+    if "demands" in metrics:
+        for d in scenario.get('demands', []):
+            if d['qty'] > 0:
+                props.append((f"reach_{d['node']}", f"Pmax=? [ F (x{d['node']} >= {d['qty']}) ]"))
+    if "steps" in metrics and f'rewards "{STEPS_REWARD}"' in model_text:
+        props.append(("steps", f'R{{"{STEPS_REWARD}"}}min=? [ F (({goal}) | "deadlock") ]'))
+    return props
+
+
+def split_properties(props_text: str) -> Tuple[List[str], List[str]]:
+    """
+    Split a properties file into (declarations, properties).
+
+    Declarations are const/label/formula statements; properties are numbered
+    by PRISM in file order. A statement ends at ';' or at the end of a line
+    with balanced brackets.
+    """
+    declarations, properties = [], []
+    current = ""
+    for line in props_text.split('\n'):
+        code = line.split('//', 1)[0].strip()
+        if not code:
+            continue
+        for part in code.split(';'):
+            current = f"{current} {part}".strip()
+            balanced = all(current.count(a) == current.count(b) for a, b in ("()", "[]", "{}"))
+            if current and balanced:
+                is_decl = current.split(None, 1)[0] in ("const", "label", "formula")
+                (declarations if is_decl else properties).append(current)
+                current = ""
+    if current:
+        properties.append(current)
+    return declarations, properties
+
+
+def write_run_properties(out_dir: pathlib.Path, scenario: dict,
+                         metrics: Sequence[str] = ()) -> Tuple[pathlib.Path, List[Dict[str, object]]]:
+    """
+    Write verification.props: every property of properties.props plus the
+    requested metrics, with the primary property (property 1) last.
+
+    Returns (path, one entry per property in run order: property, source, primary).
+    """
+    model_path = out_dir / "model.prism"
+    model_text = model_path.read_text(encoding='utf-8') if model_path.exists() else ""
+    declarations, properties = split_properties((out_dir / "properties.props").read_text(encoding='utf-8'))
+
+    entries: List[Dict[str, object]] = []
+    for i, prop in enumerate(properties[1:], start=2):
+        entries.append({'property': prop, 'source': f"properties.props#{i}", 'primary': False})
+    for name, prop in metric_properties(scenario, metrics, model_text):
+        entries.append({'property': prop, 'source': f"metric:{name}", 'primary': False})
+    if properties:
+        entries.append({'property': properties[0], 'source': "properties.props#1", 'primary': True})
+
+    lines = [f"{d};" for d in declarations]
+    lines += [f"// {e['source']}\n{e['property']}" for e in entries]
+    path = out_dir / RUN_PROPERTIES_FILE
+    path.write_text("\n".join(lines) + "\n", encoding='utf-8')
+    return path, entries
+
+
+def objective_properties(scenario: dict) -> List[str]:
+    objective = scenario.get('objective', 'max_reach_prob')
+    return list(OBJECTIVE_PROPERTIES.get(objective, []))
+
+
+def apply_objective(out_dir: pathlib.Path, scenario: dict, metrics: Sequence[str] = ()) -> None:
+    """Add the reward structures, goal label and properties the scenario objective and metrics need."""
+    objective = scenario.get('objective', 'max_reach_prob')
+    model_path = out_dir / "model.prism"
+    props_path = out_dir / "properties.props"
+    needs_steps = "steps" in metrics
+    if (objective == "max_reach_prob" and not needs_steps) or not (model_path.exists() and props_path.exists()):
+        return
+
+    model_text = model_path.read_text(encoding='utf-8')
+    props_text = props_path.read_text(encoding='utf-8')
+    added = []
+
+    if needs_steps and f'rewards "{STEPS_REWARD}"' not in model_text:
+        model_text = model_text.rstrip() + "\n\n" + steps_rewards() + "\n"
+        added.append(f'rewards "{STEPS_REWARD}"')
+
+    if objective != "max_reach_prob" and 'label "goal"' not in model_text:
+        label = goal_label(scenario)
+        if label:
+            model_text = model_text.rstrip() + "\n\n" + label + "\n"
+            added.append('label "goal"')
+
+    if objective != "max_reach_prob" and f'rewards "{REWARD_NAME}"' not in model_text:
+        rewards = distance_rewards(model_text, scenario)
+        if rewards:
+            model_text = model_text.rstrip() + "\n\n" + rewards + "\n"
+            added.append(f'rewards "{REWARD_NAME}"')
+
+    for prop in objective_properties(scenario):
+        if prop not in props_text:
+            props_text = props_text.rstrip() + "\n\n// Objective: " + objective + " (generated)\n" + prop + "\n"
+            added.append(prop)
+
+    model_path.write_text(model_text, encoding='utf-8')
+    props_path.write_text(props_text, encoding='utf-8')
+    update_meta(out_dir, "objective", {'objective': objective, 'generated': added})
+
+
+__all__ = ['REWARD_NAME', 'STEPS_REWARD', 'METRICS', 'RUN_PROPERTIES_FILE', 'apply_objective', 'distance_rewards',
+           'goal_expression', 'goal_label', 'metric_properties', 'objective_properties', 'split_properties',
+           'steps_rewards', 'write_run_properties']
@@ -0,0 +1,310 @@
+"""
+Pareto front between success probability and expected distance.
+
+Instead of one PRISM run per weight, the full MDP exported by PRISM
+(full.tra, with states and labels in strat.sta/.lab) is solved here for a
+whole batch of weights at once: every value-iteration sweep updates a vector
+of values (one per weight) for each state, maximising
+
+    w * P(reach goal) - (1 - w) * E[distance] / cost_scale
+
+Teams may also halt (value 0), so a policy is never forced to wander forever
+when the goal is out of reach. Each weight's policy is then evaluated exactly
+for its (probability, expected distance) point, dominated points are dropped,
+and the policy of the chosen trade-off point is handed to the usual Dijkstra
+path search. With interchangeable teams the value iteration runs on the
+symmetry quotient (prism/symmetry.py) and the policies are mapped back, once
+the exported MDP has been checked to be symmetric under them.
+"""
+
+import json
+import pathlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from prism.actions import decode_action, edge_lookup
+from prism.extract_path import parse_labels, parse_states, search_optimal_path
+from prism.predicates import compile_predicates
+from prism.symmetry import TeamSymmetry, check_symmetry, interchangeable_groups, lift_policy, quotient
+from utils.meta import update_meta
+
+# (action, [(dest, prob), ...]) per choice index
+Choices = Dict[int, Dict[int, Tuple[Optional[str], List[Tuple[int, float]]]]]
+
+DEFAULT_WEIGHTS = [i / 20 for i in range(21)]
+# The selected policy, as a strategy export over the states of strat.sta (for the policy table)
+STRATEGY_FILE = "pareto_strat.tra"
+# Sweep cap of the value iterations; a run that hits it is reported as not converged
+MAX_ITERS = 10000
+# min_expected_cost: relative shortfall from the maximum success probability a cheaper point may have
+PROBABILITY_TOLERANCE = 0.01
+
+
+def parse_mdp(tra_file: pathlib.Path) -> Choices:
+    """Parse a full MDP transitions file (.tra) into per-state choices."""
+    lines = tra_file.read_text().strip().split('\n')
+    choices: Choices = {}
+    for line in lines[1:]:  # Skip header
+        parts = line.split()
+        if len(parts) < 4:
+            continue
+        state, choice, dest, prob = int(parts[0]), int(parts[1]), int(parts[2]), float(parts[3])
+        action = parts[4] if len(parts) > 4 else None
+        entry = choices.setdefault(state, {}).setdefault(choice, (action, []))
+        entry[1].append((dest, prob))
+    return choices
+
+
+def choice_costs(choices: Choices, scenario: dict) -> Dict[Tuple[int, int], float]:
+    """Distance of each (state, choice), from its move label and the scenario edges."""
+    lookup = edge_lookup(scenario)
+    costs = {}
+    for state, by_choice in choices.items():
+        for choice, (action, _) in by_choice.items():
+            move = decode_action(action)
+            edge = lookup.get((move['src'], move['dst'])) if move else None
+            costs[(state, choice)] = float(edge['distance']) if edge else 0.0
+    return costs
+
+
+def solve_weighted(choices: Choices, costs: Dict[Tuple[int, int], float], goal_states: set,
+                   weights: List[float], cost_scale: float,
+                   tol: float = 1e-9, max_iters: int = MAX_ITERS) -> Tuple[List[Dict[int, Optional[int]]], Dict[str, Any]]:
+    """
+    Batched value iteration.
+
+    Returns one policy (state -> choice, None = halt) per weight, and
+    {'iterations', 'converged', 'residual'} (the largest value change of the
+    last sweep).
+    """
+    n = len(weights)
+    states = sorted(choices)
+    values = {s: ([w for w in weights] if s in goal_states else [0.0] * n) for s in states}
+    penalties = [(1 - w) / cost_scale for w in weights]
+
+    def backup(state):
+        best = [0.0] * n
+        arg = [None] * n
+        for choice, (_, succ) in choices[state].items():
+            cost = costs[(state, choice)]
+            q = [-penalties[k] * cost for k in range(n)]
+            for dest, prob in succ:
+                dest_values = values.get(dest)
+                if dest_values is None:
+                    continue
+                for k in range(n):
+                    q[k] += prob * dest_values[k]
+            for k in range(n):
+                if q[k] > best[k] + 1e-15:
+                    best[k] = q[k]
+                    arg[k] = choice
+        return best, arg
+
+    iterations, delta = 0, 0.0
+    while iterations < max_iters:
+        iterations += 1
+        delta = 0.0
+        for state in states:
+            if state in goal_states:
+                continue
+            best, _ = backup(state)
+            old = values[state]
+            delta = max(delta, max(abs(b - o) for b, o in zip(best, old)))
+            values[state] = best
+        if delta < tol:
+            break
+
+    policies: List[Dict[int, Optional[int]]] = [dict() for _ in weights]
+    for state in states:
+        if state in goal_states:
+            continue
+        _, arg = backup(state)
+        for k in range(n):
+            policies[k][state] = arg[k]
+    return policies, {'iterations': iterations, 'converged': delta < tol, 'residual': delta}
+
+
+def evaluate_policy(choices: Choices, costs: Dict[Tuple[int, int], float], goal_states: set,
+                    policy: Dict[int, Optional[int]], initial_state: int,
+                    tol: float = 1e-10, max_iters: int = MAX_ITERS) -> Tuple[float, float, Dict[str, Any]]:
+    """
+    Success probability and expected distance of a fixed policy, by iterating
+    to a fixed point; the third value is {'iterations', 'converged', 'residual'}.
+    """
+    prob = {s: (1.0 if s in goal_states else 0.0) for s in choices}
+    dist = {s: 0.0 for s in choices}
+    acting = [s for s in sorted(choices) if s not in goal_states and policy.get(s) is not None]
+    iterations, delta = 0, 0.0
+    while iterations < max_iters:
+        iterations += 1
+        delta = 0.0
+        for state in acting:
+            choice = policy[state]
+            _, succ = choices[state][choice]
+            p = sum(pr * prob.get(d, 0.0) for d, pr in succ)
+            e = costs[(state, choice)] + sum(pr * dist.get(d, 0.0) for d, pr in succ)
+            delta = max(delta, abs(p - prob[state]), abs(e - dist[state]))
+            prob[state], dist[state] = p, e
+        if delta < tol:
+            break
+    return prob.get(initial_state, 0.0), dist.get(initial_state, 0.0), \
+        {'iterations': iterations, 'converged': delta < tol, 'residual': delta}
+
+
+def pareto_filter(points: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Keep points not dominated in (higher probability, lower distance)."""
+    front = []
+    for p in sorted(points, key=lambda x: (-x['probability'], x['expected_distance'])):
+        if front and front[-1]['expected_distance'] <= p['expected_distance'] + 1e-9:
+            continue
+        front.append(p)
+    return front
+
+
+def select_tradeoff(front: List[Dict[str, Any]], objective: str, weight: Optional[float] = None,
+                    tolerance: float = PROBABILITY_TOLERANCE) -> Dict[str, Any]:
+    """
+    Pick the trade-off point for the scenario objective.
+
+    max_reach_prob: the maximum probability point, i.e. the cheapest policy
+    among those that maximise success probability.
+    min_expected_cost: the point with the smallest expected distance among
+    those whose success probability is within `tolerance` (relative) of the
+    maximum; cheaper points give up success, down to halting at once.
+    multi_objective: the point whose weight is closest to `weight` (default 0.5).
+    """
+    if objective == "multi_objective":
+        target = 0.5 if weight is None else weight
+        return min(front, key=lambda p: min(abs(w - target) for w in p['weights']))
+    if objective == "min_expected_cost":
+        floor = front[0]['probability'] * (1 - tolerance)
+        return min((p for p in front if p['probability'] >= floor), key=lambda p: p['expected_distance'])
+    return front[0]
+
+
+def _policy_as_strategy(choices: Choices, policy: Dict[int, Optional[int]]):
+    """Convert a policy into parse_strategy's (state_to_choice, transitions) format."""
+    state_to_choice = {}
+    transitions = {}
+    for state, choice in policy.items():
+        if choice is None:
+            continue
+        action, succ = choices[state][choice]
+        state_to_choice[state] = choice
+        transitions[(state, choice)] = [(dest, prob, action) for dest, prob in succ]
+    return state_to_choice, transitions
+
+
+def write_strategy(path: pathlib.Path, choices: Choices, policy: Dict[int, Optional[int]]) -> pathlib.Path:
+    """Write a policy in the format of PRISM's strategy exports (.tra); halting states have no choice."""
+    lines = []
+    for state in sorted(policy):
+        choice = policy[state]
+        if choice is None:
+            continue
+        action, succ = choices[state][choice]
+        lines += [f"{state} {choice} {dest} {prob}" + (f" {action}" if action else "") for dest, prob in succ]
+    acting = sum(1 for c in policy.values() if c is not None)
+    path.write_text(f"{len(choices)} {acting} {len(lines)}\n" + "\n".join(lines) + "\n")
+    return path
+
+
+def compute_pareto(out_dir: pathlib.Path, scenario: dict, weights: Optional[List[float]] = None,
+                   weight: Optional[float] = None, cost_scale: Optional[float] = None,
+                   max_steps: int = 100, max_iters: int = MAX_ITERS) -> Dict[str, Any]:
+    """
+    Compute the Pareto front from full.tra (+ strat.sta/.lab) and extract the path for the chosen point.
+
+    cost_scale normalises distances against probability in the weighted sum
+    (default: total length of all scenario edges); max_iters caps every value
+    iteration, and whether they converged is reported under 'solver'. Writes
+    pareto.json and the selected policy to pareto_strat.tra, and returns
+    {'front', 'selected', 'solver', 'path_result'}.
+    """
+    weights = sorted(set(weights or DEFAULT_WEIGHTS))
+    tra, sta, lab = out_dir / "full.tra", out_dir / "strat.sta", out_dir / "strat.lab"
+    if not (tra.exists() and sta.exists() and lab.exists()):
+        return {'status': 'error', 'message': 'Full model exports (full.tra, strat.sta/.lab) not found'}
+
+    _, state_to_labels = parse_labels(lab)
+    var_names, states = parse_states(sta)
+    choices = parse_mdp(tra)
+    for state in states:
+        choices.setdefault(state, {})
+    costs = choice_costs(choices, scenario)
+
+    init_states = [sid for sid, labels in state_to_labels.items() if "init" in labels]
+    if not init_states:
+        return {'status': 'error', 'message': 'No initial state found'}
+    initial_state = init_states[0]
+    predicates = compile_predicates(var_names, states, scenario, state_to_labels)
+    goal_states = predicates.goal_states()
+
+    if cost_scale is None:
+        cost_scale = sum(e['distance'] for e in scenario['graph']['edges']) or 1.0
+
+    # Solve on the quotient under interchangeable teams, then map back to concrete teams
+    groups = interchangeable_groups(scenario, var_names)
+    symmetry = TeamSymmetry(var_names, scenario, groups) if groups else None
+    if symmetry:
+        violation = check_symmetry(choices, states, state_to_labels, symmetry)
+        checked = {'verified': violation is None, 'violation': violation}
+        if violation:
+            checked.update({'applied': False, 'orbits': None, 'factor': None})
+        update_meta(out_dir, "symmetry", checked, merge=True)
+        if violation:
+            print(f"  ⚠ Exported MDP is not symmetric ({violation}); solving the full MDP")
+            symmetry = None
+    if symmetry:
+        q_choices, rep_of = quotient(choices, states, symmetry)
+        q_goals = {s for s in goal_states if rep_of.get(s) == s}
+        policies, solved = solve_weighted(q_choices, choice_costs(q_choices, scenario), q_goals, weights,
+                                          cost_scale, max_iters=max_iters)
+        policies = [lift_policy(p, choices, states, rep_of, symmetry) for p in policies]
+    else:
+        policies, solved = solve_weighted(choices, costs, goal_states, weights, cost_scale, max_iters=max_iters)
+    solved_states = len(q_choices) if symmetry else len(choices)
+
+    points: Dict[Tuple[float, float], Dict[str, Any]] = {}
+    unconverged = []
+    for w, policy in zip(weights, policies):
+        p, e, evaluated = evaluate_policy(choices, costs, goal_states, policy, initial_state, max_iters=max_iters)
+        if not evaluated['converged']:
+            unconverged.append(w)
+        key = (round(p, 12), round(e, 9))
+        point = points.setdefault(key, {'probability': p, 'expected_distance': e, 'weights': [], '_policy': policy})
+        point['weights'].append(w)
+    front = pareto_filter(list(points.values()))
+    selected = select_tradeoff(front, scenario.get('objective', 'max_reach_prob'), weight)
+
+    write_strategy(out_dir / STRATEGY_FILE, choices, selected['_policy'])
+    state_to_choice, transitions = _policy_as_strategy(choices, selected['_policy'])
+    path_result = search_optimal_path(initial_state, states, state_to_labels, state_to_choice,
+                                      transitions, predicates, max_steps)
+
+    def public(point):
+        return {k: v for k, v in point.items() if not k.startswith('_')}
+
+    summary = {
+        'objective': scenario.get('objective'),
+        'weights': weights,
+        'cost_scale': cost_scale,
+        'front': [public(p) for p in front],
+        'selected': public(selected),
+        'solved_states': solved_states,
+        'symmetry_factor': round(len(choices) / max(solved_states, 1), 3),
+        'solver': {
+            'max_iters': max_iters,
+            'iterations': solved['iterations'],
+            'converged': solved['converged'] and not unconverged,
+            'residual': solved['residual'],
+            'unconverged_evaluations': unconverged,
+        },
+    }
+    (out_dir / "pareto.json").write_text(json.dumps(summary, indent=2))
+    update_meta(out_dir, "pareto", {'applied': True, **summary, 'file': str(out_dir / "pareto.json"),
+                                   'path_status': path_result['status']})
+    return {'status': 'success', 'front': summary['front'], 'selected': summary['selected'],
+            'solver': summary['solver'], 'path_result': path_result}
+
+
+__all__ = ['STRATEGY_FILE', 'compute_pareto', 'write_strategy', 'parse_mdp', 'solve_weighted', 'evaluate_policy', 'pareto_filter', 'select_tradeoff']
@@ -0,0 +1,279 @@
+"""
+Compact policy lookup for live field operations.
+
+Compiles the run's strategy into a decision table: for cost and
+multi-objective scenarios the selected Pareto policy (pareto_strat.tra, which
+the reported path follows), otherwise PRISM's induced strategy
+(strat.tra/.sta/.lab, or the restricted model). The table records which one
+it encodes. It is keyed keyed by the packed state vector: every state
+variable (node counters x<node> and team locations loc<team>) is offset by its
+minimum and packed into one integer with mixed-radix strides. A lookup is then
+a single dict access.
+
+Usage (from src/):
+    python -m prism.policy <run_dir> compile
+    python -m prism.policy <run_dir> lookup "xa=2,xb=0,...,locteam1=a,locteam2=c"
+    python -m prism.policy <run_dir> serve --port 8765
+        GET /next?xa=2&xb=0&...&locteam1=a&locteam2=c
+"""
+
+import argparse
+import json
+import pathlib
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Union
+from urllib.parse import parse_qsl, urlparse
+
+from prism.actions import decode_action
+from prism.extract_path import parse_labels, parse_states, parse_strategy
+from prism.pareto import STRATEGY_FILE as PARETO_STRATEGY_FILE
+from prism.predicates import FAIL_LOCATION, compile_predicates, team_location_vars
+from prism.reduction import REDUCED_SCENARIO_FILE, load_reduction, route_lookup
+
+POLICY_FILE = "policy_table.json"
+# Strategy a table is compiled from, by its transitions file
+STRATEGIES = {
+    PARETO_STRATEGY_FILE: "pareto: selected trade-off point of the probability/distance Pareto front",
+    "strat.tra": "prism: PRISM's induced strategy for the primary property",
+    "restricted.tra": "prism-restricted: PRISM's strategy on the restricted model",
+}
+
+
+class PolicyTable:
+    """Decision table: packed state -> (action, success probability)."""
+
+    def __init__(self, var_names: List[str], mins: List[int], radices: List[int],
+                 actions: List[str], entries: Dict[int, tuple], goal_keys: set,
+                 nodes: Optional[List[str]] = None, routes: Optional[Dict[str, List[str]]] = None,
+                 strategy: Optional[str] = None):
+        self.var_names = var_names
+        self.mins = mins
+        self.radices = radices
+        self.actions = actions
+        self.entries = entries
+        self.goal_keys = goal_keys
+        self.nodes = nodes or []
+        self.routes = routes or {}  # "src-dst" of contracted macro-edges -> original route
+        self.strategy = strategy  # which strategy the table encodes (see STRATEGIES)
+        self._node_index = {n: i for i, n in enumerate(self.nodes)}
+        self._strides = []
+        stride = 1
+        for radix in radices:
+            self._strides.append(stride)
+            stride *= radix
+
+    def pack(self, values: Sequence[int]) -> Optional[int]:
+        """Pack a state vector (in var_names order); None if out of range."""
+        key = 0
+        for v, lo, radix, stride in zip(values, self.mins, self.radices, self._strides):
+            offset = v - lo
+            if not 0 <= offset < radix:
+                return None
+            key += offset * stride
+        return key
+
+    def state_vector(self, state: Union[Mapping[str, Any], Sequence[int]]) -> List[int]:
+        """Accept a var->value mapping (team locations may be node names) or a vector."""
+        if not isinstance(state, Mapping):
+            return [int(v) for v in state]
+        missing = [v for v in self.var_names if v not in state]
+        if missing:
+            raise ValueError(f"Missing state variables: {', '.join(missing)}")
+        vector = []
+        for var in self.var_names:
+            value = state[var]
+            if isinstance(value, str) and value in self._node_index:
+                value = self._node_index[value]
+            vector.append(int(value))
+        return vector
+
+    def lookup(self, state: Union[Mapping[str, Any], Sequence[int]]) -> Dict[str, Any]:
+        """Given the current state, return what to do next."""
+        key = self.pack(self.state_vector(state))
+        if key is not None and key in self.goal_keys:
+            return {'status': 'goal', 'message': 'Goal reached; no further moves needed'}
+        entry = self.entries.get(key) if key is not None else None
+        if entry is None:
+            return {'status': 'unknown', 'message': 'State is not reachable under the optimal strategy'}
+        action_idx, success_prob = entry
+        action = self.actions[action_idx]
+        move = decode_action(action)
+        if move and f"{move['src']}-{move['dst']}" in self.routes:
+            move['route'] = self.routes[f"{move['src']}-{move['dst']}"]
+        return {'status': 'ok', 'action': action, 'move': move, 'success_prob': success_prob}
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            'strategy': self.strategy,
+            'var_names': self.var_names,
+            'mins': self.mins,
+            'radices': self.radices,
+            'nodes': self.nodes,
+            'routes': self.routes,
+            'actions': self.actions,
+            'goal_keys': sorted(self.goal_keys),
+            'entries': {str(k): list(v) for k, v in self.entries.items()},
+        }
+
+    @classmethod
+    def from_json(cls, data: Mapping[str, Any]) -> "PolicyTable":
+        entries = {int(k): tuple(v) for k, v in data['entries'].items()}
+        return cls(data['var_names'], data['mins'], data['radices'], data['actions'],
+                   entries, set(data['goal_keys']), data.get('nodes'), data.get('routes'), data.get('strategy'))
+
+    @classmethod
+    def load(cls, path: pathlib.Path) -> "PolicyTable":
+        return cls.from_json(json.loads(pathlib.Path(path).read_text()))
+
+
+def compile_policy(strategy_file: pathlib.Path, states_file: pathlib.Path, labels_file: pathlib.Path,
+                   scenario: Optional[dict] = None) -> PolicyTable:
+    """Compile strategy exports into a PolicyTable."""
+    _, state_to_labels = parse_labels(labels_file)
+    var_names, states = parse_states(states_file)
+    state_to_choice, transitions = parse_strategy(strategy_file)
+    predicates = compile_predicates(var_names, states, scenario, state_to_labels)
+
+    columns = predicates.matrix.columns
+    mins = [min(columns[v]) for v in var_names]
+    radices = [max(columns[v]) - lo + 1 for v, lo in zip(var_names, mins)]
+    table = PolicyTable(var_names, mins, radices, [], {}, set(),
+                        scenario['graph']['nodes'] if scenario else None)
+
+    loc_vars = team_location_vars(var_names, scenario)
+    action_index: Dict[str, int] = {}
+    for sid, values in states.items():
+        key = table.pack([values[v] for v in var_names])
+        if predicates.is_goal(sid):
+            table.goal_keys.add(key)
+            continue
+        choice = state_to_choice.get(sid)
+        trans = transitions.get((sid, choice), []) if choice is not None else []
+        actions = [a for _, _, a in trans if a]
+        if not actions:
+            continue
+        # Success probability: mass of outcomes where the moving team does not fail
+        move = decode_action(actions[0])
+        if move and 0 < move['team'] <= len(loc_vars):
+            var = loc_vars[move['team'] - 1]
+            success = sum(p for dest, p, _ in trans if states.get(dest, {}).get(var) != FAIL_LOCATION)
+        else:
+            success = max(p for _, p, _ in trans)
+        idx = action_index.setdefault(actions[0], len(action_index))
+        table.entries[key] = (idx, round(success, 12))
+    table.actions = list(action_index)
+    return table
+
+
+def policy_sources(out_dir: pathlib.Path) -> Optional[List[pathlib.Path]]:
+    """
+    The strategy exports a policy table is compiled from (transitions, states,
+    labels): the selected Pareto policy if the run computed one, else the full
+    strategy if present, else the restricted one.
+    """
+    pareto = [out_dir / PARETO_STRATEGY_FILE, out_dir / "strat.sta", out_dir / "strat.lab"]
+    if all(p.exists() for p in pareto):
+        return pareto
+    for prefix in ("strat", "restricted"):
+        files = [out_dir / f"{prefix}.{ext}" for ext in ("tra", "sta", "lab")]
+        if all(p.exists() for p in files):
+            return files
+    return None
+
+
+def build_policy_table(out_dir: pathlib.Path, scenario: Optional[dict] = None) -> pathlib.Path:
+    """Compile the run's strategy (see policy_sources) to policy_table.json."""
+    files = policy_sources(out_dir)
+    if files is None:
+        raise FileNotFoundError(f"No strategy exports found in {out_dir}")
+    table = compile_policy(*files, scenario=scenario)
+    table.strategy = STRATEGIES[files[0].name]
+    table.routes = {f"{a}-{b}": route for (a, b), route in route_lookup(load_reduction(out_dir)).items()}
+    path = out_dir / POLICY_FILE
+    path.write_text(json.dumps(table.to_json(), separators=(',', ':')))
+    return path
+
+
+def _parse_state_arg(text: str) -> Dict[str, str]:
+    pairs = [p.split('=', 1) for p in text.replace(';', ',').split(',') if '=' in p]
+    return {k.strip(): v.strip() for k, v in pairs}
+
+
+def _coerce(state: Mapping[str, str]) -> Dict[str, Any]:
+    return {k: (int(v) if v.lstrip('-').isdigit() else v) for k, v in state.items()}
+
+
+def serve(table: PolicyTable, host: str = "127.0.0.1", port: int = 8765) -> None:
+    """Serve lookups over HTTP: GET /next?<var>=<value>&..."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != "/next":
+                self.send_error(404, "Use /next?<var>=<value>&...")
+                return
+            try:
+                body = table.lookup(_coerce(dict(parse_qsl(url.query))))
+                code = 200
+            except ValueError as exc:
+                body, code = {'status': 'error', 'message': str(exc)}, 400
+            payload = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"Policy lookup service on http://{host}:{port}/next")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Optimal policy lookup for a pipeline run")
+    parser.add_argument("run_dir", type=pathlib.Path)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("compile", help="Compile the strategy into policy_table.json")
+    lookup = sub.add_parser("lookup", help="Look up the next move for a state")
+    lookup.add_argument("state", help='e.g. "xa=2,xb=0,...,locteam1=a,locteam2=c"')
+    srv = sub.add_parser("serve", help="Serve lookups over local HTTP")
+    srv.add_argument("--host", default="127.0.0.1")
+    srv.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    scenario_path = args.run_dir / REDUCED_SCENARIO_FILE
+    if not scenario_path.exists():
+        scenario_path = args.run_dir / "validated_scenario.json"
+    scenario = json.loads(scenario_path.read_text()) if scenario_path.exists() else None
+    table_path = args.run_dir / POLICY_FILE
+    if args.command == "compile" or not table_path.exists():
+        table_path = build_policy_table(args.run_dir, scenario)
+        if args.command == "compile":
+            print(f"✓ Policy table written to {table_path}")
+            return
+    table = PolicyTable.load(table_path)
+
+    if args.command == "lookup":
+        try:
+            print(json.dumps(table.lookup(_coerce(_parse_state_arg(args.state))), indent=2))
+        except ValueError as exc:
+            print(f"Error: {exc}")
+            sys.exit(1)
+    else:
+        serve(table, args.host, args.port)
+
+
+__all__ = ['PolicyTable', 'compile_policy', 'policy_sources', 'build_policy_table', 'serve']
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Goal and failure predicates compiled from the Scenario.
+
+Rather than re-checking every variable of a state dict each time a state is
+visited, the predicates are compiled once from Scenario.demands and the team
+location variables, evaluated once per variable column of the parsed state
+space, and kept as boolean masks (one byte per state). Path extraction and the
+other strategy analyses share these masks.
+
+Variable naming follows the generated models: node counters are x<node>
+(e.g. xg) and team locations are loc<team> (e.g. locteam1, loct1), with -1
+meaning the team has failed.
+"""
+
+import operator
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+FAIL_LOCATION = -1
+
+# A clause is (variable, comparison, value)
+Clause = Tuple[str, Callable[[Any, Any], bool], Any]
+
+
+class StateMatrix:
+    """Column-major view of a parsed state space (see extract_path.parse_states)."""
+
+    def __init__(self, var_names: List[str], states: Dict[int, Dict[str, Any]]):
+        self.var_names = var_names
+        self.state_ids = sorted(states)
+        self.row = {sid: i for i, sid in enumerate(self.state_ids)}
+        self.columns = {var: [states[sid].get(var) for sid in self.state_ids] for var in var_names}
+
+    def __len__(self) -> int:
+        return len(self.state_ids)
+
+    def mask(self, clauses: List[Clause], combine: str = "all") -> bytearray:
+        """Evaluate clauses column by column and combine them with all/any into one mask."""
+        n = len(self.state_ids)
+        if not clauses:
+            return bytearray([1 if combine == "all" else 0]) * n
+        result = None
+        for var, op, value in clauses:
+            column = self.columns[var]
+            clause_mask = bytearray(1 if v is not None and op(v, value) else 0 for v in column)
+            if result is None:
+                result = clause_mask
+            elif combine == "all":
+                result = bytearray(a & b for a, b in zip(result, clause_mask))
+            else:
+                result = bytearray(a | b for a, b in zip(result, clause_mask))
+        return result
+
+    def states_in(self, mask: bytearray) -> set:
+        return {sid for sid, bit in zip(self.state_ids, mask) if bit}
+
+
+def team_location_vars(var_names: List[str], scenario: Optional[dict] = None) -> List[str]:
+    """Return the team location variables, ordered like Scenario.teams when possible."""
+    loc_vars = [v for v in var_names if v.startswith('loc')]
+    if not scenario:
+        return loc_vars
+    ordered = []
+    for i, team in enumerate(scenario.get('teams', []), start=1):
+        candidates = [f"loc{team['id']}", f"loc{team['id'].lower()}", f"locteam{i}", f"loct{i}"]
+        match = next((c for c in candidates if c in loc_vars and c not in ordered), None)
+        if match is None:
+            return loc_vars  # naming not recognised; keep declaration order
+        ordered.append(match)
+    return ordered
+
+
+def goal_clauses(scenario: dict, var_names: List[str]) -> List[Clause]:
+    """Compile Scenario.demands into x<node> >= qty clauses (all must hold)."""
+    clauses = []
+    for demand in scenario.get('demands', []):
+        if demand['qty'] <= 0:
+            continue
+        var = f"x{demand['node']}"
+        if var not in var_names:
+            raise ValueError(f"Demand node {demand['node']!r} has no counter variable {var!r} in the model")
+        clauses.append((var, operator.ge, demand['qty']))
+    return clauses
+
+
+class StatePredicates:
+    """Goal and failure masks over a StateMatrix."""
+
+    def __init__(self, matrix: StateMatrix, goal_mask: Optional[bytearray], failed_mask: bytearray):
+        self.matrix = matrix
+        self.goal_mask = goal_mask
+        self.failed_mask = failed_mask
+
+    def is_goal(self, state_id: int) -> bool:
+        row = self.matrix.row.get(state_id)
+        return bool(self.goal_mask is not None and row is not None and self.goal_mask[row])
+
+    def is_failed(self, state_id: int) -> bool:
+        row = self.matrix.row.get(state_id)
+        return bool(row is not None and self.failed_mask[row])
+
+    def goal_states(self) -> set:
+        return self.matrix.states_in(self.goal_mask) if self.goal_mask is not None else set()
+
+
+def compile_predicates(var_names: List[str], states: Dict[int, Dict[str, Any]],
+                       scenario: Optional[dict] = None,
+                       state_to_labels: Optional[Dict[int, List[str]]] = None) -> StatePredicates:
+    """
+    Build goal and failure masks for a parsed state space.
+
+    The goal mask comes from the model's "goal" label when the export has one
+    (it is what PRISM verified), otherwise from Scenario.demands. Without
+    either, there is no goal mask. A state is failed if any team location is -1.
+    """
+    matrix = StateMatrix(var_names, states)
+
+    goal_mask = None
+    labelled = {sid for sid, labels in (state_to_labels or {}).items() if "goal" in labels}
+    if labelled:
+        goal_mask = bytearray(1 if sid in labelled else 0 for sid in matrix.state_ids)
+    elif scenario:
+        goal_mask = matrix.mask(goal_clauses(scenario, var_names), combine="all")
+
+    fail_clauses = [(var, operator.eq, FAIL_LOCATION) for var in team_location_vars(var_names, scenario)]
+    failed_mask = matrix.mask(fail_clauses, combine="any")
+
+    return StatePredicates(matrix, goal_mask, failed_mask)
+
+
+__all__ = ['StateMatrix', 'StatePredicates', 'compile_predicates', 'goal_clauses', 'team_location_vars']
@@ -0,0 +1,254 @@
+"""
+Graph reduction of the scenario before model generation.
+
+Every node becomes a resource counter and a team location value in the PRISM
+model, so nodes and edges that cannot change the optimal success probability
+are removed first:
+
+- dead ends: nodes with one neighbour and nothing on them (no supply, demand,
+  team start or capacity constraint) are pruned, repeatedly;
+- unreachable parts: nodes in a connected component without a demand node or
+  a team are pruned with their resources;
+- dominated parallel edges: of two routes between the same nodes, one that is
+  no safer and no shorter is dropped (for max_reach_prob only safety counts);
+- relays: a node with exactly two neighbours and nothing on it is contracted
+  into a single macro-edge whose success probability is the product and whose
+  distance is the sum of its two edges. The macro-edge carries the exact
+  probability in a "probability" field and the contracted nodes in "via".
+
+Assumption: resources are never staged (dropped and picked up later) at a
+relay node. Under it the reduction is exact, since a macro-edge move has
+exactly the success probability and distance of the two moves it replaces;
+plans that park resources mid-route are no longer representable. Such plans
+can be optimal (shuttling part of a load across a risky edge and coming back
+for the rest), so the reduction is only applied with --reduce, and what was
+applied is recorded under "reduction" in meta.json.
+
+Contraction is only applied to undirected graphs. The reduced scenario keeps
+the original node names, so results map back by expanding macro-edges into
+their original routes (see expand_route / map_closures).
+"""
+
+import copy
+import json
+import pathlib
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from utils.meta import update_meta
+
+REDUCED_SCENARIO_FILE = "reduced_scenario.json"
+REDUCTION_FILE = "reduction.json"
+
+STAGING_ASSUMPTION = ("Resources are not staged at relay nodes (nodes with two neighbours and no supply, "
+                      "demand, team or capacity constraint); such nodes are contracted into macro-edges.")
+
+
+def _src(edge: dict) -> str:
+    return edge.get('from_', edge.get('from'))
+
+
+def edge_probability(edge: dict, safety_probs: dict) -> float:
+    """Success probability of an edge: its own "probability" if set, else its safety class."""
+    if edge.get('probability') is not None:
+        return edge['probability']
+    safety = edge['safety']
+    return safety_probs[getattr(safety, 'value', safety)]
+
+
+def _pinned_nodes(scenario: dict) -> set:
+    """Nodes that carry state of their own and must stay in the model."""
+    pinned = {t['start'] for t in scenario['teams']}
+    pinned |= {s['node'] for s in scenario['resources'] if s['qty'] > 0}
+    pinned |= {d['node'] for d in scenario['demands'] if d['qty'] > 0}
+    pinned |= {c['node'] for c in (scenario['constraints'].get('node_capacity') or [])}
+    return pinned
+
+
+def _dominates(a: dict, b: dict, probs: dict, by_distance: bool) -> bool:
+    pa, pb = edge_probability(a, probs), edge_probability(b, probs)
+    if not by_distance:
+        return pa > pb or (pa == pb and a['distance'] <= b['distance'])
+    return pa >= pb and a['distance'] <= b['distance']
+
+
+def reduce_scenario(scenario: dict) -> Tuple[dict, Dict[str, Any]]:
+    """
+    Return (reduced scenario, reduction record).
+
+    The record lists removed nodes (with the reason), dropped edges and
+    macro-edges with their original routes.
+    """
+    reduced = copy.deepcopy(scenario)
+    graph = reduced['graph']
+    probs = reduced['constraints']['safety_probs']
+    by_distance = reduced.get('objective', 'max_reach_prob') != 'max_reach_prob'
+    pinned = _pinned_nodes(reduced)
+
+    edges = [dict(e) for e in graph['edges']]
+    for e in edges:
+        e.setdefault('via', [])
+    removed: Dict[str, str] = {}
+    dropped: List[Dict[str, Any]] = []
+
+    def neighbours(node):
+        return [e for e in edges if node in (_src(e), e['to'])]
+
+    def other(edge, node):
+        return edge['to'] if _src(edge) == node else _src(edge)
+
+    def route(edge, start):
+        """Original node sequence of an edge, read from start."""
+        nodes = [_src(edge)] + edge['via'] + [edge['to']]
+        return nodes if nodes[0] == start else nodes[::-1]
+
+    # Unreachable parts: components without any demand node or team
+    adjacency: Dict[str, set] = {n: set() for n in graph['nodes']}
+    for e in edges:
+        adjacency[_src(e)].add(e['to'])
+        adjacency[e['to']].add(_src(e))
+    anchors = {d['node'] for d in reduced['demands'] if d['qty'] > 0} | {t['start'] for t in reduced['teams']}
+    seen, stack = set(anchors), list(anchors)
+    while stack:
+        for n in adjacency.get(stack.pop(), ()):
+            if n not in seen:
+                seen.add(n)
+                stack.append(n)
+    for node in graph['nodes']:
+        if node not in seen:
+            removed[node] = "unreachable"
+    for e in [e for e in edges if _src(e) in removed or e['to'] in removed]:
+        edges.remove(e)
+        dropped.append({'from': _src(e), 'to': e['to'], 'reason': "unreachable"})
+
+    undirected = graph.get('undirected', True)
+    changed = True
+    while changed:
+        changed = False
+
+        # Dominated parallel edges
+        if undirected:
+            for i, a in enumerate(edges):
+                for b in edges[i + 1:]:
+                    if {_src(a), a['to']} != {_src(b), b['to']}:
+                        continue
+                    loser = b if _dominates(a, b, probs, by_distance) else \
+                        a if _dominates(b, a, probs, by_distance) else None
+                    if loser is not None:
+                        edges.remove(loser)
+                        dropped.append({'from': _src(loser), 'to': loser['to'], 'via': loser['via'],
+                                        'reason': "dominated"})
+                        changed = True
+                        break
+                if changed:
+                    break
+        if changed:
+            continue
+
+        for node in graph['nodes']:
+            if node in removed or node in pinned:
+                continue
+            incident = neighbours(node)
+            others = {other(e, node) for e in incident}
+            # Dead end
+            if len(others) <= 1 and (undirected or len(incident) <= 1):
+                for e in incident:
+                    edges.remove(e)
+                    dropped.append({'from': _src(e), 'to': e['to'], 'via': e['via'], 'reason': "dead end"})
+                removed[node] = "dead end"
+                changed = True
+                break
+            # Relay
+            if undirected and len(incident) == 2 and len(others) == 2:
+                left, right = incident
+                u, w = other(left, node), other(right, node)
+                macro = {
+                    'from': u, 'to': w,
+                    'distance': left['distance'] + right['distance'],
+                    'safety': max(left['safety'], right['safety'], key=lambda s: -probs[getattr(s, 'value', s)]),
+                    'probability': edge_probability(left, probs) * edge_probability(right, probs),
+                    'via': route(left, u)[1:] + route(right, node)[1:-1],
+                }
+                parallel = [e for e in edges if {_src(e), e['to']} == {u, w}]
+                if any(not _dominates(macro, e, probs, by_distance) and not _dominates(e, macro, probs, by_distance)
+                       for e in parallel):
+                    continue  # would leave two incomparable routes between u and w
+                edges.remove(left)
+                edges.remove(right)
+                edges.append(macro)
+                removed[node] = "relay"
+                changed = True
+                break
+
+    graph['nodes'] = [n for n in graph['nodes'] if n not in removed]
+    graph['edges'] = []
+    macro_edges = []
+    for e in edges:
+        e = {('from_' if k == 'from' else k): v for k, v in e.items()}
+        via = e.pop('via')
+        if via:
+            e['via'] = via
+            macro_edges.append({'from': e['from_'], 'to': e['to'], 'via': via,
+                                'probability': e['probability'], 'distance': e['distance']})
+        graph['edges'].append(e)
+    reduced['resources'] = [s for s in reduced['resources'] if s['node'] not in removed]
+
+    record = {
+        'reduced': bool(removed or dropped),
+        'nodes_before': len(scenario['graph']['nodes']),
+        'nodes_after': len(graph['nodes']),
+        'edges_before': len(scenario['graph']['edges']),
+        'edges_after': len(graph['edges']),
+        'removed_nodes': removed,
+        'dropped_edges': dropped,
+        'macro_edges': macro_edges,
+        'assumption': STAGING_ASSUMPTION,
+    }
+    return reduced, record
+
+
+def route_lookup(record: Optional[dict]) -> Dict[Tuple[str, str], List[str]]:
+    """(from, to) of each macro-edge, in both directions -> full original route."""
+    routes = {}
+    for m in (record or {}).get('macro_edges', []):
+        path = [m['from']] + m['via'] + [m['to']]
+        routes[(m['from'], m['to'])] = path
+        routes[(m['to'], m['from'])] = path[::-1]
+    return routes
+
+
+def expand_route(src: str, dst: str, record: Optional[dict]) -> List[str]:
+    """Original node sequence of a move in the reduced graph."""
+    return route_lookup(record).get((src, dst), [src, dst])
+
+
+def map_closures(closures: Sequence[Tuple[str, str]], record: Optional[dict]) -> List[Tuple[str, str]]:
+    """Map closed original edges onto the reduced graph (closing a hop closes its macro-edge)."""
+    mapped = []
+    routes = route_lookup(record)
+    for a, b in closures:
+        hit = [key for key, path in routes.items()
+               if any({path[i], path[i + 1]} == {a, b} for i in range(len(path) - 1))]
+        mapped.extend(hit[:1] or [(a, b)])
+    return mapped
+
+
+def load_reduction(out_dir: pathlib.Path) -> Optional[dict]:
+    path = out_dir / REDUCTION_FILE
+    return json.loads(path.read_text()) if path.exists() else None
+
+
+def apply_reduction(out_dir: pathlib.Path, scenario: dict) -> dict:
+    """Reduce the scenario, save reduced_scenario.json / reduction.json, and return the scenario to model."""
+    reduced, record = reduce_scenario(scenario)
+    reduced_path = out_dir / REDUCED_SCENARIO_FILE
+    if record['reduced']:
+        reduced_path.write_text(json.dumps(reduced, indent=2, default=lambda o: getattr(o, 'value', str(o))))
+    elif reduced_path.exists():
+        reduced_path.unlink()
+    (out_dir / REDUCTION_FILE).write_text(json.dumps(record, indent=2))
+    update_meta(out_dir, "reduction", {'applied': True, **record})
+    return reduced if record['reduced'] else scenario
+
+
+__all__ = ['reduce_scenario', 'apply_reduction', 'load_reduction', 'expand_route', 'map_closures',
+           'route_lookup', 'edge_probability', 'REDUCED_SCENARIO_FILE', 'REDUCTION_FILE']
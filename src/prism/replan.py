@@ -0,0 +1,309 @@
+"""
+Incremental re-planning from an arbitrary mid-mission state.
+
+When a team fails or a route is closed in the field, a new plan is needed
+within seconds rather than a full pipeline run. Every run stores the full MDP
+(full.tra, strat.sta/.lab) and PRISM's per-state Pmax vector (values.txt, via
+-exportvector). Re-planning then:
+
+1. removes the moves over closed edges,
+2. finds the affected states: those reachable from the observed state that
+   lost a move or can reach one that did (all other values are unchanged),
+3. re-solves only the affected states by value iteration, with the stored
+   values of every other state held fixed as its boundary,
+4. extracts the highest-probability path from the observed state in the same
+   format as extract_optimal_path.
+
+Usage (from src/):
+    python -m prism.replan <run_dir> --state "xa=0,...,locteam1=d,locteam2=-1" --close a-d --close c-g
+"""
+
+import argparse
+import json
+import operator
+import pathlib
+import sys
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from prism.actions import decode_action
+from prism.extract_path import parse_labels, parse_states, search_optimal_path, write_optimal_path
+from prism.pareto import Choices, parse_mdp
+from prism.predicates import FAIL_LOCATION, compile_predicates, team_location_vars
+from prism.reduction import REDUCED_SCENARIO_FILE, load_reduction, map_closures
+from utils.meta import update_meta
+
+VALUES_FILE = "values.txt"
+
+
+def load_values(values_file: pathlib.Path, num_states: int) -> Optional[List[float]]:
+    """Parse PRISM's exported result vector (one value per state, optionally 'i:v' or '...=v')."""
+    if not values_file.exists():
+        return None
+    values = []
+    for line in values_file.read_text().split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        token = line.rsplit('=', 1)[-1].rsplit(':', 1)[-1].strip()
+        try:
+            values.append(float(token))
+        except ValueError:
+            continue  # header / comment line
+    return values if len(values) == num_states else None
+
+
+def _closed(action: Optional[str], closures: set) -> bool:
+    move = decode_action(action)
+    return bool(move) and ((move['src'], move['dst']) in closures or (move['dst'], move['src']) in closures)
+
+
+def apply_closures(choices: Choices, closures: Sequence[Tuple[str, str]]) -> set:
+    """Drop every choice that moves over a closed edge; return the states that lost a choice."""
+    closed = set(closures)
+    touched = set()
+    if not closed:
+        return touched
+    for state, by_choice in choices.items():
+        for choice in [c for c, (action, _) in by_choice.items() if _closed(action, closed)]:
+            del by_choice[choice]
+            touched.add(state)
+    return touched
+
+
+def _predecessors(choices: Choices) -> Dict[int, set]:
+    preds: Dict[int, set] = {}
+    for state, by_choice in choices.items():
+        for _, succ in by_choice.values():
+            for dest, _ in succ:
+                preds.setdefault(dest, set()).add(state)
+    return preds
+
+
+def _backward_closure(seeds: set, preds: Dict[int, set]) -> set:
+    seen = set(seeds)
+    queue = deque(seeds)
+    while queue:
+        for p in preds.get(queue.popleft(), ()):
+            if p not in seen:
+                seen.add(p)
+                queue.append(p)
+    return seen
+
+
+def _forward_closure(start: int, choices: Choices) -> set:
+    seen = {start}
+    queue = deque([start])
+    while queue:
+        for _, succ in choices.get(queue.popleft(), {}).values():
+            for dest, _ in succ:
+                if dest not in seen:
+                    seen.add(dest)
+                    queue.append(dest)
+    return seen
+
+
+def resolve(choices: Choices, goal_states: set, values: Dict[int, float], affected: set,
+            tol: float = 1e-10, max_iters: int = 100000) -> int:
+    """
+    Pmax value iteration over the affected states only; returns sweeps used.
+
+    Values outside `affected` are taken as exact. Affected states restart from
+    0, since iterating down from the old (now too high) values can stall on the
+    zero-quantity move loops instead of converging to Pmax.
+    """
+    can_reach = _backward_closure(set(goal_states), _predecessors(choices))
+    order = sorted(s for s in affected if s not in goal_states)
+    for state in order:
+        values[state] = 0.0
+    order = [s for s in order if s in can_reach]
+
+    for sweep in range(1, max_iters + 1):
+        delta = 0.0
+        for state in order:
+            best = 0.0
+            for _, succ in choices[state].values():
+                q = sum(p * values.get(d, 0.0) for d, p in succ)
+                if q > best:
+                    best = q
+            delta = max(delta, best - values[state])
+            values[state] = best
+        if delta < tol:
+            return sweep
+    return max_iters
+
+
+def greedy_strategy(choices: Choices, values: Dict[int, float], start: int, goal_states: set,
+                    tol: float = 1e-9):
+    """
+    Optimal strategy w.r.t. values over the states reachable from start (parse_strategy format).
+
+    Pmax-optimal choices are not unique (e.g. a zero-quantity move keeps the
+    value), and picking any of them can loop forever. Among the optimal choices
+    each state takes the one closest to the goal, by backward BFS over them.
+    """
+    optimal: Dict[int, List[int]] = {}
+    preds: Dict[int, set] = {}
+    for state, by_choice in choices.items():
+        if state in goal_states or values.get(state, 0.0) <= 0.0:
+            continue
+        best = values[state]
+        for choice, (_, succ) in by_choice.items():
+            if sum(p * values.get(d, 0.0) for d, p in succ) >= best - tol:
+                optimal.setdefault(state, []).append(choice)
+                for d, _ in succ:
+                    preds.setdefault(d, set()).add(state)
+
+    rank = {g: 0 for g in goal_states}
+    queue = deque(goal_states)
+    while queue:
+        state = queue.popleft()
+        for p in preds.get(state, ()):
+            if p not in rank:
+                rank[p] = rank[state] + 1
+                queue.append(p)
+
+    def distance(state, choice):
+        return min((rank.get(d, float('inf')) for d, p in choices[state][choice][1] if p > 0),
+                   default=float('inf'))
+
+    state_to_choice, transitions = {}, {}
+    queue, seen = deque([start]), {start}
+    while queue:
+        state = queue.popleft()
+        if state not in optimal:
+            continue
+        choice = min(optimal[state], key=lambda c: distance(state, c))
+        action, succ = choices[state][choice]
+        state_to_choice[state] = choice
+        transitions[(state, choice)] = [(d, p, action) for d, p in succ]
+        for d, _ in succ:
+            if d not in seen:
+                seen.add(d)
+                queue.append(d)
+    return state_to_choice, transitions
+
+
+def replan(out_dir: pathlib.Path, observed_state: Dict[str, Any],
+           closures: Sequence[Tuple[str, str]] = (), scenario: Optional[dict] = None,
+           max_steps: int = 100) -> Dict[str, Any]:
+    """
+    Re-plan from an observed state with the given edges closed.
+
+    observed_state maps every state variable to its value; team locations may be
+    node names, and -1 marks a failed team. closures name original edges; a
+    closed hop inside a contracted macro-edge closes the macro-edge. Returns the extract_optimal_path
+    result dict (plus 'probability', 'affected_states', 'sweeps', 'elapsed_s')
+    and writes replan_path.txt on success.
+    """
+    time_zero = time.time()
+    tra, sta, lab = out_dir / "full.tra", out_dir / "strat.sta", out_dir / "strat.lab"
+    if not (tra.exists() and sta.exists() and lab.exists()):
+        return {'status': 'error', 'message': 'Full model exports (full.tra, strat.sta/.lab) not found'}
+
+    _, state_to_labels = parse_labels(lab)
+    var_names, states = parse_states(sta)
+    choices = parse_mdp(tra)
+    for state in states:
+        choices.setdefault(state, {})
+    predicates = compile_predicates(var_names, states, scenario, state_to_labels)
+    goal_states = predicates.goal_states()
+
+    # Locate the observed state
+    node_index = {n: i for i, n in enumerate(scenario['graph']['nodes'])} if scenario else {}
+    try:
+        target = tuple(node_index.get(observed_state[v], observed_state[v]) for v in var_names)
+        target = tuple(int(v) for v in target)
+    except (KeyError, ValueError) as exc:
+        return {'status': 'error', 'message': f'Invalid observed state: {exc}'}
+    start = next((sid for sid, vals in states.items() if tuple(vals[v] for v in var_names) == target), None)
+    if start is None:
+        return {'status': 'error', 'message': 'Observed state is not in the model state space'}
+
+    # Teams already lost at the observed state do not make the rest of the path "failed"
+    alive = [v for v in team_location_vars(var_names, scenario) if states[start][v] != FAIL_LOCATION]
+    predicates.failed_mask = predicates.matrix.mask(
+        [(v, operator.eq, FAIL_LOCATION) for v in alive], combine="any")
+
+    stored = load_values(out_dir / VALUES_FILE, len(states))
+    touched = apply_closures(choices, map_closures(closures, load_reduction(out_dir)))
+    reachable = _forward_closure(start, choices)
+    if stored is not None:
+        values = {sid: stored[sid] for sid in states}
+        affected = _backward_closure(touched, _predecessors(choices)) & reachable if touched else set()
+    else:
+        # No stored vector: solve everything reachable from the observed state
+        values = {sid: (1.0 if sid in goal_states else 0.0) for sid in states}
+        affected = reachable
+    sweeps = resolve(choices, goal_states, values, affected) if affected else 0
+
+    state_to_choice, transitions = greedy_strategy(choices, values, start, goal_states)
+    result = search_optimal_path(start, states, state_to_labels, state_to_choice,
+                                 transitions, predicates, max_steps)
+    result.update({
+        'probability': values.get(start, 0.0),
+        'affected_states': len(affected),
+        'total_states': len(states),
+        'incremental': stored is not None,
+        'sweeps': sweeps,
+        'elapsed_s': round(time.time() - time_zero, 3),
+    })
+    if result['status'] == 'success':
+        write_optimal_path(result, out_dir, filename='replan_path.txt')
+
+    update_meta(out_dir, "replan", {
+        'observed_state': observed_state,
+        'closed_edges': [f"{a}-{b}" for a, b in closures],
+        'status': result['status'],
+        'probability': result['probability'],
+        'optimal_path_probability': result.get('optimal_path_probability'),
+        'affected_states': result['affected_states'],
+        'total_states': result['total_states'],
+        'incremental': result['incremental'],
+        'sweeps': sweeps,
+        'elapsed_s': result['elapsed_s'],
+        'file': result.get('txt_file'),
+    })
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-plan a pipeline run from an observed state")
+    parser.add_argument("run_dir", type=pathlib.Path)
+    parser.add_argument("--state", required=True,
+                        help='Observed state, e.g. "xa=0,xb=0,...,locteam1=d,locteam2=-1"')
+    parser.add_argument("--close", action="append", default=[], metavar="A-B",
+                        help="Closed edge (repeatable)")
+    args = parser.parse_args(argv)
+
+    observed = {}
+    for pair in args.state.replace(';', ',').split(','):
+        if '=' in pair:
+            key, value = (x.strip() for x in pair.split('=', 1))
+            observed[key] = int(value) if value.lstrip('-').isdigit() else value
+    closures = []
+    for edge in args.close:
+        if '-' not in edge:
+            print(f"Error: closed edge must look like A-B, got {edge!r}")
+            sys.exit(1)
+        closures.append(tuple(edge.split('-', 1)))
+
+    scenario_path = args.run_dir / REDUCED_SCENARIO_FILE
+    if not scenario_path.exists():
+        scenario_path = args.run_dir / "validated_scenario.json"
+    scenario = json.loads(scenario_path.read_text()) if scenario_path.exists() else None
+    result = replan(args.run_dir, observed, closures, scenario)
+    if result['status'] != 'success':
+        print(f"✗ Re-planning failed: {result.get('message', 'Unknown error')}")
+        sys.exit(1)
+    print(f"✓ Re-planned in {result['elapsed_s']}s ({result['affected_states']}/{result['total_states']} states re-solved): "
+          f"success probability={result['probability']:.6f}, {result['num_steps']} steps")
+    print(result['text'])
+
+
+__all__ = ['replan', 'load_values', 'apply_closures', 'resolve']
+
+
+if __name__ == "__main__":
+    main()
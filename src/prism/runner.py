@@ -0,0 +1,253 @@
+"""
+Streamed PRISM execution with progress reporting, a wall-clock limit and a memory watchdog.
+
+PRISM is started with Popen and its stdout is parsed line by line while it
+runs, so model construction (states, transitions, choices and time),
+iteration counts and model-checking time are reported as they appear instead
+of after the process exits. A watchdog polls the elapsed time and, when a
+memory limit is set, the resident memory of PRISM's process tree (PRISM is a
+shell script around a JVM; the tree is read from /proc) and kills the whole
+tree when a limit is exceeded; the returned process then has return code
+KILLED_RETURNCODE, the reason in stderr and in stats['killed'].
+
+The same parser is used on recorded output (parse_stats), so replayed runs
+report the same statistics.
+"""
+
+from __future__ import annotations
+import math, os, re, signal, subprocess, threading, time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+__all__ = ["PrismLimits", "PrismOutputParser", "parse_result", "parse_stats", "run_streamed", "KILLED_RETURNCODE"]
+
+KILLED_RETURNCODE = -9
+
+STATES_RE = re.compile(r"^States:\s+(\d+)")
+TRANSITIONS_RE = re.compile(r"^Transitions:\s+(\d+)")
+CHOICES_RE = re.compile(r"^Choices:\s+(\d+)")
+CONSTRUCTION_RE = re.compile(r"^Time for model construction:\s+([\d.]+) sec")
+CHECKING_RE = re.compile(r"^Time for model checking:\s+([\d.]+) sec")
+# e.g. "Reachability (BFS): 15 iterations in 0.01 seconds", "Value iteration (maximum): 230 iterations in 0.12 seconds"
+ITERATIONS_RE = re.compile(r"^([A-Za-z][\w ()/-]*?):\s+(\d+) iterations in ([\d.]+) sec")
+# Periodic progress of long computations, e.g. "Iteration 1500: max relative diff=0.000231, 5.01 sec so far"
+PROGRESS_RE = re.compile(r"^Iteration (\d+)\b")
+MODEL_CHECKING_RE = re.compile(r"^Model checking:\s+(.*)$")
+# "Result: 0.2555 (value in the initial state)", "Result: 1.2E-5 (+/- ...)", "Result: Infinity", "Result: true"
+RESULT_RE = re.compile(r"^Result:\s+(.*?)(?:\s+\((?:value|exact|\+/-)[^()]*\))?\s*$")
+ERROR_RE = re.compile(r"^Error:\s*(.*)")
+
+
+@dataclass
+class PrismLimits:
+    """Resource limits for one PRISM run (None disables a limit)."""
+    timeout_s: Optional[float] = None
+    max_rss_mb: Optional[float] = None
+    poll_s: float = 0.5
+
+
+class PrismOutputParser:
+    """Accumulate statistics from PRISM stdout, one line at a time."""
+
+    def __init__(self, progress: Optional[Callable[[str], None]] = None):
+        self.progress = progress
+        self.stats: Dict[str, Any] = {
+            'states': None, 'transitions': None, 'choices': None,
+            'construction_s': None, 'checking_s': None,
+            'iterations': {}, 'results': [], 'errors': [], 'properties': [],
+        }
+
+    def _report(self, message: str) -> None:
+        if self.progress:
+            self.progress(message)
+
+    def feed(self, line: str) -> None:
+        line = line.strip()
+        stats = self.stats
+        for key, pattern in (('states', STATES_RE), ('transitions', TRANSITIONS_RE), ('choices', CHOICES_RE)):
+            m = pattern.match(line)
+            if m:
+                stats[key] = int(m.group(1))
+                if key == 'transitions':
+                    self._report(f"PRISM model: {stats['states']} states, {stats['transitions']} transitions")
+                return
+        m = CONSTRUCTION_RE.match(line)
+        if m:
+            stats['construction_s'] = round((stats['construction_s'] or 0.0) + float(m.group(1)), 3)
+            self._report(f"PRISM model built in {float(m.group(1)):.2f}s")
+            return
+        m = MODEL_CHECKING_RE.match(line)
+        if m:
+            stats['properties'].append({'property': m.group(1), 'raw': None, 'time_s': None, 'error': None})
+            self._report(f"PRISM checking property {len(stats['properties'])}: {m.group(1)}")
+            return
+        m = CHECKING_RE.match(line)
+        if m:
+            stats['checking_s'] = round((stats['checking_s'] or 0.0) + float(m.group(1)), 3)
+            if stats['properties']:
+                stats['properties'][-1]['time_s'] = float(m.group(1))
+            self._report(f"PRISM model checking finished in {float(m.group(1)):.2f}s")
+            return
+        m = ITERATIONS_RE.match(line)
+        if m:
+            stats['iterations'][m.group(1)] = stats['iterations'].get(m.group(1), 0) + int(m.group(2))
+            return
+        m = PROGRESS_RE.match(line)
+        if m:
+            self._report(f"PRISM {line}")
+            return
+        m = RESULT_RE.match(line)
+        if m:
+            stats['results'].append(m.group(1))
+            if not stats['properties'] or stats['properties'][-1]['raw'] is not None:
+                # Output without "Model checking:" headers (e.g. rebuilt from meta.json)
+                stats['properties'].append({'property': None, 'raw': None, 'time_s': None, 'error': None})
+            stats['properties'][-1]['raw'] = m.group(1)
+            return
+        m = ERROR_RE.match(line)
+        if m:
+            stats['errors'].append(m.group(1))
+            if stats['properties'] and stats['properties'][-1]['raw'] is None:
+                stats['properties'][-1]['error'] = m.group(1)
+
+
+def parse_result(raw: Optional[str]) -> Any:
+    """
+    A PRISM result as a JSON-safe value: finite numbers (including scientific
+    notation) as float, true/false as bool, anything else (Infinity, NaN,
+    Pareto curves, ...) as the raw text.
+    """
+    if raw is None:
+        return None
+    if raw in ('true', 'false'):
+        return raw == 'true'
+    try:
+        value = float(raw)
+    except ValueError:
+        return raw
+    return value if math.isfinite(value) else raw
+
+
+def parse_stats(stdout: str) -> Dict[str, Any]:
+    """Statistics of a finished PRISM run from its complete stdout."""
+    parser = PrismOutputParser()
+    for line in stdout.splitlines():
+        parser.feed(line)
+    return parser.stats
+
+
+_PROC = "/proc"
+
+
+def _children(pid: int) -> List[int]:
+    """Direct children of a process, from /proc/<pid>/task/*/children."""
+    found: List[int] = []
+    try:
+        tasks = os.listdir(f"{_PROC}/{pid}/task")
+    except OSError:
+        return found
+    for tid in tasks:
+        try:
+            with open(f"{_PROC}/{pid}/task/{tid}/children") as fh:
+                found.extend(int(c) for c in fh.read().split())
+        except OSError:
+            continue
+    return found
+
+
+def _tree_rss_mb(pid: int) -> Optional[float]:
+    """Resident memory of a process and all of its descendants, in MB (None without /proc)."""
+    if not os.path.exists(f"{_PROC}/{pid}/statm"):
+        return None
+    page = os.sysconf("SC_PAGE_SIZE")
+    total, stack = 0, [pid]
+    while stack:
+        p = stack.pop()
+        try:
+            with open(f"{_PROC}/{p}/statm") as fh:
+                total += int(fh.read().split()[1]) * page
+        except (OSError, IndexError, ValueError):
+            continue  # exited meanwhile
+        stack.extend(_children(p))
+    return total / (1024 * 1024)
+
+
+def _kill_tree(proc: subprocess.Popen) -> None:
+    try:
+        if os.name == "posix":
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def run_streamed(cmd: Sequence[str], limits: Optional[PrismLimits] = None,
+                 progress: Optional[Callable[[str], None]] = None) -> subprocess.CompletedProcess:
+    """
+    Run PRISM, parsing stdout as it streams and enforcing the limits.
+
+    Returns a CompletedProcess like subprocess.run(capture_output=True, text=True);
+    its `stats` attribute holds the parsed statistics plus wall_s, peak_rss_mb
+    and killed ('timeout', 'memory' or None).
+    """
+    limits = limits or PrismLimits()
+    parser = PrismOutputParser(progress)
+    stdout_lines: List[str] = []
+    stderr_lines: List[str] = []
+    started = time.monotonic()
+    proc = subprocess.Popen(list(cmd), stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, bufsize=1,
+                            start_new_session=(os.name == "posix"))
+
+    def pump_stdout():
+        for line in proc.stdout:
+            stdout_lines.append(line)
+            parser.feed(line)
+
+    def pump_stderr():
+        stderr_lines.extend(proc.stderr)
+
+    readers = [threading.Thread(target=pump_stdout, daemon=True), threading.Thread(target=pump_stderr, daemon=True)]
+    for reader in readers:
+        reader.start()
+
+    killed, peak_rss = None, None
+    check_memory = limits.max_rss_mb is not None
+    while True:
+        try:
+            proc.wait(timeout=limits.poll_s)
+            break
+        except subprocess.TimeoutExpired:
+            pass
+        elapsed = time.monotonic() - started
+        if check_memory:
+            rss = _tree_rss_mb(proc.pid)
+            if rss is None:
+                check_memory = False
+                if progress:
+                    progress("PRISM memory limit not enforced: /proc is unavailable")
+            else:
+                peak_rss = max(peak_rss or 0.0, rss)
+                if rss > limits.max_rss_mb:
+                    killed = 'memory'
+        if limits.timeout_s is not None and elapsed > limits.timeout_s:
+            killed = 'timeout'
+        if killed:
+            _kill_tree(proc)
+            proc.wait()
+            break
+    for reader in readers:
+        reader.join()
+
+    stderr = "".join(stderr_lines)
+    returncode = proc.returncode
+    if killed:
+        reason = (f"wall-clock limit of {limits.timeout_s:g}s exceeded" if killed == 'timeout'
+                  else f"memory limit of {limits.max_rss_mb:g} MB exceeded (resident {peak_rss:.0f} MB)")
+        stderr += f"\nPRISM killed: {reason}\n"
+        returncode = KILLED_RETURNCODE
+
+    result = subprocess.CompletedProcess(list(cmd), returncode, "".join(stdout_lines), stderr)
+    result.stats = {**parser.stats, 'wall_s': round(time.monotonic() - started, 3),
+                    'peak_rss_mb': round(peak_rss, 1) if peak_rss is not None else None, 'killed': killed}
+    return result
@@ -0,0 +1,181 @@
+"""
+Cross-run cache of models and PRISM results, keyed by canonical scenario.
+
+After a run has verified its model, the model, properties, strategy exports
+and restricted model are stored under the hash of the canonical scenario (see
+prism.canonical) and the settings that shape them (LLM model, template, graph
+reduction, metrics). A later run whose scenario is isomorphic (the same up to
+node names, team ids and list order) reuses them instead of calling the LLM
+and PRISM: the artifacts are renamed to the new scenario's names, and its
+nodes and teams are put in the cached run's order, since the PRISM model
+encodes locations as node indices and teams by position.
+
+Layout: <cache dir>/<key>/entry.json plus the cached files, as written by the
+source run (in its names).
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+from typing import Any, Dict, Optional
+
+from prism.canonical import LabellingBudgetError, RelabelError, canonicalize, check_relabel, relabel_prism_text, reorder_like
+from utils.meta import read_meta
+
+ENTRY_FILE = "entry.json"
+# Stage -> files that stage produces, in the order they are restored
+STAGE_FILES = {
+    'compose': ("model.prism", "properties.props"),
+    'verify': ("strat.tra", "strat.sta", "strat.lab"),
+    'restrict': ("restricted.tra", "restricted.sta", "restricted.lab"),
+}
+# Produced alongside verify, reused when present
+EXTRA_FILES = ("verification.props", "full.tra", "values.txt")
+# Files without node or team names
+VERBATIM_FILES = {"values.txt"}
+# prism_verification meta carried over with the files
+VERIFICATION_KEYS = ('verification_probability', 'stats', 'properties', 'restrict_stats')
+
+
+def cache_key(digest: str, settings: Dict[str, Any]) -> str:
+    """Cache entry name for a canonical scenario hash and the run settings."""
+    encoded = json.dumps({'scenario': digest, **settings}, sort_keys=True)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()[:32]
+
+
+def _unique_ids(scenario: dict) -> bool:
+    ids = [t['id'] for t in scenario.get('teams', [])]
+    return len(ids) == len(set(ids))
+
+
+def store(cache_dir: pathlib.Path, out_dir: pathlib.Path, scenario: dict,
+          settings: Dict[str, Any]) -> Optional[pathlib.Path]:
+    """
+    Store a verified run's artifacts; returns the new entry directory, or None
+    if the run has no verified model or the scenario is already cached.
+    Raises LabellingBudgetError if the scenario is too symmetric to hash.
+    """
+    if not all((out_dir / name).exists() for name in STAGE_FILES['compose'] + STAGE_FILES['verify']):
+        return None
+    if not _unique_ids(scenario):
+        return None
+    canonical = canonicalize(scenario)
+    key = cache_key(canonical.digest, settings)
+    entry_dir = cache_dir / key
+    if (entry_dir / ENTRY_FILE).exists():
+        return None
+
+    names = [n for stage in ('compose', 'verify', 'restrict') for n in STAGE_FILES[stage]] + list(EXTRA_FILES)
+    files = [n for n in names if (out_dir / n).exists()]
+    verification = read_meta(out_dir, "prism_verification")
+    entry = {
+        'key': key,
+        'digest': canonical.digest,
+        'settings': settings,
+        'scenario': scenario,
+        'node_map': canonical.node_map,
+        'team_map': canonical.team_map,
+        'files': files,
+        'prism_verification': {k: verification[k] for k in VERIFICATION_KEYS if k in verification},
+        'source_run': str(out_dir),
+        'created_at': datetime.datetime.now(datetime.UTC).strftime('%Y%m%dT%H%M%SZ'),
+    }
+    # Build the entry next to its final place and rename it in, so a concurrent
+    # run never sees a partial entry
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    staging = cache_dir / f".{key}.{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir()
+    for name in files:
+        shutil.copyfile(out_dir / name, staging / name)
+    (staging / ENTRY_FILE).write_text(json.dumps(entry, indent=2, default=str))
+    try:
+        staging.rename(entry_dir)
+    except OSError:
+        # Stored by a concurrent run in the meantime
+        shutil.rmtree(staging, ignore_errors=True)
+        return None
+    return entry_dir
+
+
+def restore(cache_dir: pathlib.Path, out_dir: pathlib.Path, scenario: dict,
+            settings: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Reuse the cached artifacts of an isomorphic scenario, renamed to this one.
+
+    Returns {'hit', 'digest', 'key'} and, on a hit, 'source_run', 'node_map'
+    and 'team_map' (cached names -> this scenario's), 'stages' (the stages
+    whose outputs were restored), 'scenario' (this scenario in the cached
+    node and team order, to be saved as the validated scenario) and
+    'prism_verification' (the cached results, renamed); on a miss with an
+    entry that cannot be reused, or a scenario too symmetric to hash, 'reason'.
+    """
+    try:
+        canonical = canonicalize(scenario)
+    except LabellingBudgetError as exc:
+        return {'hit': False, 'digest': None, 'key': None, 'reason': str(exc)}
+    key = cache_key(canonical.digest, settings)
+    report: Dict[str, Any] = {'hit': False, 'digest': canonical.digest, 'key': key}
+    entry_path = cache_dir / key / ENTRY_FILE
+    if not entry_path.exists():
+        return report
+    if not _unique_ids(scenario):
+        report['reason'] = "team ids are not unique"
+        return report
+    try:
+        entry = json.loads(entry_path.read_text())
+    except (OSError, json.JSONDecodeError) as exc:
+        report['reason'] = f"unreadable cache entry: {exc}"
+        return report
+    if entry.get('digest') != canonical.digest:
+        report['reason'] = "cache entry does not match the scenario hash"
+        return report
+
+    cached = canonicalize(entry['scenario'])
+    nodes, teams = cached.mapping_to(canonical)
+    entry_dir = entry_path.parent
+    files = [n for n in entry['files'] if (entry_dir / n).exists()]
+    try:
+        check_relabel("\n".join((entry_dir / n).read_text() for n in STAGE_FILES['compose']), nodes, teams)
+    except (OSError, RelabelError) as exc:
+        report['reason'] = str(exc)
+        return report
+
+    # Each stage needs the outputs of the stages before it
+    stages = []
+    for stage, names in STAGE_FILES.items():
+        if not all(n in files for n in names):
+            break
+        stages.append(stage)
+    restored = [n for s in stages for n in STAGE_FILES[s]]
+    if 'verify' in stages:
+        restored += [n for n in EXTRA_FILES if n in files]
+    for name in restored:
+        if name in VERBATIM_FILES:
+            shutil.copyfile(entry_dir / name, out_dir / name)
+        else:
+            text = (entry_dir / name).read_text()
+            (out_dir / name).write_text(relabel_prism_text(text, nodes, teams))
+
+    verification = dict(entry.get('prism_verification', {}))
+    if 'properties' in verification:
+        verification['properties'] = [{**r, 'property': relabel_prism_text(r['property'], nodes, teams)}
+                                      if r.get('property') else r for r in verification['properties']]
+    if 'restrict' not in stages:
+        verification.pop('restrict_stats', None)
+    report.update({
+        'hit': True,
+        'source_run': entry.get('source_run'),
+        'node_map': nodes,
+        'team_map': teams,
+        'stages': stages,
+        'scenario': reorder_like(scenario, entry['scenario'], nodes, teams),
+        'prism_verification': verification if 'verify' in stages else {},
+    })
+    return report
+
+
+__all__ = ['cache_key', 'store', 'restore', 'ENTRY_FILE']
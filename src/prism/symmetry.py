@@ -0,0 +1,215 @@
+"""
+Symmetry reduction for interchangeable teams.
+
+Teams with the same start node and capacity are interchangeable: swapping
+their location variables (e.g. loct1 <-> loct2) maps every state to one with
+the same optimal values, and every strategy to an equally good one. The
+exported MDP is therefore quotiented before it is solved in Python: each state
+is replaced by the representative of its orbit, found by sorting the location
+values within every group of interchangeable teams (the canonical ordering).
+
+Policies computed on the quotient are mapped back to concrete team ids by
+renumbering the team in each action label (t1_a_b_2 -> t2_a_b_2) with the
+permutation that takes the representative to the concrete state.
+
+Symmetry is only used when every state variable is a node counter x<node> or
+a team location; any other team-indexed variable would break the symmetry, so
+no groups are reported then. The model is written by an LLM, so the exported
+MDP itself is checked before it is quotiented (check_symmetry): every team
+transposition that generates the groups must map each state's labels and
+choices onto those of its image. If any check fails the full MDP is solved.
+
+Only the Python solvers use the quotient (the Pareto front for cost and
+multi-objective scenarios). PRISM still builds and checks the full model for
+the max_reach_prob verification.
+"""
+
+import math
+import pathlib
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from prism.actions import ACTION_RE, decode_action
+from prism.predicates import team_location_vars
+from utils.meta import update_meta
+
+# (action, [(dest, prob), ...]) per choice index, as in prism.pareto
+Choices = Dict[int, Dict[int, Tuple[Optional[str], List[Tuple[int, float]]]]]
+
+
+def interchangeable_groups(scenario: dict, var_names: List[str]) -> List[List[int]]:
+    """Groups (size >= 2) of 1-based team numbers with equal start node and capacity."""
+    loc_vars = team_location_vars(var_names, scenario)
+    teams = scenario.get('teams', [])
+    if len(loc_vars) != len(teams):
+        return []
+    other = [v for v in var_names if v not in loc_vars and not v.startswith('x')]
+    if other:
+        return []
+    by_key: Dict[Tuple[str, int], List[int]] = {}
+    for i, team in enumerate(teams, start=1):
+        by_key.setdefault((team['start'], team['capacity']), []).append(i)
+    return [g for g in by_key.values() if len(g) > 1]
+
+
+class TeamSymmetry:
+    """Canonical ordering of team location values under the interchangeable groups."""
+
+    def __init__(self, var_names: List[str], scenario: dict, groups: List[List[int]]):
+        self.var_names = var_names
+        self.groups = groups
+        loc_vars = team_location_vars(var_names, scenario)
+        self.loc_index = [var_names.index(v) for v in loc_vars]  # team number - 1 -> position
+
+    def canonical(self, values: Sequence[int]) -> Tuple[int, ...]:
+        canon = list(values)
+        for group in self.groups:
+            positions = [self.loc_index[t - 1] for t in group]
+            for pos, value in zip(positions, sorted(values[p] for p in positions)):
+                canon[pos] = value
+        return tuple(canon)
+
+    def team_map(self, rep: Sequence[int], concrete: Sequence[int]) -> Dict[int, int]:
+        """Team renumbering that takes the representative's locations to the concrete state's."""
+        mapping = {}
+        for group in self.groups:
+            free = list(group)
+            for t in group:
+                value = rep[self.loc_index[t - 1]]
+                match = next(u for u in free if concrete[self.loc_index[u - 1]] == value)
+                free.remove(match)
+                if match != t:
+                    mapping[t] = match
+        return mapping
+
+
+def relabel(action: Optional[str], mapping: Dict[int, int]) -> Optional[str]:
+    """Renumber the team of a move label (t1_a_b_2 with {1: 2} -> t2_a_b_2)."""
+    move = decode_action(action)
+    if not move or move['team'] not in mapping:
+        return action
+    m = ACTION_RE.match(action)
+    prefix = action[:m.start(1)]
+    return f"{prefix}{mapping[move['team']]}{action[m.end(1):]}"
+
+
+def quotient(choices: Choices, states: Dict[int, Dict[str, Any]], symmetry: TeamSymmetry):
+    """
+    Quotient an MDP by team symmetry.
+
+    Returns (quotient choices over representative states, state -> representative).
+    The representative of an orbit is its lowest state id.
+    """
+    names = symmetry.var_names
+    orbit_rep: Dict[Tuple[int, ...], int] = {}
+    rep_of: Dict[int, int] = {}
+    for sid in sorted(states):
+        key = symmetry.canonical([states[sid][v] for v in names])
+        rep_of[sid] = orbit_rep.setdefault(key, sid)
+
+    q_choices: Choices = {}
+    for rep in set(rep_of.values()):
+        q_choices[rep] = {}
+        for choice, (action, succ) in choices.get(rep, {}).items():
+            merged: Dict[int, float] = {}
+            for dest, prob in succ:
+                target = rep_of.get(dest, dest)
+                merged[target] = merged.get(target, 0.0) + prob
+            q_choices[rep][choice] = (action, list(merged.items()))
+    return q_choices, rep_of
+
+
+def lift_policy(policy: Dict[int, Optional[int]], choices: Choices, states: Dict[int, Dict[str, Any]],
+                rep_of: Dict[int, int], symmetry: TeamSymmetry) -> Dict[int, Optional[int]]:
+    """Map a policy over representatives back to every concrete state (choice indices of that state)."""
+    names = symmetry.var_names
+    lifted: Dict[int, Optional[int]] = {}
+    for sid, rep in rep_of.items():
+        choice = policy.get(rep)
+        if choice is None or sid == rep:
+            lifted[sid] = choice
+            continue
+        action = choices[rep][choice][0]
+        mapping = symmetry.team_map([states[rep][v] for v in names], [states[sid][v] for v in names])
+        target = relabel(action, mapping)
+        lifted[sid] = next((c for c, (a, _) in choices.get(sid, {}).items() if a == target), None)
+    return lifted
+
+
+def check_symmetry(choices: Choices, states: Dict[int, Dict[str, Any]], state_to_labels: Dict[int, List[str]],
+                   symmetry: TeamSymmetry, tolerance: float = 1e-9) -> Optional[str]:
+    """
+    Check that the MDP is invariant under the team groups.
+
+    Every group is generated by swapping neighbouring teams, so each swap is
+    checked: it must map states to states with the same labels, and each
+    state's choices (relabelled action, mapped successor distribution) onto
+    the choices of its image. Returns None if the MDP is symmetric, else the
+    first violation.
+    """
+    names = symmetry.var_names
+    by_values = {tuple(vals[v] for v in names): sid for sid, vals in states.items()}
+    digits = max(0, round(-math.log10(tolerance)))
+
+    def signature(sid, mapping, image):
+        return sorted((relabel(action, mapping) or '',
+                       tuple(sorted((image[d], round(p, digits)) for d, p in succ)))
+                      for action, succ in choices.get(sid, {}).values())
+
+    for group in symmetry.groups:
+        for t, u in zip(group, group[1:]):
+            i, j = symmetry.loc_index[t - 1], symmetry.loc_index[u - 1]
+            image = {}
+            for sid, vals in states.items():
+                values = [vals[v] for v in names]
+                values[i], values[j] = values[j], values[i]
+                target = by_values.get(tuple(values))
+                if target is None:
+                    return f"swapping teams {t} and {u} maps state {sid} outside the state space"
+                image[sid] = target
+            identity = {sid: sid for sid in states}
+            for sid in states:
+                if set(state_to_labels.get(sid, ())) != set(state_to_labels.get(image[sid], ())):
+                    return f"swapping teams {t} and {u} changes the labels of state {sid}"
+                if signature(sid, {t: u, u: t}, image) != signature(image[sid], {}, identity):
+                    return f"swapping teams {t} and {u} changes the choices of state {sid}"
+    return None
+
+
+def symmetry_report(out_dir: pathlib.Path, scenario: dict,
+                    states: Optional[Dict[int, Dict[str, Any]]] = None,
+                    var_names: Optional[List[str]] = None, applied: bool = True) -> Dict[str, Any]:
+    """
+    Record interchangeable teams under meta 'symmetry'.
+
+    applied says whether the quotient is used by this run (only the Pareto
+    solver uses it); the orbits and reduction factor are only reported then.
+    The entry is merged, since the Pareto stage adds the result of its
+    symmetry check to it.
+    """
+    if states is None:
+        from prism.extract_path import parse_states
+
+        sta = out_dir / "strat.sta"
+        if not sta.exists():
+            return {'status': 'error', 'message': 'strat.sta not found'}
+        var_names, states = parse_states(sta)
+    groups = interchangeable_groups(scenario, var_names)
+    teams = scenario.get('teams', [])
+    report: Dict[str, Any] = {
+        'groups': [[teams[t - 1]['id'] for t in g] for g in groups],
+        'states': len(states),
+        'applied': bool(groups) and applied,
+        'orbits': None,
+        'factor': None,
+    }
+    if report['applied']:
+        symmetry = TeamSymmetry(var_names, scenario, groups)
+        orbits = {symmetry.canonical([vals[v] for v in var_names]) for vals in states.values()}
+        report['orbits'] = len(orbits)
+        report['factor'] = round(len(states) / max(len(orbits), 1), 3)
+    update_meta(out_dir, "symmetry", report, merge=True)
+    return report
+
+
+__all__ = ['interchangeable_groups', 'TeamSymmetry', 'relabel', 'quotient', 'lift_policy', 'check_symmetry',
+           'symmetry_report']
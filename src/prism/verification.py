@@ -1,16 +1,69 @@
-import subprocess
 import sys
-import re
 import datetime
+import re
 from utils.meta import update_meta
+from utils.clients import run_prism, read_input
+from prism.runner import KILLED_RETURNCODE, parse_result, parse_stats
+from prism.objectives import write_run_properties
 from prism.composer import main as compose
-from prism.fix_model import attempt_autofix, save_fixed_model
+from prism.fix_model import autofix, save_fixed_model
+
+
+def _run_stats(proc):
+    """Parsed statistics of a PRISM run (recomputed from stdout for replayed runs)."""
+    return getattr(proc, 'stats', None) or parse_stats(proc.stdout or "")
+
 
+def killed_reason(proc):
+    """Why PRISM was killed (resource limit or SIGKILL), or None if it exited by itself."""
+    stats = getattr(proc, 'stats', None) or {}
+    if not stats.get('killed') and proc.returncode != KILLED_RETURNCODE:
+        return None
+    m = re.search(r"PRISM killed: (.*)", proc.stderr or "")
+    return m.group(1).strip() if m else (stats.get('killed') or "killed by SIGKILL")
 
-def run_prism_verification(out_dir, scenario_obj, template_text, model, log):
+
+def exit_if_killed(proc, out_dir, error_meta=None):
+    """
+    Stop the run if PRISM was killed for exceeding a resource limit.
+
+    The model is not at fault, so the auto-fix/regenerate prompt is not offered.
+    """
+    reason = killed_reason(proc)
+    if reason is None:
+        return
+    print(f"✗ PRISM was stopped: {reason}. Raise --prism-timeout/--prism-max-rss or use a smaller model.")
+    update_meta(out_dir, "prism_verification", {'stats': _run_stats(proc), 'killed': reason}, merge=True)
+    if error_meta is not None:
+        error_meta['resolution'] = 'resource-limit'
+        update_meta(out_dir, "prism_error_recovery", error_meta)
+    sys.exit(1)
+
+
+def property_results(stats, entries):
+    """
+    Pair the per-property results PRISM printed with the properties of the run, in order.
+
+    If PRISM printed fewer results (output without "Model checking:" headers),
+    they are matched from the end, where the primary property is.
+    """
+    blocks = stats.get('properties', [])
+    offset = len(entries) - len(blocks)
+    results = []
+    for entry, block in zip(entries[max(offset, 0):], blocks[max(-offset, 0):]):
+        results.append({**entry, 'value': parse_result(block['raw']), 'raw': block['raw'],
+                        'time_s': block['time_s'], 'error': block['error']})
+    return results
+
+
+def run_prism_verification(out_dir, scenario_obj, template_text, model, log, limits=None, metrics=()):
     """
     PHASE 1: Run PRISM verification and export induced strategy.
-    
+
+    Every property in properties.props and the requested metric properties
+    (prism.objectives.METRICS) are checked in one PRISM run; the strategy is
+    exported for the primary property (property 1).
+    limits (prism.runner.PrismLimits) bounds PRISM's wall-clock time and memory.
     Returns: (strat_path, sta_path, lab_path, prism_probability)
     """
     model_path = (out_dir / "model.prism").resolve()
@@ -26,19 +79,26 @@ def run_prism_verification(out_dir, scenario_obj, template_text, model, log):
     if not props_path.exists():
         print(f"Error: properties.props not found at {props_path}")
         sys.exit(1)
-    
+
+    run_props_path, run_properties = write_run_properties(out_dir, scenario_obj, metrics)
     cmd = [
         "prism",
         str(model_path),
-        str(props_path),
-        "-prop", "1",
+        str(run_props_path.resolve()),
         "-exportstrat", f"{str(strat_path)}:type=induced,mode=restrict,reach=false",
         "-exportmodel", str(sta_path),
         "-exportmodel", str(lab_path),
     ]
+    # Full MDP transitions (states/labels are strat.sta/.lab) and the per-state
+    # value vector, for the Pareto computation and incremental re-planning
+    cmd += [
+        "-exportmodel", str((out_dir / "full.tra").resolve()),
+        "-exportvector", str((out_dir / "values.txt").resolve()),
+    ]
 
     log("Running PRISM...")
-    proc = subprocess.run(cmd, capture_output=True, text=True)
+    proc = run_prism(cmd, "verify", limits, log)
+    exit_if_killed(proc, out_dir)
 
     if proc.returncode != 0:
         print("\n" + "="*60)
@@ -56,18 +116,25 @@ def run_prism_verification(out_dir, scenario_obj, template_text, model, log):
         
         # Give user option to retry or exit
         while True:
-            choice = input("\nOptions:\n  [A] Auto-fix with ChatGPT\n  [R] Regenerate from scratch\n  [E] Exit\nChoice (A/R/E): ").strip().upper()
+            choice = read_input("\nOptions:\n  [A] Auto-fix with ChatGPT\n  [R] Regenerate from scratch\n  [E] Exit\nChoice (A/R/E): ",
+                                "recovery").strip().upper()
             
             if choice == 'A':
                 print("\nAttempting auto-fix with ChatGPT...")
                 
-                # Get the fixed model from ChatGPT
-                fixed_model = attempt_autofix(
+                # Get the fixed model from ChatGPT (a patch around the error line if PRISM located it)
+                fixed_model, fix_record = autofix(
                     model_path=model_path,
                     props_path=props_path,
-                    error_output=proc.stdout,
+                    error_output=proc.stdout + "\n" + proc.stderr,
                     model=model
                 )
+                if fix_record['fix'] == 'patch':
+                    patch = fix_record['patch']
+                    print(f"✓ Patch applied around line {patch['line']} "
+                          f"({patch['excerpt_lines']} of {fix_record['model_lines']} lines sent).")
+                else:
+                    print("Patch not possible; the full model was sent.")
                 
                 # Save the fixed model and get backup path
                 backup_path = save_fixed_model(model_path, fixed_model)
@@ -77,12 +144,14 @@ def run_prism_verification(out_dir, scenario_obj, template_text, model, log):
                 # Log this attempt
                 error_meta['recovery_attempts'].append({
                     'method': 'auto-fix',
-                    'broken_model_backup': backup_path
+                    'broken_model_backup': backup_path,
+                    **fix_record
                 })
                 
                 # Retry PRISM execution
                 print("Running PRISM:\n", " ".join(cmd))
-                proc = subprocess.run(cmd, capture_output=True, text=True)
+                proc = run_prism(cmd, "verify", limits, log)
+                exit_if_killed(proc, out_dir, error_meta)
                 
                 if proc.returncode == 0:
                     print("✓ PRISM finished successfully after auto-fix.")
@@ -110,7 +179,8 @@ def run_prism_verification(out_dir, scenario_obj, template_text, model, log):
                     backup_path.write_text(model_path.read_text(encoding='utf-8'), encoding='utf-8')
                 
                 log(f"Generating PRISM model via {model}...")
-                compose(scenario_obj, template_text, out_dir, model=model)
+                compose(scenario_obj, template_text, out_dir, model=model, metrics=metrics)
+                run_props_path, run_properties = write_run_properties(out_dir, scenario_obj, metrics)
                 log("PRISM model and properties regenerated.")
                 
                 # Log this attempt
@@ -121,7 +191,8 @@ def run_prism_verification(out_dir, scenario_obj, template_text, model, log):
                 
                 # Retry PRISM execution
                 print("Running PRISM:\n", " ".join(cmd))
-                proc = subprocess.run(cmd, capture_output=True, text=True)
+                proc = run_prism(cmd, "verify", limits, log)
+                exit_if_killed(proc, out_dir, error_meta)
                 
                 if proc.returncode == 0:
                     print("✓ PRISM finished successfully on retry.")
@@ -147,18 +218,29 @@ def run_prism_verification(out_dir, scenario_obj, template_text, model, log):
             else:
                 print("Invalid choice. Please enter A, R, or E.")
     
-    # Parse verification probability from PRISM output
-    prism_probability = None
-    result_match = re.search(r'Result:\s+([\d.]+)', proc.stdout)
-    if result_match:
-        prism_probability = float(result_match.group(1))
+    stats = _run_stats(proc)
+    if stats['states'] is not None:
+        log(f"PRISM statistics: {stats['states']} states, {stats['transitions']} transitions, "
+            f"construction {stats['construction_s']}s, checking {stats['checking_s']}s")
+    results = property_results(stats, run_properties)
+    for result in results:
+        timing = f" in {result['time_s']}s" if result['time_s'] is not None else ""
+        log(f"  {result['source']}: {result['property']} = {result['error'] or result['raw']}{timing}")
+    update_meta(out_dir, "prism_verification", {'stats': stats, 'properties': results}, merge=True)
+
+    # Verification probability: the result of the primary property
+    primary = next((r['value'] for r in results if r['primary']), None)
+    prism_probability = float(primary) if isinstance(primary, float) else None
 
-    log(f"PRISM run. Strat, sta, and lab artifacts generated. Success probability: {prism_probability:.6f}")
+    if prism_probability is None:
+        log("PRISM run. Strat, sta, and lab artifacts generated. No numeric result for the primary property.")
+    else:
+        log(f"PRISM run. Strat, sta, and lab artifacts generated. Success probability: {prism_probability:.6f}")
     
     return strat_path, sta_path, lab_path, prism_probability
 
 
-def export_restricted_model(out_dir, strat_path, sta_path, lab_path, log):
+def export_restricted_model(out_dir, strat_path, sta_path, lab_path, log, limits=None):
     """
     PHASE 2: Re-import induced strategy and export restricted model.
     
@@ -184,7 +266,8 @@ def export_restricted_model(out_dir, strat_path, sta_path, lab_path, log):
     ]
     
     log("Exporting restricted model...")
-    proc_restricted = subprocess.run(cmd_restricted, capture_output=True, text=True)
+    proc_restricted = run_prism(cmd_restricted, "restrict", limits, log)
+    update_meta(out_dir, "prism_verification", {'restrict_stats': _run_stats(proc_restricted)}, merge=True)
     
     if proc_restricted.returncode != 0:
         print("\n" + "="*60)
@@ -209,49 +292,73 @@ def export_restricted_model(out_dir, strat_path, sta_path, lab_path, log):
     return use_restricted, path_strat_file, path_sta_file, path_lab_file
 
 
-def main(out_dir, scenario_obj, template_text, model, log):
+def verify(out_dir, scenario_obj, template_text, model, log, limits=None, metrics=()):
     """
-    Run PRISM verification and export strategy files.
-    
-    PHASE 1: Verify PRISM model & export induced strategy
-    PHASE 2: Re-import strategy and export restricted model
-    
-    Returns: (use_restricted, path_strat_file, path_sta_file, path_lab_file, prism_probability)
+    Verification stage: run PHASE 1 (including interactive error recovery).
+
+    Returns: (strat_path, sta_path, lab_path, prism_probability)
     """
-    # PHASE 1:
-    strat_path, sta_path, lab_path, prism_probability = run_prism_verification(
-        out_dir, scenario_obj, template_text, model, log
-    )
-    
-    # PHASE 2:
-    use_restricted, path_strat_file, path_sta_file, path_lab_file = export_restricted_model(
-        out_dir, strat_path, sta_path, lab_path, log
-    )
+    return run_prism_verification(out_dir, scenario_obj, template_text, model, log, limits, metrics)
+
 
-    # Save PRISM verification metadata
+def record_verification_meta(out_dir, prism_probability):
+    """Save PRISM verification metadata for a completed PHASE 1."""
     model_path = (out_dir / "model.prism").resolve()
     props_path = (out_dir / "properties.props").resolve()
-    
+
     prism_meta = {
         'verification_probability': prism_probability,
         'verification_probability_description': 'Maximum probability of reaching the goal as computed by PRISM model checking',
         'model_file': str(model_path),
         'properties_file': str(props_path),
         'strategy_files': {
-            'tra': str(strat_path),
-            'sta': str(sta_path),
-            'lab': str(lab_path)
+            'tra': str((out_dir / "strat.tra").resolve()),
+            'sta': str((out_dir / "strat.sta").resolve()),
+            'lab': str((out_dir / "strat.lab").resolve())
         }
     }
+    update_meta(out_dir, "prism_verification", prism_meta, merge=True)
+
+
+def restrict(out_dir, log, limits=None):
+    """
+    Restriction stage: run PHASE 2 on the strategy exported by verify().
+
+    Can be run on its own against an existing run directory.
+    Returns: (path_strat_file, path_sta_file, path_lab_file)
+    """
+    strat_path = (out_dir / "strat.tra").resolve()
+    sta_path   = (out_dir / "strat.sta").resolve()
+    lab_path   = (out_dir / "strat.lab").resolve()
+
+    use_restricted, path_strat_file, path_sta_file, path_lab_file = export_restricted_model(
+        out_dir, strat_path, sta_path, lab_path, log, limits
+    )
+
+    restricted_files = None
     if use_restricted:
-        restricted_tra = (out_dir / "restricted.tra").resolve()
-        restricted_sta = (out_dir / "restricted.sta").resolve()
-        restricted_lab = (out_dir / "restricted.lab").resolve()
-        prism_meta['restricted_model_files'] = {
-            'tra': str(restricted_tra),
-            'sta': str(restricted_sta),
-            'lab': str(restricted_lab)
+        restricted_files = {
+            'tra': str(path_strat_file),
+            'sta': str(path_sta_file),
+            'lab': str(path_lab_file)
         }
-    update_meta(out_dir, "prism_verification", prism_meta)
-    
+    update_meta(out_dir, "prism_verification", {'restricted_model_files': restricted_files}, merge=True)
+
     return path_strat_file, path_sta_file, path_lab_file
+
+
+def main(out_dir, scenario_obj, template_text, model, log, limits=None, metrics=()):
+    """
+    Run PRISM verification and export strategy files.
+    
+    PHASE 1: Verify PRISM model & export induced strategy
+    PHASE 2: Re-import strategy and export restricted model
+    
+    Returns: (path_strat_file, path_sta_file, path_lab_file)
+    """
+    # PHASE 1:
+    prism_probability = verify(out_dir, scenario_obj, template_text, model, log, limits, metrics)[3]
+    record_verification_meta(out_dir, prism_probability)
+
+    # PHASE 2:
+    return restrict(out_dir, log, limits)
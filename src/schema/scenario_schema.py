@@ -5,7 +5,9 @@ from enum import Enum
 
 # --- Base with extra='forbid' so the server schema has additionalProperties:false ---
 class AppModel(BaseModel):
-    model_config = ConfigDict(extra="forbid")  # important for strict schemas
+    # extra='forbid' is important for strict schemas; populate_by_name lets a
+    # saved validated_scenario.json (dumped with "from_") be loaded back.
+    model_config = ConfigDict(extra="forbid", populate_by_name=True)
 
 class Safety(str, Enum):
     G = "G"; Y = "Y"; R = "R"
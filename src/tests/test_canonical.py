@@ -0,0 +1,52 @@
+import pytest
+
+from prism.canonical import LabellingBudgetError, canonicalize, relabel_prism_text
+
+
+def test_relabel_swapped_names_in_one_pass():
+    nodes = {'a': 'g', 'g': 'a'}
+    text = ('const int g = 0; // "g"\n'
+            'xa : [0..7] init inita; // graph/nodes "a"\n'
+            '[t1_a_g_2] (loct1 = a) -> (xg\'=xg+2); // teams[0].id = "T1"\n')
+    assert relabel_prism_text(text, nodes, {'T1': 'T2', 'T2': 'T1'}) == (
+        'const int a = 0; // "a"\n'
+        'xg : [0..7] init initg; // graph/nodes "g"\n'
+        '[t1_g_a_2] (loct2 = g) -> (xa\'=xa+2); // teams[0].id = "T2"\n')
+
+
+def test_relabel_keeps_reserved_and_unknown_quoted_names():
+    text = 'label "goal" = xa >= 1; // "deadlock" "xa" "other"'
+    assert relabel_prism_text(text, {'a': 'b'}, {}) == 'label "goal" = xb >= 1; // "deadlock" "xb" "other"'
+
+
+def test_isomorphic_scenarios_share_digest():
+    def scenario(names, start):
+        a, b, c = names
+        return {'graph': {'nodes': [a, b, c], 'undirected': True,
+                          'edges': [{'from': a, 'to': b, 'distance': 3, 'safety': 'G'},
+                                    {'from': b, 'to': c, 'distance': 5, 'safety': 'R'}]},
+                'teams': [{'id': 'T1', 'start': start(names), 'capacity': 2}],
+                'resources': [{'node': a, 'qty': 2}], 'demands': [{'node': c, 'qty': 2}],
+                'constraints': {'safety_probs': {'G': 0.99, 'R': 0.5}}, 'objective': 'max_reach_prob'}
+
+    first = canonicalize(scenario(('a', 'b', 'c'), lambda n: n[0]))
+    second = canonicalize(scenario(('z', 'y', 'x'), lambda n: n[0]))
+    assert first.digest == second.digest
+    assert first.mapping_to(second)[0] == {'a': 'z', 'b': 'y', 'c': 'x'}
+
+
+def _star(leaves):
+    names = [f"l{i}" for i in range(leaves)]
+    return {'graph': {'nodes': ['c'] + names, 'undirected': True,
+                      'edges': [{'from': 'c', 'to': n, 'distance': 1, 'safety': 'G'} for n in names]},
+            'teams': [{'id': 'T1', 'start': 'c', 'capacity': 2}], 'resources': [], 'demands': [],
+            'constraints': {'safety_probs': {'G': 0.9}}, 'objective': 'max_reach_prob'}
+
+
+def test_symmetric_graph_within_budget():
+    assert canonicalize(_star(30)).digest == canonicalize(_star(30)).digest
+
+
+def test_search_budget():
+    with pytest.raises(LabellingBudgetError):
+        canonicalize(_star(100))
@@ -0,0 +1,27 @@
+from prism.objectives import OBJECTIVE_PROPERTIES, metric_properties, steps_rewards
+
+SCENARIO = {
+    'demands': [{'node': 'g', 'qty': 7}, {'node': 'd', 'qty': 0}, {'node': 'e', 'qty': 2}],
+}
+
+
+def test_steps_metric_targets_goal_or_deadlock():
+    props = dict(metric_properties(SCENARIO, ["steps"], steps_rewards()))
+    assert props["steps"] == 'R{"steps"}min=? [ F (((xg >= 7) & (xe >= 2)) | "deadlock") ]'
+
+
+def test_steps_metric_needs_the_steps_reward():
+    assert metric_properties(SCENARIO, ["steps"], "") == []
+
+
+def test_metric_properties():
+    props = dict(metric_properties(SCENARIO, ["pmin", "demands"], ""))
+    assert props == {
+        "pmin": "Pmin=? [ F ((xg >= 7) & (xe >= 2)) ]",
+        "reach_g": "Pmax=? [ F (xg >= 7) ]",
+        "reach_e": "Pmax=? [ F (xe >= 2) ]",
+    }
+
+
+def test_min_expected_cost_property_is_finite_under_failures():
+    assert OBJECTIVE_PROPERTIES["min_expected_cost"] == ['R{"dist"}min=? [ F ("goal" | "deadlock") ]']
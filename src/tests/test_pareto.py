@@ -0,0 +1,35 @@
+from prism.pareto import PROBABILITY_TOLERANCE, pareto_filter, select_tradeoff
+
+
+def point(probability, expected_distance, *weights):
+    return {'probability': probability, 'expected_distance': expected_distance, 'weights': list(weights)}
+
+
+FRONT = pareto_filter([
+    point(0.96, 33.5, 1.0),
+    point(0.958, 30.0, 0.9),
+    point(0.82, 21.2, 0.8),
+    point(0.25, 3.0, 0.35),
+    point(0.0, 0.0, 0.0),
+])
+
+
+def test_min_expected_cost_picks_cheapest_point_near_maximum_probability():
+    selected = select_tradeoff(FRONT, "min_expected_cost")
+    assert selected['probability'] == 0.958
+    assert selected['expected_distance'] == 30.0
+
+
+def test_min_expected_cost_never_picks_degenerate_halting_point():
+    selected = select_tradeoff(FRONT, "min_expected_cost")
+    assert selected['probability'] >= FRONT[0]['probability'] * (1 - PROBABILITY_TOLERANCE)
+
+
+def test_min_expected_cost_tolerance_is_relative_to_maximum():
+    assert select_tradeoff(FRONT, "min_expected_cost", tolerance=0.0)['probability'] == 0.96
+    assert select_tradeoff(FRONT, "min_expected_cost", tolerance=0.2)['probability'] == 0.82
+
+
+def test_max_reach_prob_and_multi_objective():
+    assert select_tradeoff(FRONT, "max_reach_prob")['probability'] == 0.96
+    assert select_tradeoff(FRONT, "multi_objective", weight=0.4)['probability'] == 0.25
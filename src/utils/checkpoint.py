@@ -0,0 +1,70 @@
+from __future__ import annotations
+import datetime, hashlib, json, pathlib
+from typing import Any, Mapping
+
+from utils.meta import read_meta, update_meta
+
+__all__ = ["CHECKPOINT_FILE", "hash_input", "load_checkpoint", "stage_is_current", "record_checkpoint"]
+
+CHECKPOINT_FILE = "checkpoints.json"
+
+
+def hash_input(value: str | pathlib.Path) -> str | None:
+    """Return a sha256 digest for a stage input.
+
+    pathlib.Path values are hashed by file content (None if the file is missing);
+    plain strings (user text, model names) are hashed directly.
+    """
+    if isinstance(value, pathlib.Path):
+        if not value.exists():
+            return None
+        return hashlib.sha256(value.read_bytes()).hexdigest()
+    return hashlib.sha256(str(value).encode("utf-8")).hexdigest()
+
+
+def load_checkpoint(base: str | pathlib.Path, stage: str) -> dict[str, Any] | None:
+    """Return the recorded checkpoint for a stage, or None if there is none."""
+    path = pathlib.Path(base) / CHECKPOINT_FILE
+    if not path.exists():
+        return None
+    try:
+        data = json.loads(path.read_text())
+    except Exception:
+        return None
+    entry = data.get(stage) if isinstance(data, dict) else None
+    return entry if isinstance(entry, dict) else None
+
+
+def stage_is_current(base: str | pathlib.Path, stage: str,
+                     inputs: Mapping[str, str | pathlib.Path],
+                     outputs: list[pathlib.Path], meta_keys: tuple[str, ...] = ()) -> bool:
+    """Check whether a stage can be skipped.
+
+    A stage is current when it has a checkpoint, every output (file or meta.json
+    entry) still exists and every input hashes to the value recorded when the
+    stage last completed.
+    Outputs are only checked for existence: a hand-edited model.prism is picked
+    up by the next stage through its input hash rather than being overwritten.
+    """
+    entry = load_checkpoint(base, stage)
+    if entry is None:
+        return False
+    if not all(p.exists() for p in outputs) or not all(read_meta(base, key) for key in meta_keys):
+        return False
+    recorded = entry.get("inputs", {})
+    return all(recorded.get(name) == hash_input(value) for name, value in inputs.items()) \
+        and set(recorded) == set(inputs)
+
+
+def record_checkpoint(base: str | pathlib.Path, stage: str,
+                      inputs: Mapping[str, str | pathlib.Path],
+                      outputs: list[pathlib.Path], meta_keys: tuple[str, ...] = ()) -> pathlib.Path:
+    """Record a completion checkpoint for a stage in checkpoints.json."""
+    entry = {
+        "completed_at": datetime.datetime.now(datetime.UTC).strftime('%Y%m%dT%H%M%SZ'),
+        "inputs": {name: hash_input(value) for name, value in inputs.items()},
+        "outputs": {p.name: hash_input(p) for p in outputs},
+    }
+    if meta_keys:
+        entry["meta"] = list(meta_keys)
+    return update_meta(base, stage, entry, filename=CHECKPOINT_FILE)
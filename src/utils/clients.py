@@ -0,0 +1,61 @@
+"""
+Injection points for the external services the pipeline calls.
+
+Every OpenAI client, every PRISM invocation and every interactive prompt goes
+through the functions below, each tagged with the purpose of the call (LLM:
+"parse", "compose", "autofix", "overview"; PRISM: "verify", "restrict"; input:
+"recovery"). By default they create a real OpenAI client, run the `prism`
+binary and read stdin; a harness (see utils/replay.py) installs its own to
+record or replay them.
+"""
+
+from __future__ import annotations
+import subprocess
+from typing import Any, Callable, Optional, Sequence
+
+__all__ = ["install", "get_openai_client", "run_prism", "read_input"]
+
+_openai_factory: Optional[Callable[[str], Any]] = None
+_prism_runner: Optional[Callable[..., subprocess.CompletedProcess]] = None
+_input_reader: Optional[Callable[[str, str], str]] = None
+
+
+def install(openai_factory: Optional[Callable[[str], Any]] = None,
+            prism_runner: Optional[Callable[..., subprocess.CompletedProcess]] = None,
+            input_reader: Optional[Callable[[str, str], str]] = None) -> None:
+    """Replace the OpenAI client factory, PRISM runner and/or input reader (None restores the default)."""
+    global _openai_factory, _prism_runner, _input_reader
+    _openai_factory, _prism_runner, _input_reader = openai_factory, prism_runner, input_reader
+
+
+def default_openai_client(purpose: str):
+    from openai import OpenAI
+
+    return OpenAI()
+
+
+def default_run_prism(cmd: Sequence[str], purpose: str, limits=None, progress=None) -> subprocess.CompletedProcess:
+    from prism.runner import run_streamed
+
+    return run_streamed(cmd, limits, progress)
+
+
+def get_openai_client(purpose: str):
+    """OpenAI client for one call site (only `client.responses.create/parse` are used)."""
+    return (_openai_factory or default_openai_client)(purpose)
+
+
+def run_prism(cmd: Sequence[str], purpose: str, limits=None,
+              progress: Optional[Callable[[str], None]] = None) -> subprocess.CompletedProcess:
+    """
+    Run a PRISM command line, returning the completed process (returncode, stdout, stderr).
+
+    limits is a prism.runner.PrismLimits and progress receives live progress
+    messages; both are ignored by runners that do not start PRISM.
+    """
+    return (_prism_runner or default_run_prism)(cmd, purpose, limits=limits, progress=progress)
+
+
+def read_input(prompt: str, purpose: str) -> str:
+    """Interactive prompt (e.g. the error-recovery choice)."""
+    return _input_reader(prompt, purpose) if _input_reader else input(prompt)
@@ -1,10 +1,15 @@
 from __future__ import annotations
-import json, pathlib
+import json, os, pathlib, threading
 from typing import Any, Mapping
 
-__all__ = ["update_meta"]
+__all__ = ["update_meta", "read_meta"]
 
-def update_meta(base: str | pathlib.Path, key: str, entry: Mapping[str, Any], filename: str = "meta.json") -> pathlib.Path:
+# Pipeline stages may run concurrently (see utils.scheduler); serialize the
+# read-modify-write below so updates to different keys are not lost.
+_META_LOCK = threading.Lock()
+
+def update_meta(base: str | pathlib.Path, key: str, entry: Mapping[str, Any], filename: str = "meta.json",
+                merge: bool = False) -> pathlib.Path:
     """Create or update a JSON meta file with a top-level key.
 
     If the file exists and is a JSON object, it is loaded and the key overwritten.
@@ -15,6 +20,7 @@ def update_meta(base: str | pathlib.Path, key: str, entry: Mapping[str, Any], fi
       key: top-level key to set (e.g. 'parse_scenario', 'prism_generation')
       entry: JSON-serializable mapping to store under the key
       filename: meta file name (default 'meta.json')
+      merge: merge entry into an existing mapping under key instead of replacing it
 
     Returns the pathlib.Path to the written file.
     """
@@ -22,16 +28,36 @@ def update_meta(base: str | pathlib.Path, key: str, entry: Mapping[str, Any], fi
     base_path.mkdir(parents=True, exist_ok=True)
     meta_path = base_path / filename
 
-    data: dict[str, Any] = {}
-    if meta_path.exists():
-        try:
-            loaded = json.loads(meta_path.read_text())
-            if isinstance(loaded, dict):
-                data = loaded
-        except Exception:
-            data = {}
-
-    # Overwrite / insert key
-    data[key] = entry
-    meta_path.write_text(json.dumps(data, indent=2))
+    with _META_LOCK:
+        data: dict[str, Any] = {}
+        if meta_path.exists():
+            try:
+                loaded = json.loads(meta_path.read_text())
+                if isinstance(loaded, dict):
+                    data = loaded
+            except Exception:
+                data = {}
+
+        # Overwrite / insert key
+        if merge and isinstance(data.get(key), dict):
+            data[key] = {**data[key], **entry}
+        else:
+            data[key] = dict(entry)
+        # Write-then-rename so concurrent read_meta() never sees a truncated file
+        tmp_path = meta_path.with_name(meta_path.name + ".tmp")
+        tmp_path.write_text(json.dumps(data, indent=2))
+        os.replace(tmp_path, meta_path)
     return meta_path
+
+
+def read_meta(base: str | pathlib.Path, key: str, filename: str = "meta.json") -> dict[str, Any]:
+    """Return the entry stored under a top-level key, or an empty dict if absent."""
+    meta_path = pathlib.Path(base) / filename
+    if not meta_path.exists():
+        return {}
+    try:
+        loaded = json.loads(meta_path.read_text())
+    except Exception:
+        return {}
+    entry = loaded.get(key) if isinstance(loaded, dict) else None
+    return dict(entry) if isinstance(entry, dict) else {}
@@ -0,0 +1,394 @@
+"""
+Record/replay harness for offline, deterministic pipeline runs.
+
+Record mode (main.py --record) wraps the real OpenAI client, PRISM runner and
+input prompt (see utils/clients.py) and saves every LLM response, every PRISM
+invocation (command, return code, stdout/stderr and the files it exported)
+and every interactive answer of a run to <run_dir>/recording/. Replay mode
+(main.py --replay <recording>) serves them back through fake clients, so a
+recorded run executes end-to-end without network access or PRISM.
+
+Calls are served in order per purpose ("compose", "verify", ...), so stages
+running concurrently cannot take each other's responses; a call with nothing
+left to serve raises ReplayError. Paths inside the run directory are stored
+relative to it ({run_dir}) and exported files are written to wherever the
+replayed command asks for them.
+
+Runs saved before recording existed (data/Prism_Pipeline/*) are converted with
+
+    python -m utils.replay import <run_dir>
+
+see import_run for what such a recording contains.
+"""
+
+from __future__ import annotations
+import argparse, ast, json, pathlib, re, shutil, subprocess, sys, threading
+from types import SimpleNamespace
+from typing import Any, Callable, Optional, Sequence
+
+from utils import clients
+
+__all__ = ["Recorder", "Replayer", "ReplayError", "import_run", "RECORDING_DIR", "RECORDING_FILE"]
+
+RECORDING_DIR = "recording"
+RECORDING_FILE = "recording.json"
+ARTIFACTS_DIR = "artifacts"
+RUN_DIR_TOKEN = "{run_dir}"
+# Options of main.py that change which calls a run makes, or how PRISM runs
+OPTIONS = ("reduce", "llm_parse", "llm_overview", "metrics", "prism_timeout", "prism_max_rss")
+EXPORT_FLAGS = ("-exportstrat", "-exportmodel", "-exportvector")
+EXPORT_OPTIONS_RE = re.compile(r":\w+=.*$")
+
+
+class ReplayError(RuntimeError):
+    """A replayed run made a call the recording has no response for."""
+
+
+def _exported_paths(cmd: Sequence[str]) -> list[pathlib.Path]:
+    """Files a PRISM command line exports (-exportstrat/-exportmodel/-exportvector targets)."""
+    return [pathlib.Path(EXPORT_OPTIONS_RE.sub("", value))
+            for flag, value in zip(cmd, cmd[1:]) if flag in EXPORT_FLAGS]
+
+
+def _find_recording(path: pathlib.Path) -> pathlib.Path:
+    """A recording directory, or a run directory that contains one."""
+    for candidate in (path, path / RECORDING_DIR):
+        if (candidate / RECORDING_FILE).exists():
+            return candidate
+    raise ReplayError(f"No {RECORDING_FILE} in {path} or {path / RECORDING_DIR}")
+
+
+class _Responses:
+    def __init__(self, call: Callable[[str, dict], Any]):
+        self._call = call
+
+    def create(self, **kwargs):
+        return self._call("create", kwargs)
+
+    def parse(self, **kwargs):
+        return self._call("parse", kwargs)
+
+
+class _Client:
+    """Stands in for openai.OpenAI: only client.responses.create/parse are used by the pipeline."""
+
+    def __init__(self, call: Callable[[str, dict], Any]):
+        self.responses = _Responses(call)
+
+
+class _Usage:
+    """Recorded usage; composer logs repr(usage), the other stages str(usage)."""
+
+    def __init__(self, text: str, plain: Optional[str] = None):
+        self._repr, self._str = text, plain if plain is not None else text
+
+    def __repr__(self):
+        return self._repr
+
+    def __str__(self):
+        return self._str
+
+
+class ReplayResponse:
+    """The parts of an OpenAI Responses API result the pipeline reads."""
+
+    def __init__(self, record: dict):
+        self.model = record.get("model")
+        self.output_text = record["output_text"]
+        self.usage = _Usage(record["usage"], record.get("usage_str")) if record.get("usage") is not None else None
+        self.output = [SimpleNamespace(content=[SimpleNamespace(text=self.output_text)])]
+
+
+class _Harness:
+    def __init__(self, rec_dir: pathlib.Path, run_dir: pathlib.Path):
+        self.rec_dir = rec_dir
+        self.run_dir = run_dir
+        self._lock = threading.Lock()
+        self.data: dict[str, Any] = {"version": 1, "source": None, "options": {}, "scenario_text": None,
+                                     "llm": {}, "prism": {}, "inputs": {}}
+
+    def _to_rel(self, text: str) -> str:
+        return text.replace(str(self.run_dir), RUN_DIR_TOKEN)
+
+    def _from_rel(self, text: str) -> str:
+        return text.replace(RUN_DIR_TOKEN, str(self.run_dir))
+
+    def install(self) -> None:
+        clients.install(self.openai_client, self.run_prism, self.read_input)
+
+    def uninstall(self) -> None:
+        clients.install()
+
+
+class Recorder(_Harness):
+    """Record the external calls of a run into <run_dir>/recording/."""
+
+    def __init__(self, run_dir: pathlib.Path):
+        super().__init__(run_dir / RECORDING_DIR, run_dir)
+        (self.rec_dir / ARTIFACTS_DIR).mkdir(parents=True, exist_ok=True)
+        self.data["source"] = str(run_dir)
+
+    def save(self) -> None:
+        with self._lock:
+            (self.rec_dir / RECORDING_FILE).write_text(json.dumps(self.data, indent=2), encoding="utf-8")
+
+    def _append(self, kind: str, purpose: str, entry: dict) -> int:
+        with self._lock:
+            calls = self.data[kind].setdefault(purpose, [])
+            calls.append(entry)
+            index = len(calls) - 1
+        self.save()
+        return index
+
+    def record_options(self, args: argparse.Namespace) -> None:
+        self.data["options"] = {name: getattr(args, name, None) for name in OPTIONS}
+        if getattr(args, "scenario_json", None):
+            shutil.copyfile(args.scenario_json, self.rec_dir / "scenario.json")
+            self.data["options"]["scenario_json"] = "scenario.json"
+        self.save()
+
+    def scenario_text(self, read: Callable[[], str]) -> str:
+        self.data["scenario_text"] = read()
+        self.save()
+        return self.data["scenario_text"]
+
+    def openai_client(self, purpose: str):
+        real = clients.default_openai_client(purpose)
+
+        def call(method, kwargs):
+            resp = getattr(real.responses, method)(**kwargs)
+            usage = getattr(resp, "usage", None)
+            self._append("llm", purpose, {
+                "method": method,
+                "model": getattr(resp, "model", None),
+                "output_text": resp.output_text,
+                "usage": repr(usage) if usage is not None else None,
+                "usage_str": str(usage) if usage is not None else None,
+            })
+            return resp
+
+        return _Client(call)
+
+    def run_prism(self, cmd: Sequence[str], purpose: str, limits=None, progress=None) -> subprocess.CompletedProcess:
+        proc = clients.default_run_prism(cmd, purpose, limits=limits, progress=progress)
+        with self._lock:
+            index = len(self.data["prism"].get(purpose, []))
+        artifacts = {}
+        for path in _exported_paths(cmd):
+            if path.exists():
+                name = f"{purpose}-{index}-{path.name}"
+                shutil.copyfile(path, self.rec_dir / ARTIFACTS_DIR / name)
+                artifacts[path.name] = f"{ARTIFACTS_DIR}/{name}"
+        self._append("prism", purpose, {
+            "cmd": [self._to_rel(str(a)) for a in cmd],
+            "returncode": proc.returncode,
+            "stdout": self._to_rel(proc.stdout or ""),
+            "stderr": self._to_rel(proc.stderr or ""),
+            "artifacts": artifacts,
+        })
+        return proc
+
+    def read_input(self, prompt: str, purpose: str) -> str:
+        answer = input(prompt)
+        self._append("inputs", purpose, {"prompt": prompt, "answer": answer})
+        return answer
+
+    def summary(self) -> dict:
+        return {
+            "mode": "record",
+            "dir": str(self.rec_dir),
+            "calls": {kind: {p: len(c) for p, c in self.data[kind].items()} for kind in ("llm", "prism", "inputs")},
+        }
+
+
+class Replayer(_Harness):
+    """Serve a recording to a run through fake clients."""
+
+    def __init__(self, path: pathlib.Path, run_dir: pathlib.Path):
+        rec_dir = _find_recording(path.resolve())
+        super().__init__(rec_dir, run_dir)
+        self.data = json.loads((rec_dir / RECORDING_FILE).read_text(encoding="utf-8"))
+        self._served: dict[tuple[str, str], int] = {}
+        self.command_mismatches: list[dict] = []
+
+    def apply_options(self, args: argparse.Namespace) -> None:
+        """Run with the options the recording was made with."""
+        options = self.data.get("options", {})
+        for name in OPTIONS:
+            if name in options:
+                setattr(args, name, options[name])
+        if "no_reduce" in options:
+            # Recordings made while reduction was on by default
+            args.reduce = not options["no_reduce"]
+        if options.get("scenario_json"):
+            args.scenario_json = self.rec_dir / options["scenario_json"]
+
+    def scenario_text(self, read: Callable[[], str]) -> str:
+        if self.data.get("scenario_text") is None:
+            raise ReplayError(f"{self.rec_dir} has no recorded scenario text")
+        return self.data["scenario_text"]
+
+    def _next(self, kind: str, purpose: str) -> dict:
+        with self._lock:
+            calls = self.data.get(kind, {}).get(purpose, [])
+            index = self._served.get((kind, purpose), 0)
+            if index >= len(calls):
+                raise ReplayError(f"No recorded {kind} call left for '{purpose}' "
+                                  f"({len(calls)} recorded, all served)")
+            self._served[(kind, purpose)] = index + 1
+            return calls[index]
+
+    def openai_client(self, purpose: str):
+        def call(method, kwargs):
+            record = self._next("llm", purpose)
+            if record.get("method", method) != method:
+                raise ReplayError(f"Recorded '{purpose}' call used responses.{record['method']}, "
+                                  f"replay asked for responses.{method}")
+            return ReplayResponse(record)
+
+        return _Client(call)
+
+    def run_prism(self, cmd: Sequence[str], purpose: str, limits=None, progress=None) -> subprocess.CompletedProcess:
+        record = self._next("prism", purpose)
+        replayed = [self._to_rel(str(a)) for a in cmd]
+        if record.get("cmd") is not None and record["cmd"] != replayed:
+            # The pipeline's command line changed since recording; the outputs are still served
+            with self._lock:
+                self.command_mismatches.append({"purpose": purpose, "recorded": record["cmd"], "replayed": replayed})
+        for path in _exported_paths(cmd):
+            source = record.get("artifacts", {}).get(path.name)
+            if source:
+                shutil.copyfile(self.rec_dir / source, path)
+        return subprocess.CompletedProcess(list(cmd), record["returncode"],
+                                           self._from_rel(record.get("stdout", "")),
+                                           self._from_rel(record.get("stderr", "")))
+
+    def read_input(self, prompt: str, purpose: str) -> str:
+        answer = self._next("inputs", purpose)["answer"]
+        print(f"{prompt}{answer}  (replayed)")
+        return answer
+
+    def summary(self) -> dict:
+        unused = {}
+        for kind in ("llm", "prism", "inputs"):
+            for purpose, calls in self.data.get(kind, {}).items():
+                left = len(calls) - self._served.get((kind, purpose), 0)
+                if left:
+                    unused[f"{kind}:{purpose}"] = left
+        return {
+            "mode": "replay",
+            "dir": str(self.rec_dir),
+            "source": self.data.get("source"),
+            "served": {f"{kind}:{purpose}": n for (kind, purpose), n in self._served.items()},
+            "unused": unused,
+            "command_mismatches": self.command_mismatches,
+        }
+
+
+def _user_text(parse_meta: dict) -> Optional[str]:
+    """The user's scenario text from a parse_scenario meta entry (input messages, possibly as a repr)."""
+    messages = parse_meta.get("input")
+    if isinstance(messages, str):
+        try:
+            messages = ast.literal_eval(messages)
+        except (ValueError, SyntaxError):
+            return None
+    return next((m["content"] for m in messages or [] if m.get("role") == "user"), None)
+
+
+def _overview(explanation: str) -> Optional[str]:
+    m = re.search(r"^## Overview\n(.*?)(?=^## |\Z)", explanation, re.DOTALL | re.MULTILINE)
+    return m.group(1).strip() if m else None
+
+
+def import_run(run_dir: pathlib.Path, dest: Optional[pathlib.Path] = None) -> pathlib.Path:
+    """
+    Build a recording from a run saved without --record (e.g. data/Prism_Pipeline/*).
+
+    Such runs keep the final outputs only, so the recording replays the
+    successful path: the parser response is validated_scenario.json, the
+    composer response composer_full_response.txt, and the overview is taken
+    from strategy_explanation.md. PRISM's stdout is reduced to the "Result:"
+    line rebuilt from meta.json, and since the strategy exports (strat.tra/.sta)
+    were not kept, the restricted model (restricted.tra/.sta/.lab) is served
+    for both the verify and the restrict run; full.tra and values.txt are not
+    available. The run is replayed with the LLM parser and without graph
+    reduction, as it was made.
+    """
+    run_dir = run_dir.resolve()
+    dest = (dest or run_dir / RECORDING_DIR).resolve()
+    meta_path = run_dir / "meta.json"
+    if not meta_path.exists():
+        raise ReplayError(f"{meta_path} not found")
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    (dest / ARTIFACTS_DIR).mkdir(parents=True, exist_ok=True)
+
+    data: dict[str, Any] = {
+        "version": 1,
+        "source": str(run_dir),
+        "imported": True,
+        "options": {"reduce": False, "llm_parse": True, "llm_overview": False, "metrics": [],
+                    "prism_timeout": None, "prism_max_rss": None},
+        "scenario_text": _user_text(meta.get("parse_scenario", {})),
+        "llm": {},
+        "prism": {},
+        "inputs": {},
+    }
+
+    def llm(purpose, meta_key, text):
+        entry = meta.get(meta_key, {})
+        data["llm"][purpose] = [{"method": "parse" if purpose == "parse" else "create",
+                                 "model": entry.get("used_model", entry.get("model")),
+                                 "output_text": text, "usage": entry.get("usage")}]
+
+    scenario_file = run_dir / "validated_scenario.json"
+    if scenario_file.exists():
+        llm("parse", "parse_scenario", scenario_file.read_text(encoding="utf-8"))
+    response_file = run_dir / "composer_full_response.txt"
+    if response_file.exists():
+        llm("compose", "composer", response_file.read_text(encoding="utf-8"))
+    explanation_file = run_dir / "strategy_explanation.md"
+    overview = _overview(explanation_file.read_text(encoding="utf-8")) if explanation_file.exists() else None
+    if overview:
+        llm("overview", "strategy_explanation", overview)
+
+    artifacts = {}
+    for suffix in ("tra", "sta", "lab"):
+        source = run_dir / f"restricted.{suffix}"
+        if source.exists():
+            shutil.copyfile(source, dest / ARTIFACTS_DIR / source.name)
+            artifacts[suffix] = f"{ARTIFACTS_DIR}/{source.name}"
+
+    probability = meta.get("prism_verification", {}).get("verification_probability")
+    stdout = f"\nResult: {probability} (value in the initial state)\n" if probability is not None else ""
+    data["prism"]["verify"] = [{"cmd": None, "returncode": 0, "stdout": stdout, "stderr": "",
+                                "artifacts": {f"strat.{s}": p for s, p in artifacts.items()}}]
+    data["prism"]["restrict"] = [{"cmd": None, "returncode": 0, "stdout": "", "stderr": "",
+                                  "artifacts": {f"restricted.{s}": p for s, p in artifacts.items()}}]
+
+    (dest / RECORDING_FILE).write_text(json.dumps(data, indent=2), encoding="utf-8")
+    return dest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage pipeline recordings")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="Build a recording from a run saved without --record")
+    imp.add_argument("run_dirs", nargs="+", type=pathlib.Path)
+    imp.add_argument("--dest", type=pathlib.Path,
+                     help="Recording directory (default: <run_dir>/recording; only with a single run)")
+    args = parser.parse_args(argv)
+
+    if args.dest and len(args.run_dirs) > 1:
+        parser.error("--dest needs a single run directory")
+    for run_dir in args.run_dirs:
+        try:
+            dest = import_run(run_dir, args.dest)
+        except ReplayError as exc:
+            print(f"✗ {run_dir}: {exc}")
+            sys.exit(1)
+        print(f"✓ Imported {run_dir} → {dest}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Small asyncio scheduler for the pipeline stage DAG.
+
+Each Stage declares the stages it depends on, the files it reads and the files
+it writes. Stages start as soon as all of their dependencies have finished, so
+independent work (e.g. loading the template while the parser waits on the LLM,
+or writing metadata while PRISM phase 2 runs) overlaps. Stage functions are
+ordinary blocking callables and run in worker threads.
+
+After a run, the critical path (the chain of dependencies that determined the
+end-to-end latency) is reported alongside per-stage timings.
+"""
+
+from __future__ import annotations
+import asyncio, pathlib, time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Mapping
+
+__all__ = ["Stage", "run_stages"]
+
+
+@dataclass
+class Stage:
+    """A pipeline stage.
+
+    name: unique stage name
+    fn: blocking callable run in a worker thread; its return value is kept in the results
+    deps: names of stages that must finish before this one starts
+    inputs: callable returning {name: path-or-text} hashed for checkpointing; evaluated
+            only once the dependencies have finished, since they may create the files
+    outputs: files this stage produces
+    meta_keys: meta.json entries this stage writes, checkpointed like outputs (a stage
+               with neither outputs nor meta keys is never checkpointed)
+    """
+    name: str
+    fn: Callable[[], Any]
+    deps: tuple[str, ...] = ()
+    inputs: Callable[[], Mapping[str, str | pathlib.Path]] = dict
+    outputs: list[pathlib.Path] = field(default_factory=list)
+    meta_keys: tuple[str, ...] = ()
+
+
+def _critical_path(stages: dict[str, Stage], timings: dict[str, dict[str, Any]]) -> list[str]:
+    """Walk back from the last stage to finish, always following the dependency that finished last."""
+    finished = [name for name in timings if 'end' in timings[name]]
+    if not finished:
+        return []
+    current = max(finished, key=lambda name: timings[name]['end'])
+    path = [current]
+    while True:
+        deps = [d for d in stages[current].deps if 'end' in timings.get(d, {})]
+        if not deps:
+            break
+        current = max(deps, key=lambda name: timings[name]['end'])
+        path.append(current)
+    return list(reversed(path))
+
+
+async def _run(stages: dict[str, Stage], should_skip, on_complete) -> tuple[dict, dict, BaseException | None]:
+    results: dict[str, Any] = {}
+    timings: dict[str, dict[str, Any]] = {}
+    failures: list[BaseException] = []
+    tasks: dict[str, asyncio.Task] = {}
+    origin = time.perf_counter()
+
+    async def run_one(stage: Stage):
+        ok = await asyncio.gather(*(tasks[d] for d in stage.deps))
+        if not all(ok):
+            timings[stage.name] = {'status': 'not-run'}
+            return False
+
+        inputs = stage.inputs()
+        start = time.perf_counter()
+        if should_skip(stage, inputs):
+            timings[stage.name] = {'status': 'skipped', 'start': start - origin, 'end': start - origin}
+            return True
+
+        try:
+            results[stage.name] = await asyncio.to_thread(stage.fn)
+        except BaseException as exc:  # includes sys.exit() from interactive stages
+            end = time.perf_counter()
+            timings[stage.name] = {'status': 'failed', 'start': start - origin, 'end': end - origin}
+            failures.append(exc)
+            return False
+        end = time.perf_counter()
+        timings[stage.name] = {'status': 'ran', 'start': start - origin, 'end': end - origin}
+        on_complete(stage, stage.inputs())
+        return True
+
+    for stage in stages.values():
+        tasks[stage.name] = asyncio.ensure_future(run_one(stage))
+    await asyncio.gather(*tasks.values())
+    return results, timings, (failures[0] if failures else None)
+
+
+def run_stages(stage_list: list[Stage],
+               should_skip: Callable[[Stage, Mapping[str, Any]], bool] = lambda stage, inputs: False,
+               on_complete: Callable[[Stage, Mapping[str, Any]], None] = lambda stage, inputs: None,
+               ) -> tuple[dict[str, Any], dict[str, Any], BaseException | None]:
+    """Run the stage DAG concurrently.
+
+    should_skip(stage, inputs) is asked before each stage runs (e.g. checkpoint checks);
+    on_complete(stage, inputs) is called after a stage succeeds, with its inputs re-evaluated
+    since a stage may rewrite them (e.g. auto-fixing model.prism).
+
+    Returns (results, report, failure): results maps stage name to the stage function's
+    return value, report holds per-stage timings and the critical path, and failure is the
+    first exception raised by a stage (None on success). If a stage fails its dependents
+    are not run, but independent stages still finish so the report can be saved before
+    the caller re-raises.
+    """
+    stages = {s.name: s for s in stage_list}
+    for stage in stage_list:
+        missing = [d for d in stage.deps if d not in stages]
+        if missing:
+            raise ValueError(f"Stage {stage.name!r} depends on unknown stages {missing}")
+
+    wall_start = time.perf_counter()
+    results, timings, failure = asyncio.run(_run(stages, should_skip, on_complete))
+    wall_time = time.perf_counter() - wall_start
+
+    critical = _critical_path(stages, timings)
+    durations = {name: t['end'] - t['start'] for name, t in timings.items() if 'end' in t}
+    report = {
+        'wall_time_s': round(wall_time, 3),
+        'serial_time_s': round(sum(durations.values()), 3),
+        'critical_path': critical,
+        'critical_path_s': round(sum(durations[name] for name in critical), 3),
+        'stages': {
+            name: {**{k: (round(v, 3) if isinstance(v, float) else v) for k, v in t.items()},
+                   'duration_s': round(durations.get(name, 0.0), 3)}
+            for name, t in timings.items()
+        },
+    }
+    return results, report, failure